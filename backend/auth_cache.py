@@ -0,0 +1,107 @@
+"""Short-lived cache of authenticated principals.
+
+``get_current_user`` would otherwise read the user row on every authenticated
+request. Entries are keyed by (username, token expiry) and live for at most
+``ttl_seconds`` and never past the token's own expiry. Deactivating a user
+must call ``invalidate_user`` so that their tokens stop working right away in
+this process; other processes pick the change up within the TTL.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Detached snapshot of the columns request handlers read from the user"""
+    id: int
+    username: str
+    email: str
+    first_name: str
+    last_name: str
+    is_active: bool
+    is_superuser: bool
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            is_active=bool(user.is_active),
+            is_superuser=bool(user.is_superuser)
+        )
+
+
+class PrincipalCache:
+    def __init__(
+        self,
+        ttl_seconds: float = AUTH_CACHE_TTL_SECONDS,
+        max_entries: int = AUTH_CACHE_MAX_ENTRIES
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # (username, exp) -> (principal, expires_at)
+        self._entries: Dict[Tuple[str, Optional[int]], Tuple[Principal, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, username: str, exp: Optional[int]) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get((username, exp))
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[(username, exp)]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def put(self, username: str, exp: Optional[int], principal: Principal) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._purge_expired()
+                if len(self._entries) >= self.max_entries:
+                    # Still full: drop the entry closest to expiry
+                    oldest = min(self._entries, key=lambda key: self._entries[key][1])
+                    del self._entries[oldest]
+            self._entries[(username, exp)] = (principal, expires_at)
+
+    def invalidate_user(self, username: str) -> None:
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == username]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        for key in [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+
+
+principal_cache = PrincipalCache()
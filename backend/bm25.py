@@ -0,0 +1,313 @@
+"""In-process BM25 index over paper titles, abstracts and keywords.
+
+Postings are stored CSR-style in three flat arrays: ``offsets`` (per term),
+``post_docs`` and ``post_tf``. They are saved as ``.npy`` files and memory-mapped on
+load. Each save writes a new ``gen-*`` directory and then atomically repoints the
+``CURRENT`` file at it, so a crash mid-save leaves the previous index intact. Papers added after the last compaction live in a small in-memory delta
+that is merged into the arrays every ``BM25_COMPACT_EVERY`` documents.
+``sync`` picks up papers inserted or updated since its ``updated_at``
+watermark; a paper is re-tokenized only when its indexed text changed.
+
+English text is split into lowercase alphanumeric words; runs of CJK
+characters are indexed as overlapping bigrams so a Chinese phrase matches
+without a word segmenter. Keywords are also indexed verbatim as ``kw:<keyword>``
+so that arXiv category codes such as ``cs.CL`` match exactly.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, load_only
+
+from . import models
+
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "bm25_index")
+BM25_COMPACT_EVERY = int(os.getenv("BM25_COMPACT_EVERY", "500"))
+# How often to pick up papers inserted or updated by other processes (crawler, scripts)
+BM25_SYNC_SECONDS = float(os.getenv("BM25_SYNC_SECONDS", "60"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Title tokens count this many times
+TITLE_WEIGHT = 2
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CJK_RUN = re.compile(r"[\u4e00-\u9fff]+")
+_CATEGORY = re.compile(r"[a-z]+\.[A-Z]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    text = unicodedata.normalize("NFKC", text or "")
+    tokens = [w for w in _WORD.findall(text.lower()) if len(w) > 1]
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def paper_tokens(title: Optional[str], abstract: Optional[str], keywords: Optional[Iterable[str]]) -> List[str]:
+    tokens = tokenize(title) * TITLE_WEIGHT + tokenize(abstract)
+    for keyword in keywords or []:
+        tokens.extend(tokenize(keyword))
+        tokens.append("kw:" + unicodedata.normalize("NFKC", keyword).strip().lower())
+    return tokens
+
+
+def text_digest(title: Optional[str], abstract: Optional[str], keywords: Optional[Iterable[str]]) -> str:
+    """Fingerprint of the indexed text, to skip updates that don't touch it"""
+    raw = json.dumps([title, abstract, list(keywords or [])], ensure_ascii=False)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def query_tokens(query: str) -> List[str]:
+    tokens = tokenize(query)
+    tokens += ["kw:" + code.lower() for code in _CATEGORY.findall(query)]
+    return list(dict.fromkeys(tokens))
+
+
+class BM25Index:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.vocab: dict[str, int] = {}
+        self.doc_ids: List[str] = []
+        self.doc_pos: dict[str, int] = {}
+        # paper_id -> text_digest of the indexed version
+        self.doc_digest: dict[str, str] = {}
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.deleted = np.zeros(0, dtype=bool)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.int32)
+        self.post_tf = np.zeros(0, dtype=np.float32)
+        # term id -> [(doc, tf)] for documents added since the last compaction
+        self._delta: dict[int, List[Tuple[int, int]]] = {}
+        self._delta_docs = 0
+        self.watermark: Optional[datetime] = None
+        self.last_sync = 0.0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_ids) - int(self.deleted.sum())
+
+    def add_paper(self, paper: models.Paper) -> None:
+        self.add_documents([(paper.id, paper.title, paper.abstract, paper.keywords)])
+
+    def add_documents(self, docs: Iterable[Tuple[str, str, str, list]]) -> None:
+        """Index (paper_id, title, abstract, keywords) tuples; re-adding an id replaces it."""
+        with self._lock:
+            new_lens = []
+            for paper_id, title, abstract, keywords in docs:
+                old = self.doc_pos.get(paper_id)
+                if old is not None:
+                    self.deleted[old] = True
+                doc = len(self.doc_ids)
+                counts = Counter(paper_tokens(title, abstract, keywords))
+                for term, tf in counts.items():
+                    term_id = self.vocab.setdefault(term, len(self.vocab))
+                    self._delta.setdefault(term_id, []).append((doc, tf))
+                self.doc_ids.append(paper_id)
+                self.doc_pos[paper_id] = doc
+                self.doc_digest[paper_id] = text_digest(title, abstract, keywords)
+                new_lens.append(sum(counts.values()))
+            if not new_lens:
+                return
+            self.doc_len = np.concatenate([self.doc_len, np.asarray(new_lens, dtype=np.float32)])
+            self.deleted = np.concatenate([self.deleted, np.zeros(len(new_lens), dtype=bool)])
+            self._delta_docs += len(new_lens)
+            compact = self._delta_docs >= BM25_COMPACT_EVERY
+        if compact:
+            self.save()
+
+    def compact(self) -> None:
+        """Merge the delta into the posting arrays and drop deleted documents' postings."""
+        with self._lock:
+            n_terms = len(self.vocab)
+            old_terms = np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+            delta_terms, delta_docs, delta_tf = [], [], []
+            for term_id, postings in self._delta.items():
+                delta_terms.extend([term_id] * len(postings))
+                delta_docs.extend(doc for doc, _ in postings)
+                delta_tf.extend(tf for _, tf in postings)
+            terms = np.concatenate([old_terms, np.asarray(delta_terms, dtype=np.int64)])
+            docs = np.concatenate([self.post_docs, np.asarray(delta_docs, dtype=np.int32)])
+            tfs = np.concatenate([self.post_tf, np.asarray(delta_tf, dtype=np.float32)])
+
+            keep = ~self.deleted[docs]
+            terms, docs, tfs = terms[keep], docs[keep], tfs[keep]
+            # Delta docs are newer than compacted ones, so a stable sort keeps doc order
+            order = np.argsort(terms, kind="stable")
+            self.post_docs = docs[order]
+            self.post_tf = tfs[order]
+            self.offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=n_terms))]).astype(np.int64)
+            self._delta = {}
+            self._delta_docs = 0
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """Top ``limit`` (paper_id, score) pairs, best first."""
+        with self._lock:
+            term_ids = [self.vocab[t] for t in query_tokens(query) if t in self.vocab]
+            if not term_ids or not self.doc_ids:
+                return []
+            offsets, post_docs, post_tf = self.offsets, self.post_docs, self.post_tf
+            doc_len, deleted = self.doc_len, self.deleted.copy()
+            doc_ids = self.doc_ids  # append-only, so indices stay valid
+            delta = {t: list(self._delta.get(t, ())) for t in term_ids}
+
+        live = ~deleted
+        n_docs = int(live.sum())
+        if n_docs == 0:
+            return []
+        avgdl = float(doc_len[live].mean()) or 1.0
+        scores = np.zeros(len(doc_len), dtype=np.float32)
+        for term_id in term_ids:
+            if term_id < len(offsets) - 1:
+                start, stop = offsets[term_id], offsets[term_id + 1]
+                docs, tfs = np.asarray(post_docs[start:stop]), np.asarray(post_tf[start:stop])
+            else:
+                docs, tfs = np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+            if delta[term_id]:
+                docs = np.concatenate([docs, np.asarray([d for d, _ in delta[term_id]], dtype=np.int32)])
+                tfs = np.concatenate([tfs, np.asarray([tf for _, tf in delta[term_id]], dtype=np.float32)])
+            if not len(docs):
+                continue
+            df = int(live[docs].sum())
+            idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len[docs] / avgdl)
+            scores[docs] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+
+        scores[deleted] = 0
+        hits = np.flatnonzero(scores)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(doc_ids[i], float(scores[i])) for i in hits]
+
+    def sync(self, db: Session) -> int:
+        """Index papers inserted or changed since the last sync; returns how many were (re)indexed."""
+        if not self._sync_lock.acquire(blocking=False):
+            return 0  # another thread is already syncing
+        try:
+            query = db.query(models.Paper).options(load_only(
+                models.Paper.id, models.Paper.title, models.Paper.abstract,
+                models.Paper.keywords, models.Paper.created_at, models.Paper.updated_at
+            ))
+            if self.watermark is not None:
+                query = query.filter(or_(
+                    models.Paper.updated_at >= self.watermark,
+                    and_(models.Paper.updated_at.is_(None), models.Paper.created_at >= self.watermark)
+                ))
+            docs = []
+            watermark = self.watermark
+            for paper in query.yield_per(1000):
+                changed_at = paper.updated_at or paper.created_at
+                if changed_at and (watermark is None or changed_at > watermark):
+                    watermark = changed_at
+                digest = text_digest(paper.title, paper.abstract, paper.keywords)
+                # updated_at also moves for columns we don't index (is_processed, pdf_url)
+                if self.doc_digest.get(paper.id) != digest:
+                    docs.append((paper.id, paper.title, paper.abstract, paper.keywords))
+            first_build = not self.doc_ids
+            self.watermark = watermark
+            if docs:
+                self.add_documents(docs)
+            self.last_sync = time.monotonic()
+            if first_build and docs:
+                self.save()
+            return len(docs)
+        finally:
+            self._sync_lock.release()
+
+    def save(self) -> None:
+        """Compact and write the index to ``path``."""
+        if not self.path:
+            return
+        if self._delta:
+            self.compact()
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            arrays = {
+                "offsets": self.offsets, "post_docs": self.post_docs, "post_tf": self.post_tf,
+                "doc_len": self.doc_len, "deleted": self.deleted,
+            }
+            meta = {
+                "doc_ids": self.doc_ids,
+                "vocab": sorted(self.vocab, key=self.vocab.get),
+                "watermark": self.watermark.isoformat() if self.watermark else None,
+                "doc_digest": self.doc_digest,
+            }
+            generation = tempfile.mkdtemp(prefix="gen-", dir=self.path)
+            for name, array in arrays.items():
+                np.save(os.path.join(generation, f"{name}.npy"), np.asarray(array))
+            with open(os.path.join(generation, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            tmp = os.path.join(self.path, "CURRENT.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(os.path.basename(generation))
+            os.replace(tmp, os.path.join(self.path, "CURRENT"))
+            # Older generations (and ones left by a crashed save); on Windows a
+            # still-mapped one can't be removed yet and is retried next save
+            for entry in os.listdir(self.path):
+                if entry.startswith("gen-") and entry != os.path.basename(generation):
+                    shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        """Memory-map a saved index, or None if there is none."""
+        index = cls(path)
+        current = os.path.join(path, "CURRENT")
+        if os.path.exists(current):
+            with open(current, encoding="utf-8") as f:
+                path = os.path.join(path, f.read().strip())
+        # Indexes saved before generations were kept sit directly in ``path``
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        index.doc_ids = meta["doc_ids"]
+        index.doc_pos = {pid: i for i, pid in enumerate(index.doc_ids)}
+        index.vocab = {term: i for i, term in enumerate(meta["vocab"])}
+        # Indexes saved before digests were kept re-tokenize a paper on its next update
+        index.doc_digest = meta.get("doc_digest", {})
+        index.watermark = datetime.fromisoformat(meta["watermark"]) if meta["watermark"] else None
+        index.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        index.post_docs = np.load(os.path.join(path, "post_docs.npy"), mmap_mode="r")
+        index.post_tf = np.load(os.path.join(path, "post_tf.npy"), mmap_mode="r")
+        index.doc_len = np.load(os.path.join(path, "doc_len.npy"))
+        index.deleted = np.load(os.path.join(path, "deleted.npy"))
+        return index
+
+
+_index: Optional[BM25Index] = None
+_index_lock = threading.Lock()
+
+
+def get_bm25_index(db: Session) -> BM25Index:
+    """Process-wide index: loaded from disk or built from ``papers`` on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = BM25Index.load(BM25_INDEX_PATH) or BM25Index(BM25_INDEX_PATH)
+                index.sync(db)
+                _index = index
+    elif time.monotonic() - _index.last_sync > BM25_SYNC_SECONDS:
+        _index.sync(db)
+    return _index
+
+
+def get_loaded_bm25_index() -> Optional[BM25Index]:
+    """The index if some request already loaded it, without triggering a build."""
+    return _index
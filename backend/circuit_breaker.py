@@ -0,0 +1,146 @@
+"""Circuit breaker for calls to flaky upstreams.
+
+The breaker keeps a rolling window of recent call outcomes. It opens when the
+error rate or the slow-call rate over the window crosses its threshold, and
+while open every call is refused immediately so the caller can take its
+fallback path. After ``open_seconds`` a limited number of probe calls are let
+through (half-open); a successful probe closes the circuit again, a failed one
+re-opens it.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+VECTOR_BREAKER_WINDOW_SECONDS = float(os.getenv("VECTOR_BREAKER_WINDOW_SECONDS", "30"))
+VECTOR_BREAKER_MIN_CALLS = int(os.getenv("VECTOR_BREAKER_MIN_CALLS", "5"))
+VECTOR_BREAKER_ERROR_RATE = float(os.getenv("VECTOR_BREAKER_ERROR_RATE", "0.5"))
+VECTOR_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("VECTOR_BREAKER_SLOW_CALL_SECONDS", "2"))
+VECTOR_BREAKER_SLOW_RATE = float(os.getenv("VECTOR_BREAKER_SLOW_RATE", "0.8"))
+VECTOR_BREAKER_OPEN_SECONDS = float(os.getenv("VECTOR_BREAKER_OPEN_SECONDS", "15"))
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 30.0,
+        min_calls: int = 5,
+        error_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 2.0,
+        slow_rate_threshold: float = 0.8,
+        open_seconds: float = 15.0,
+        half_open_probes: int = 1
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._calls = deque()  # (timestamp, ok, latency)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self) -> bool:
+        """Whether a call may go to the upstream right now."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency: float) -> None:
+        self._record(True, latency)
+
+    def record_failure(self, latency: float) -> None:
+        self._record(False, latency)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            total = len(self._calls)
+            errors = sum(1 for _, ok, _ in self._calls if not ok)
+            slow = sum(1 for _, _, latency in self._calls if latency >= self.slow_call_seconds)
+            return {
+                "state": self._current_state(),
+                "window_calls": total,
+                "error_rate": errors / total if total else 0.0,
+                "slow_rate": slow / total if total else 0.0,
+                "rejected": self.rejected,
+                "times_opened": self.times_opened,
+            }
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+        return self._state
+
+    def _record(self, ok: bool, latency: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state()
+            if state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if ok and latency < self.slow_call_seconds:
+                    self._state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                return
+            if state == OPEN:
+                # A call admitted before the circuit opened
+                return
+
+            self._calls.append((now, ok, latency))
+            self._trim(now)
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            errors = sum(1 for _, call_ok, _ in self._calls if not call_ok)
+            slow = sum(1 for _, _, call_latency in self._calls if call_latency >= self.slow_call_seconds)
+            if errors / total >= self.error_rate_threshold or slow / total >= self.slow_rate_threshold:
+                self._open(now)
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self.times_opened += 1
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+
+# Guards the Chroma/embedding leg of paper search
+vector_search_breaker = CircuitBreaker(
+    "vector_search",
+    window_seconds=VECTOR_BREAKER_WINDOW_SECONDS,
+    min_calls=VECTOR_BREAKER_MIN_CALLS,
+    error_rate_threshold=VECTOR_BREAKER_ERROR_RATE,
+    slow_call_seconds=VECTOR_BREAKER_SLOW_CALL_SECONDS,
+    slow_rate_threshold=VECTOR_BREAKER_SLOW_RATE,
+    open_seconds=VECTOR_BREAKER_OPEN_SECONDS
+)
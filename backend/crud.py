@@ -1,9 +1,22 @@
-import re
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, func, String
+import copy
+import logging
+import time
+from typing import Optional
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only, selectinload
+from sqlalchemy.orm.util import identity_key
 
 from . import models, schemas
+from .auth_cache import principal_cache
+from .bm25 import get_bm25_index, get_loaded_bm25_index
+from .circuit_breaker import vector_search_breaker
+from .db_routing import PRIMARY, stick_to_primary
+from .pagination import decode_paper_cursor, decode_user_cursor, paper_cursor, row_counts, user_cursor
 from .security import get_password_hash
+from .vector_store import get_papers_collection, reset_papers_collection
+
+logger = logging.getLogger(__name__)
 
 
 def get_user(db: Session, user_id: int):
@@ -36,8 +49,25 @@ def create_user(db: Session, user: schemas.UserCreate):
         hashed_password=hashed_password,
     )
     db.add(db_user)
+    # 注册请求没有登录用户，按新用户名记录写入，随后的登录读主库
+    stick_to_primary(db, db_user.username)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+
+def set_user_active(db: Session, user_id: int, is_active: bool):
+    db_user = db.query(models.User).filter(models.User.id == user_id)\
+        .execution_options(**{PRIMARY: True}).first()
+    if db_user is None:
+        return None
+    db_user.is_active = is_active
+    # 被停用的是另一个用户，其后续请求也要读到最新状态
+    stick_to_primary(db, db_user.username)
     db.commit()
     db.refresh(db_user)
+    # Cached principals must not outlive a deactivation
+    principal_cache.invalidate_user(db_user.username)
     return db_user
 
 
@@ -53,18 +83,20 @@ def create_paper(db: Session, paper: schemas.PaperCreate):
     db.add(db_paper)
     db.commit()
     db.refresh(db_paper)
+    # 已加载的BM25索引增量加入新论文；尚未加载时由首次查询统一构建
+    index = get_loaded_bm25_index()
+    if index is not None:
+        index.add_paper(db_paper)
     return db_paper
 
 
 def get_paper(db: Session, paper_id: str):
     # Use original paper_id for query (database stores full ID with version)
-    import logging
-    logger = logging.getLogger(__name__)
-    logger.debug(f"Querying paper with ID: {paper_id}")
-    logger.debug(f"Query SQL: {str(db.query(models.Paper).filter(models.Paper.id == paper_id))}")
-    
-    paper = db.query(models.Paper).filter(models.Paper.id == paper_id).first()
-    logger.debug(f"Query result: {'Found' if paper else 'Not found'}")
+    query = db.query(models.Paper).filter(models.Paper.id == paper_id)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Query SQL: %s", query)
+    paper = query.first()
+    logger.debug("Query %s result: %s", paper_id, "Found" if paper else "Not found")
     return paper
 
 
@@ -76,75 +108,149 @@ def count_papers(db: Session):
     return db.query(models.Paper).count()
 
 
+def copy_paper(paper: models.Paper) -> models.Paper:
+    """Transient copy of ``paper``'s loaded columns, not tied to any session"""
+    loaded = paper.__dict__
+    return models.Paper(**{
+        attr.key: copy.deepcopy(loaded[attr.key])
+        for attr in models.Paper.__mapper__.column_attrs
+        if attr.key in loaded
+    })
+
+
+def hydrate_papers(
+    db: Session,
+    paper_ids: list[str],
+    identity_map: Optional[dict[str, models.Paper]] = None
+) -> tuple[list[models.Paper], list[str]]:
+    """Load papers for an ordered id list with a single ``IN`` query.
+
+    Returns the papers in the order of ``paper_ids`` (duplicates dropped) and
+    the ids that don't exist in the database. Papers already in the session or
+    in the optional per-request ``identity_map`` are not queried again; newly
+    loaded ones are added to it.
+    """
+    ordered = list(dict.fromkeys(paper_ids))
+    found: dict[str, models.Paper] = {}
+    to_load = []
+    for pid in ordered:
+        paper = identity_map.get(pid) if identity_map is not None else None
+        if paper is None:
+            paper = db.identity_map.get(identity_key(models.Paper, pid))
+        if paper is not None:
+            found[pid] = paper
+        else:
+            to_load.append(pid)
+
+    if to_load:
+        for paper in db.query(models.Paper).filter(models.Paper.id.in_(to_load)):
+            found[paper.id] = paper
+
+    if identity_map is not None:
+        identity_map.update(found)
+    papers = [found[pid] for pid in ordered if pid in found]
+    missing = [pid for pid in ordered if pid not in found]
+    return papers, missing
+
+
+def get_paper_neighbors(db: Session, paper_id: str, limit: int = 3) -> list[models.Paper]:
+    """Precomputed most similar papers, best first (empty if not computed yet)"""
+    return db.query(models.Paper)\
+        .join(models.PaperNeighbor, models.PaperNeighbor.neighbor_id == models.Paper.id)\
+        .filter(models.PaperNeighbor.paper_id == paper_id)\
+        .order_by(models.PaperNeighbor.rank)\
+        .limit(limit)\
+        .all()
+
+
+def get_paper_embeddings(paper_ids: list[str]) -> dict[str, list[float]]:
+    """Fetch the stored bge-m3 vectors of the given papers in one call.
+
+    Papers that have not been embedded yet are simply absent from the result.
+    """
+    if not paper_ids:
+        return {}
+    collection = get_papers_collection()
+    result = collection.get(ids=list(paper_ids), include=["embeddings"])
+    embeddings = result.get("embeddings")
+    if embeddings is None:
+        return {}
+    return {pid: emb for pid, emb in zip(result["ids"], embeddings) if emb is not None}
+
+
+class VectorSearchUnavailable(Exception):
+    """The vector search circuit is open"""
+
+
+def vector_search_paper_ids(query: str, n_results: int) -> list[str]:
+    """Ranked paper ids from the vector store, guarded by the circuit breaker"""
+    return _query_vector_store(query_texts=[query], n_results=n_results)
+
+
+def vector_search_paper_ids_by_embedding(embedding: list[float], n_results: int) -> list[str]:
+    """``vector_search_paper_ids`` for a text that is already embedded"""
+    return _query_vector_store(query_embeddings=[list(map(float, embedding))], n_results=n_results)
+
+
+def _query_vector_store(**query) -> list[str]:
+    # While the circuit is open, don't wait on Chroma/embedding timeouts at all
+    if not vector_search_breaker.allow():
+        raise VectorSearchUnavailable("vector search circuit open")
+    start = time.perf_counter()
+    try:
+        results = get_papers_collection().query(**query)
+    except Exception:
+        vector_search_breaker.record_failure(time.perf_counter() - start)
+        # The cached handle may be stale (collection recreated, Chroma restarted)
+        reset_papers_collection()
+        raise
+    vector_search_breaker.record_success(time.perf_counter() - start)
+    return results['ids'][0]
+
+
+def text_search_paper_ids(db: Session, query: str, limit: int = 10) -> list[str]:
+    """Ranked paper ids from the BM25 index over title, abstract and keywords"""
+    return [paper_id for paper_id, _ in get_bm25_index(db).search(query, limit)]
+
+
 def search_papers(db: Session, query: str, limit: int = 10):
     try:
-        # First try vector search using ChromaDB client
-        import chromadb
-        from chromadb.utils import embedding_functions
-        
-        # Initialize ChromaDB client
-        chroma_client = chromadb.HttpClient(host='localhost', port=8002)
-        openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-            api_key="API_KEY_IS_NOT_NEEDED",
-            api_base="http://10.176.64.152:11435/v1",
-            model_name="bge-m3"
-        )
-        collection = chroma_client.get_collection(
-            name="papers",
-            embedding_function=openai_ef
-        )
-        
-        # Perform vector search
-        results = collection.query(
-            query_texts=[query],
-            n_results=limit * 2  # Get more results to account for possible missing papers
-        )
-        
-        # Get paper IDs from results
-        paper_ids = results['ids'][0]
+        # First try vector search; get more results to account for possible missing papers
+        paper_ids = vector_search_paper_ids(query, limit * 2)
         
-        # Verify each paper exists in database
-        existing_papers = []
-        for pid in paper_ids:
-            paper = db.query(models.Paper).filter(models.Paper.id == pid).first()
-            if paper:
-                existing_papers.append(paper)
-            else:
-                print(f"Warning: Paper {pid} found in vector DB but not in main database")
+        # Load the hits that exist in the database, keeping the vector ranking
+        existing_papers, missing = hydrate_papers(db, paper_ids)
+        if missing:
+            logger.warning("Papers %s found in vector DB but not in main database", missing)
         
         # Log search results
-        print(f"Vector search returned {len(paper_ids)} papers, found {len(existing_papers)} valid papers in database")
+        logger.debug("Vector search returned %d papers, found %d valid papers in database", len(paper_ids), len(existing_papers))
         
         # Return up to limit papers
         return existing_papers[:limit] if len(existing_papers) > 0 else []
     
+    except VectorSearchUnavailable:
+        logger.debug("Vector search circuit open, using text search")
     except Exception as e:
-        print(f"Vector search failed, falling back to text search: {e}")
-    
-    # Fallback to text search if vector search fails
-    conditions = []
-    
-    # 1. Check for academic category code (e.g. cs.CL)
-    if re.match(r'[a-z]+\.[A-Z]+', query):
-        conditions.append(func.json_contains(models.Paper.keywords, f'"{query}"'))
-    
-    # 2. Handle Chinese and English terms differently
-    terms = []
-    if any('\u4e00' <= char <= '\u9fff' for char in query):  # Check if contains Chinese
-        # For Chinese, search the whole phrase
-        terms.append(query)
-    else:
-        # For English, split into words
-        terms += [term for term in re.split(r'[\s,\-\.;]+', query) if len(term) > 1]
-    
-    # 3. Build search conditions
-    for term in terms:
-        conditions.append(models.Paper.title.ilike(f"%{term}%"))
-        conditions.append(models.Paper.abstract.ilike(f"%{term}%"))
+        logger.warning("Vector search failed, falling back to text search: %s", e)
     
-    return db.query(models.Paper).filter(
-        or_(*conditions)
-    ).limit(limit).all()
+    # Fallback to BM25 text search if vector search fails
+    return text_search_papers(db, query, limit)
+
+
+def text_search_papers(db: Session, query: str, limit: int = 10) -> list[models.Paper]:
+    """BM25 search over title, abstract and keywords, best first"""
+    papers, _ = hydrate_papers(db, text_search_paper_ids(db, query, limit))
+    return papers
+
+
+def get_recent_chat_responses(db: Session, limit: int = 200) -> list[models.ChatResponse]:
+    """Most recent chat responses with their paper matches loaded"""
+    return db.query(models.ChatResponse)\
+        .options(selectinload(models.ChatResponse.matched_papers))\
+        .order_by(models.ChatResponse.created_at.desc())\
+        .limit(limit)\
+        .all()
 
 
 def record_user_interaction(db: Session, interaction: schemas.UserPaperInteractionCreate):
@@ -176,12 +282,163 @@ def get_user_interactions(
         .all()
     
     # Get the actual paper objects
-    papers = []
-    for interaction in interactions:
-        paper = db.query(models.Paper)\
-            .filter(models.Paper.id == interaction.paper_id)\
-            .first()
-        if paper:
-            papers.append(paper)
-    
+    papers, _ = hydrate_papers(db, [interaction.paper_id for interaction in interactions])
+    return papers
+
+
+# Async variants for ``async def`` endpoints: the database wait is awaited
+# on the event loop instead of blocking it.
+
+async def aget_user(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
+
+
+async def aget_user_by_username(db: AsyncSession, username: str, primary: bool = False):
+    """``primary=True`` skips the replicas, for lookups that must be current (authentication)"""
+    stmt = select(models.User).where(models.User.username == username).limit(1)
+    if primary:
+        stmt = stmt.execution_options(**{PRIMARY: True})
+    result = await db.execute(stmt)
+    return result.scalars().first()
+
+
+async def aget_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.execute(select(models.User).order_by(models.User.id).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+async def aget_users_page(
+    db: AsyncSession,
+    cursor: Optional[str] = None,
+    limit: int = 100
+) -> tuple[list[models.User], Optional[str]]:
+    """Users in id order, starting after ``cursor``, plus the next page's cursor"""
+    stmt = select(models.User).order_by(models.User.id).limit(limit + 1)
+    if cursor:
+        stmt = stmt.where(models.User.id > decode_user_cursor(cursor))
+    users = (await db.execute(stmt)).scalars().all()
+    next_cursor = user_cursor(users[limit - 1]) if len(users) > limit else None
+    return users[:limit], next_cursor
+
+
+async def _acount(db: AsyncSession, model) -> int:
+    table = model.__tablename__
+    total = row_counts.get(table)
+    if total is None:
+        generation = row_counts.generation(table)
+        total = await db.scalar(select(func.count()).select_from(model))
+        row_counts.put(table, total, generation)
+    return total
+
+
+async def acount_users(db: AsyncSession):
+    return await _acount(db, models.User)
+
+
+async def aget_paper(db: AsyncSession, paper_id: str):
+    return await db.get(models.Paper, paper_id)
+
+
+_PAPER_ORDER = (models.Paper.created_at.desc(), models.Paper.id.desc())
+
+
+def _select_papers(columns: Optional[list] = None):
+    stmt = select(models.Paper).order_by(*_PAPER_ORDER)
+    if columns:
+        # Only the requested columns, plus the sort key needed for the cursor
+        stmt = stmt.options(load_only(*columns, models.Paper.created_at))
+    return stmt
+
+
+async def aget_papers(db: AsyncSession, skip: int = 0, limit: int = 100, columns: Optional[list] = None):
+    result = await db.execute(_select_papers(columns).offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+async def aget_papers_page(
+    db: AsyncSession,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    columns: Optional[list] = None
+) -> tuple[list[models.Paper], Optional[str]]:
+    """Papers newest first, starting after ``cursor``, plus the next page's cursor"""
+    stmt = _select_papers(columns).limit(limit + 1)
+    if cursor:
+        created_at, paper_id = decode_paper_cursor(cursor)
+        # Expanded form of (created_at, id) < (:created_at, :id) so it seeks on
+        # ix_papers_created_at_id in every backend
+        stmt = stmt.where(or_(
+            models.Paper.created_at < created_at,
+            and_(models.Paper.created_at == created_at, models.Paper.id < paper_id)
+        ))
+    papers = (await db.execute(stmt)).scalars().all()
+    next_cursor = paper_cursor(papers[limit - 1]) if len(papers) > limit else None
+    return papers[:limit], next_cursor
+
+
+async def acount_papers(db: AsyncSession):
+    return await _acount(db, models.Paper)
+
+
+async def aget_other_paper_ids(db: AsyncSession, paper_id: str) -> list[str]:
+    """Ids of every paper except ``paper_id``, for the random recommendation fallback"""
+    result = await db.execute(select(models.Paper.id).where(models.Paper.id != paper_id))
+    return result.scalars().all()
+
+
+async def aget_paper_neighbors(db: AsyncSession, paper_id: str, limit: int = 3) -> list[models.Paper]:
+    result = await db.execute(
+        select(models.Paper)
+        .join(models.PaperNeighbor, models.PaperNeighbor.neighbor_id == models.Paper.id)
+        .where(models.PaperNeighbor.paper_id == paper_id)
+        .order_by(models.PaperNeighbor.rank)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def aget_user_interactions(
+    db: AsyncSession,
+    user_id: int,
+    action_type: str = "view",
+    limit: int = 5
+) -> list[models.Paper]:
+    result = await db.execute(
+        select(models.UserPaperInteraction.paper_id)
+        .where(
+            models.UserPaperInteraction.user_id == user_id,
+            models.UserPaperInteraction.action_type == action_type
+        )
+        .order_by(models.UserPaperInteraction.timestamp.desc())
+        .limit(limit)
+    )
+    papers, _ = await db.run_sync(hydrate_papers, list(result.scalars().all()))
     return papers
+
+
+async def aget_recent_user_responses(db: AsyncSession, user_id: int, limit: int = 3) -> list[models.ChatResponse]:
+    result = await db.execute(
+        select(models.ChatResponse)
+        .where(models.ChatResponse.user_id == user_id)
+        .order_by(models.ChatResponse.created_at.desc())
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def arecord_user_interactions(
+    db: AsyncSession,
+    interactions: list[schemas.UserPaperInteractionCreate]
+) -> list[models.UserPaperInteraction]:
+    """Insert the interactions and commit once"""
+    db_interactions = [
+        models.UserPaperInteraction(
+            user_id=interaction.user_id,
+            paper_id=interaction.paper_id,
+            action_type=interaction.action_type
+        )
+        for interaction in interactions
+    ]
+    db.add_all(db_interactions)
+    await db.commit()
+    return db_interactions
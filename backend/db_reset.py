@@ -1,7 +1,7 @@
 from backend.database import Base, engine
 from backend import models
+from backend.embedding import CachedEmbeddingFunction
 import chromadb
-import chromadb.utils.embedding_functions as embedding_functions
 
 def reset_database():
     # 先删除关联表
@@ -30,12 +30,7 @@ def reset_database():
         client.delete_collection(name="papers")
         
         print("Creating new collection...")
-        openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-            api_key="API_KEY_IS_NOT_NEEDED",
-            api_base="http://10.176.64.152:11435/v1",
-            model_name="bge-m3"
-        )
-        client.create_collection(name="papers", embedding_function=openai_ef)
+        client.create_collection(name="papers", embedding_function=CachedEmbeddingFunction())
         chroma_success = True
         print("Chromadb reset successfully!")
     except Exception as e:
@@ -0,0 +1,201 @@
+"""Read/write splitting between the primary database and read replicas.
+
+``RoutingSession.get_bind`` sends flushes, locking reads and every statement
+of a session that has already written to the primary; other SELECTs go to a
+healthy replica, round robin. After a commit, the writer (the authenticated
+user passed to ``set_session_owner``) keeps reading from the primary for
+``REPLICA_STICKY_SECONDS`` so they see their own writes despite replication
+lag. A replica whose connection fails is skipped until a health probe
+succeeds again. Without ``REPLICA_URLS`` everything uses the primary.
+
+Reads that must be current, such as authentication, opt out of the replicas
+with the ``primary`` execution option on the statement or ``info={"primary":
+True}`` on the session. A write that affects another user (deactivation) or
+has no authenticated owner yet (sign-up) names who should stick to the
+primary with ``stick_to_primary``.
+
+The last-write times live in this process. With several workers behind a
+load balancer, a request that lands on another worker within
+``REPLICA_STICKY_SECONDS`` of a write can still read a lagging replica. Use
+session affinity on the balancer, or pin such reads with the options above.
+
+Two SQLite files are enough to try it locally::
+
+    DATABASE_URL=sqlite:///primary.db REPLICA_URLS=sqlite:///replica.db
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, exc, text
+from sqlalchemy.orm import Session
+
+REPLICA_URLS = [url.strip() for url in os.getenv("REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "10"))
+# Execution option / session.info key that pins reads to the primary
+PRIMARY = "primary"
+
+logger = logging.getLogger(__name__)
+
+# 当前请求的用户，用于“读自己的写”
+_session_owner: ContextVar[Optional[str]] = ContextVar("session_owner", default=None)
+
+
+def set_session_owner(owner: Optional[str]) -> None:
+    _session_owner.set(owner)
+
+
+def stick_to_primary(session, owner: Optional[str]) -> None:
+    """Keep ``owner``'s reads on the primary once ``session`` commits"""
+    if owner is not None:
+        session.info.setdefault("sticky_owners", set()).add(owner)
+
+
+class Replica:
+    def __init__(self, name: str, engine, async_engine=None):
+        self.name = name
+        self.engine = engine
+        self.async_engine = async_engine
+        self.healthy = True
+        self.reads = 0
+        self.failures = 0
+        for sync_engine in filter(None, [engine, async_engine.sync_engine if async_engine else None]):
+            event.listen(sync_engine, "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, exc.OperationalError):
+            self.mark_down(context.original_exception)
+
+    def mark_down(self, error) -> None:
+        if self.healthy:
+            logger.warning("Replica %s marked unhealthy, reading from primary: %s", self.name, error)
+        self.healthy = False
+        self.failures += 1
+
+    def probe(self) -> bool:
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception as e:
+            self.mark_down(e)
+            return False
+        if not self.healthy:
+            logger.info("Replica %s is healthy again", self.name)
+        self.healthy = True
+        return True
+
+
+class ReplicaSet:
+    def __init__(self, replicas: List[Replica], sticky_seconds: float = REPLICA_STICKY_SECONDS):
+        self.replicas = replicas
+        self.sticky_seconds = sticky_seconds
+        self._counter = itertools.count()
+        # owner -> time of their last committed write
+        self._last_write: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.primary_reads = 0
+
+    def pick(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def note_write(self, owner: Optional[str]) -> None:
+        if owner is None or not self.replicas:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._last_write) > 10000:
+                self._last_write = {
+                    key: at for key, at in self._last_write.items() if now - at < self.sticky_seconds
+                }
+            self._last_write[owner] = now
+
+    def reads_own_writes(self, owner: Optional[str]) -> bool:
+        """Whether ``owner`` wrote recently enough that a replica may lag behind"""
+        if owner is None:
+            return False
+        at = self._last_write.get(owner)
+        return at is not None and time.monotonic() - at < self.sticky_seconds
+
+    def check(self) -> None:
+        for replica in self.replicas:
+            replica.probe()
+
+    async def adispose(self) -> None:
+        for replica in self.replicas:
+            if replica.async_engine is not None:
+                await replica.async_engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "replicas": [
+                {"name": r.name, "healthy": r.healthy, "reads": r.reads, "failures": r.failures}
+                for r in self.replicas
+            ],
+            "primary_reads": self.primary_reads,
+            "sticky_owners": sum(1 for owner in list(self._last_write) if self.reads_own_writes(owner)),
+        }
+
+
+class RoutingSession(Session):
+    """Session that reads from a replica unless it has to see the primary"""
+
+    def __init__(self, *args, replicas: Optional[ReplicaSet] = None, async_replicas: bool = False, **kw):
+        super().__init__(*args, **kw)
+        self.replicas = replicas
+        # AsyncSession proxies need the sync side of the replica's async engine
+        self.async_replicas = async_replicas
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        primary = super().get_bind(mapper=mapper, clause=clause, **kw)
+        if not self.replicas or not self.replicas.replicas or not self._replica_safe(clause):
+            return primary
+        replica = self.replicas.pick()
+        if replica is None:
+            self.replicas.primary_reads += 1
+            return primary
+        replica.reads += 1
+        return replica.async_engine.sync_engine if self.async_replicas else replica.engine
+
+    def _replica_safe(self, clause) -> bool:
+        if self._flushing or self.info.get("wrote") or self.info.get(PRIMARY):
+            return False
+        if clause is None or not getattr(clause, "is_select", False):
+            return False
+        if clause.get_execution_options().get(PRIMARY):
+            return False
+        if getattr(clause, "_for_update_arg", None) is not None:
+            return False
+        return not self.replicas.reads_own_writes(_session_owner.get())
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    # 本会话之后的读取都走主库
+    session.info["wrote"] = True
+    session.info["uncommitted_write"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _after_commit(session):
+    owners = session.info.pop("sticky_owners", set())
+    if session.info.pop("uncommitted_write", False):
+        owners.add(_session_owner.get())
+    if session.replicas:
+        for owner in owners:
+            session.replicas.note_write(owner)
+
+
+@event.listens_for(RoutingSession, "after_soft_rollback")
+def _after_rollback(session, previous_transaction):
+    if previous_transaction.nested:
+        return
+    session.info.pop("sticky_owners", None)
+    session.info.pop("uncommitted_write", None)
@@ -0,0 +1,146 @@
+"""bge-m3 embedding client shared by the chat pipeline and search.
+
+Every embedding call in the project goes through ``embed_texts``, which
+consults the content-addressed ``EmbeddingCache`` first and only sends the
+texts it has never seen to the embedding server. Request handlers use
+``aembed_texts`` so that concurrent callers are coalesced by the
+``EmbeddingBatcher`` into a few larger requests.
+"""
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import EmbeddingCache
+from .http_client import get_http_client, get_sync_http_client
+
+EMBEDDING_API_BASE = "http://10.176.64.152:11435/v1"
+EMBEDDING_MODEL = "bge-m3"
+EMBEDDING_TIMEOUT = 10
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+
+_cache: Optional[EmbeddingCache] = None
+_batcher: Optional[EmbeddingBatcher] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache()
+    return _cache
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = EmbeddingBatcher(
+            _aembed_uncoalesced,
+            embed_texts,
+            max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=EMBEDDING_BATCH_MAX_WAIT_MS
+        )
+    return _batcher
+
+
+def _parse_embeddings(payload: dict) -> np.ndarray:
+    data = payload["data"]
+    # OpenAI-compatible servers return an index per item; don't rely on order
+    data.sort(key=lambda item: item.get("index", 0))
+    return np.asarray([item["embedding"] for item in data], dtype=np.float32)
+
+
+def _request_embeddings(texts: List[str]) -> np.ndarray:
+    url = f"{EMBEDDING_API_BASE}/embeddings"
+    resp = get_sync_http_client(url).post(
+        url,
+        json={"model": EMBEDDING_MODEL, "input": texts},
+        timeout=EMBEDDING_TIMEOUT
+    )
+    resp.raise_for_status()
+    return _parse_embeddings(resp.json())
+
+
+async def _arequest_embeddings(texts: List[str]) -> np.ndarray:
+    url = f"{EMBEDDING_API_BASE}/embeddings"
+    resp = await get_http_client(url).post(
+        url,
+        json={"model": EMBEDDING_MODEL, "input": texts},
+        timeout=EMBEDDING_TIMEOUT
+    )
+    resp.raise_for_status()
+    return _parse_embeddings(resp.json())
+
+
+def _cached_and_missing(texts: List[str]):
+    cache = get_embedding_cache()
+    vectors = cache.get_many(EMBEDDING_MODEL, texts)
+    # Deduplicate misses so repeated texts are embedded once
+    missing = list(dict.fromkeys(t for t, vec in zip(texts, vectors) if vec is None))
+    return vectors, missing
+
+
+def _merge(texts: List[str], vectors: list, missing: List[str], fresh: np.ndarray) -> np.ndarray:
+    get_embedding_cache().put_many(EMBEDDING_MODEL, missing, fresh)
+    fresh_by_text = dict(zip(missing, fresh))
+    return np.vstack([vec if vec is not None else fresh_by_text[t] for t, vec in zip(texts, vectors)])
+
+
+def embed_texts(texts: Sequence[str]) -> np.ndarray:
+    """Embed all texts, sending only cache misses in a single request.
+
+    Returns a float32 matrix of shape (len(texts), dim), rows in input order.
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    texts = list(texts)
+    vectors, missing = _cached_and_missing(texts)
+    if not missing:
+        return np.vstack(vectors)
+    return _merge(texts, vectors, missing, _request_embeddings(missing))
+
+
+async def _aembed_uncoalesced(texts: List[str]) -> np.ndarray:
+    vectors, missing = _cached_and_missing(texts)
+    if not missing:
+        return np.vstack(vectors)
+    return _merge(texts, vectors, missing, await _arequest_embeddings(missing))
+
+
+async def aembed_texts(texts: Sequence[str]) -> np.ndarray:
+    """``embed_texts`` for async callers, micro-batched with concurrent requests."""
+    return await get_embedding_batcher().embed(texts)
+
+
+class CachedEmbeddingFunction:
+    """Chroma embedding function backed by ``embed_texts``.
+
+    Pass it as ``embedding_function`` to every ``papers`` collection so that
+    documents and query texts share the embedding cache.
+    """
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return get_embedding_batcher().embed_blocking(input).tolist()
+
+
+def embedding_stats() -> dict:
+    return {
+        "cache": get_embedding_cache().stats(),
+        "batcher": get_embedding_batcher().stats(),
+    }
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so that a dot product is a cosine similarity."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def cosine_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every row of ``a`` against every row of ``b``."""
+    if a.size == 0 or b.size == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    return normalize_rows(a) @ normalize_rows(b).T
@@ -0,0 +1,144 @@
+"""Micro-batching of embedding requests.
+
+Concurrent callers enqueue their texts; the batcher flushes them to the
+embedding server as one request when ``max_batch_size`` texts are waiting or
+``max_wait_ms`` has passed since the first one arrived, then hands every
+caller its own rows.
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    __slots__ = ("texts", "future", "enqueued_at")
+
+    def __init__(self, texts: List[str], future: asyncio.Future):
+        self.texts = texts
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], Awaitable[np.ndarray]],
+        blocking_fn: Callable[[Sequence[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0
+    ):
+        self.embed_fn = embed_fn
+        self.blocking_fn = blocking_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: List[_Pending] = []
+        self._pending_items = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self._stats_lock = threading.Lock()
+        self.flushes = 0
+        self.items = 0
+        self.callers = 0
+        self.max_seen_batch = 0
+        self.total_wait = 0.0
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts together with whatever other callers are waiting."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        pending = _Pending(texts, loop.create_future())
+        self._pending.append(pending)
+        self._pending_items += len(texts)
+
+        if self._pending_items >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await pending.future
+
+    def embed_blocking(self, texts: Sequence[str]) -> np.ndarray:
+        """Synchronous entry point for code running in worker threads.
+
+        Joins the event loop's batches when called off-loop; on the loop
+        thread itself (or before any loop has used the batcher) it embeds
+        directly, since blocking there would deadlock.
+        """
+        loop = self._loop
+        if loop is None or not loop.is_running() or _on_loop_thread(loop):
+            return self.blocking_fn(texts)
+        return asyncio.run_coroutine_threadsafe(self.embed(texts), loop).result()
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch, size = [], 0
+            while self._pending and (not batch or size + len(self._pending[0].texts) <= self.max_batch_size):
+                item = self._pending.pop(0)
+                batch.append(item)
+                size += len(item.texts)
+            self._pending_items -= size
+            task = self._loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[_Pending]) -> None:
+        texts = [t for item in batch for t in item.texts]
+        now = time.perf_counter()
+        self._record(len(texts), len(batch), sum(now - item.enqueued_at for item in batch))
+        try:
+            vectors = await self.embed_fn(texts)
+        except Exception as e:
+            logger.error("Batched embedding request failed: %s", e)
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        offset = 0
+        for item in batch:
+            if not item.future.done():
+                item.future.set_result(vectors[offset:offset + len(item.texts)])
+            offset += len(item.texts)
+
+    def _record(self, items: int, callers: int, wait: float) -> None:
+        with self._stats_lock:
+            self.flushes += 1
+            self.items += items
+            self.callers += callers
+            self.total_wait += wait
+            self.max_seen_batch = max(self.max_seen_batch, items)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "flushes": self.flushes,
+                "items": self.items,
+                "avg_batch_size": self.items / self.flushes if self.flushes else 0.0,
+                "avg_callers_per_batch": self.callers / self.flushes if self.flushes else 0.0,
+                "max_batch_seen": self.max_seen_batch,
+                "avg_queue_wait_ms": 1000 * self.total_wait / self.callers if self.callers else 0.0,
+                "queued_items": self._pending_items,
+            }
+
+
+def _on_loop_thread(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
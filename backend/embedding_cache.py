@@ -0,0 +1,167 @@
+"""Content-addressed embedding cache.
+
+Vectors are keyed by (model name, sha256 of the normalized text) and kept in
+two tiers: an in-process LRU and an on-disk SQLite table with size-bounded
+eviction. The SQLite file is shared by every process started from the project
+root, so the business layer, the algorithm layer and the batch embedding job
+all reuse each other's work.
+
+Reads never write: disk hits only note their access time in memory, and the
+notes are flushed with the next ``put_many``, before it runs an eviction sweep.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "4096"))
+EMBEDDING_CACHE_DISK_ITEMS = int(os.getenv("EMBEDDING_CACHE_DISK_ITEMS", "200000"))
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        path: Optional[str] = EMBEDDING_CACHE_PATH,
+        memory_items: int = EMBEDDING_CACHE_MEMORY_ITEMS,
+        disk_items: int = EMBEDDING_CACHE_DISK_ITEMS
+    ):
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self._memory: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_count = 0
+        # (model, key) -> access time not yet written to last_access
+        self._touched: Dict[tuple, float] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " last_access REAL NOT NULL,"
+                " PRIMARY KEY (model, key))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_embeddings_last_access ON embeddings (last_access)"
+            )
+            self._conn.commit()
+            self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vector for every text, or None where it is not cached."""
+        keys = [(model, text_key(t)) for t in texts]
+        found: Dict[tuple, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vec = self._memory.get(key)
+                if vec is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vec
+            memory_found = len(found)
+
+            pending = list({k for k in keys if k not in found})
+            if pending and self._conn is not None:
+                now = time.time()
+                for start in range(0, len(pending), 500):
+                    chunk = pending[start:start + 500]
+                    rows = self._conn.execute(
+                        "SELECT key, vector FROM embeddings WHERE model = ? AND key IN (%s)"
+                        % ",".join("?" * len(chunk)),
+                        [model] + [k for _, k in chunk]
+                    ).fetchall()
+                    for k, blob in rows:
+                        vec = np.frombuffer(blob, dtype=np.float32)
+                        found[(model, k)] = vec
+                        self._remember((model, k), vec)
+                        self._touched[(model, k)] = now
+
+            result = [found.get(k) for k in keys]
+            self.memory_hits += memory_found
+            self.disk_hits += len(found) - memory_found
+            self.misses += sum(1 for v in result if v is None)
+        return result
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: np.ndarray) -> None:
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vec in zip(texts, vectors):
+                key = (model, text_key(text))
+                vec = np.asarray(vec, dtype=np.float32)
+                self._remember(key, vec)
+                rows.append((model, key[1], vec.tobytes(), now))
+            if self._conn is not None and rows:
+                self._flush_touches()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, key, vector, last_access) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                # Upper bound: replaced rows are counted too, _evict_disk recounts
+                self._disk_count += len(rows)
+                if self._disk_count > self.disk_items:
+                    self._evict_disk()
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_items": len(self._memory),
+                "disk_items": self._disk_count if self._conn is not None else None,
+                "evictions": self.evictions,
+            }
+
+    def _remember(self, key: tuple, vec: np.ndarray) -> None:
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _flush_touches(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE model = ? AND key = ?",
+                [(at, model, key) for (model, key), at in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _evict_disk(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._disk_count = count
+        if count <= self.disk_items:
+            return
+        # Evict a little more than needed so we don't run this on every insert
+        excess = count - self.disk_items + max(1, self.disk_items // 20)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN ("
+            " SELECT rowid FROM embeddings ORDER BY last_access LIMIT ?)",
+            (excess,)
+        )
+        self._disk_count = count - excess
+        self.evictions += excess
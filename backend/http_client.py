@@ -0,0 +1,73 @@
+"""Pooled HTTP clients for calls to the LLM, embedding, rerank and algorithm services.
+
+Each process keeps one keep-alive client per upstream origin so that every
+host gets its own connection limit. Request handlers use the async clients;
+worker threads and scripts use the sync ones. Call ``aclose_http_clients``
+from the application's shutdown hook.
+"""
+import os
+from typing import Dict
+from urllib.parse import urlsplit
+
+import httpx
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+# LLM generation can legitimately take a long time
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "32"))
+HTTP_MAX_KEEPALIVE_PER_HOST = int(os.getenv("HTTP_MAX_KEEPALIVE_PER_HOST", "16"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+_async_clients: Dict[str, httpx.AsyncClient] = {}
+_sync_clients: Dict[str, httpx.Client] = {}
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_PER_HOST,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def default_timeout(read: float = HTTP_READ_TIMEOUT) -> httpx.Timeout:
+    return httpx.Timeout(read, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def llm_timeout() -> httpx.Timeout:
+    return default_timeout(read=LLM_READ_TIMEOUT)
+
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    """Shared async client for the origin of ``url``."""
+    origin = _origin(url)
+    client = _async_clients.get(origin)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(limits=_limits(), timeout=default_timeout())
+        _async_clients[origin] = client
+    return client
+
+
+def get_sync_http_client(url: str) -> httpx.Client:
+    """Shared sync client for the origin of ``url``, for worker threads and scripts."""
+    origin = _origin(url)
+    client = _sync_clients.get(origin)
+    if client is None or client.is_closed:
+        client = httpx.Client(limits=_limits(), timeout=default_timeout())
+        _sync_clients[origin] = client
+    return client
+
+
+async def aclose_http_clients() -> None:
+    for client in list(_async_clients.values()):
+        await client.aclose()
+    for client in list(_sync_clients.values()):
+        client.close()
+    _async_clients.clear()
+    _sync_clients.clear()
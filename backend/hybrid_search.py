@@ -0,0 +1,82 @@
+"""Hybrid paper search: vector and BM25 legs fused by reciprocal-rank fusion.
+
+Both legs run concurrently in worker threads. A leg that fails or exceeds its
+timeout is dropped from the fusion instead of holding up the response; the
+per-leg latency, status and contribution are returned alongside the papers.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Tuple
+
+from . import crud, models, schemas
+from .database import SessionLocal
+
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_VECTOR_TIMEOUT = float(os.getenv("HYBRID_VECTOR_TIMEOUT", "1.5"))
+HYBRID_LEXICAL_TIMEOUT = float(os.getenv("HYBRID_LEXICAL_TIMEOUT", "0.5"))
+
+logger = logging.getLogger(__name__)
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists: score(d) = sum over legs of 1 / (k + rank)."""
+    scores: Dict[str, float] = {}
+    for ids in rankings.values():
+        for rank, paper_id in enumerate(ids, start=1):
+            scores[paper_id] = scores.get(paper_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def _vector_leg(query: str, n: int) -> List[str]:
+    return crud.vector_search_paper_ids(query, n)
+
+
+def _lexical_leg(query: str, n: int) -> List[str]:
+    with SessionLocal() as db:
+        return crud.text_search_paper_ids(db, query, n)
+
+
+async def _run_leg(name: str, fn: Callable[[str, int], List[str]], query: str, n: int, timeout: float):
+    start = time.perf_counter()
+    try:
+        ids = await asyncio.wait_for(asyncio.to_thread(fn, query, n), timeout=timeout)
+        status = "ok"
+    except asyncio.TimeoutError:
+        ids, status = [], "timeout"
+    except crud.VectorSearchUnavailable:
+        ids, status = [], "circuit_open"
+    except Exception as e:
+        logger.warning("Hybrid search %s leg failed: %s", name, e)
+        ids, status = [], "error"
+    return name, ids, status, 1000 * (time.perf_counter() - start)
+
+
+async def hybrid_search(query: str, limit: int = 10) -> Tuple[List[models.Paper], List[schemas.SearchLegStats]]:
+    """Top ``limit`` papers by RRF over the vector and lexical legs, plus per-leg stats"""
+    legs = await asyncio.gather(
+        _run_leg("vector", _vector_leg, query, limit, HYBRID_VECTOR_TIMEOUT),
+        _run_leg("lexical", _lexical_leg, query, limit, HYBRID_LEXICAL_TIMEOUT),
+    )
+    rankings = {name: ids for name, ids, _, _ in legs}
+    fused = [paper_id for paper_id, _ in reciprocal_rank_fusion(rankings)]
+
+    def hydrate():
+        with SessionLocal() as db:
+            papers, _ = crud.hydrate_papers(db, fused)
+            return papers
+    papers = (await asyncio.to_thread(hydrate))[:limit]
+
+    returned = {paper.id for paper in papers}
+    stats = [
+        schemas.SearchLegStats(
+            name=name,
+            status=status,
+            latency_ms=latency_ms,
+            hits=len(ids),
+            contributed=len(returned.intersection(ids))
+        )
+        for name, ids, status, latency_ms in legs
+    ]
+    return papers, stats
@@ -0,0 +1,119 @@
+"""Queue-based logging shared by the backend and backend_algo services.
+
+Request handlers only put records on an in-memory queue; a ``QueueListener``
+thread formats them and writes them to the console and the rotating log file.
+When the queue is full, records are dropped and counted instead of blocking
+the request. ``RouteSampler`` decides which successful requests get an access
+log line, so high-volume routes can be sampled down or switched off.
+
+    LOG_LEVEL=INFO
+    LOG_SAMPLE_RATES="/health=0,/metrics=0,/api/papers/=0.1"
+"""
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Iterable, Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "/health=0,/metrics=0")
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# 日志文件所在目录，默认为启动目录
+LOG_DIR = os.getenv("LOG_DIR", ".")
+
+_listeners: Dict[str, QueueListener] = {}
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never blocks the caller; counts records dropped when the queue is full."""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now since they may change later, but leave the full
+        # formatting (timestamps, exceptions) to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+def setup_logging(
+    name: str,
+    log_file: Optional[str] = None,
+    level: str = LOG_LEVEL,
+    include: Iterable[str] = ()
+) -> logging.Logger:
+    """Route the ``name`` logger hierarchy through a background writer thread.
+
+    ``include`` names other hierarchies (e.g. the ``backend`` helpers used by
+    backend_algo) that share the same queue and log file.
+    """
+    logger = logging.getLogger(name)
+    if name in _listeners:
+        return logger
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        # 最大10MB，保留3个备份
+        handlers.append(RotatingFileHandler(os.path.join(LOG_DIR, log_file), maxBytes=10 * 1024 * 1024, backupCount=3, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners[name] = listener
+
+    handler = _DroppingQueueHandler(log_queue)
+    for logger_name in (name, *include):
+        shared = logging.getLogger(logger_name)
+        shared.setLevel(level)
+        shared.addHandler(handler)
+        shared.propagate = False
+    return logger
+
+
+def stop_logging() -> None:
+    """Flush and stop the writer threads; call from the shutdown hook."""
+    for listener in _listeners.values():
+        listener.stop()
+    _listeners.clear()
+
+
+def logging_stats() -> dict:
+    return {
+        "level": LOG_LEVEL,
+        "dropped": _DroppingQueueHandler.dropped,
+        "queue_depth": sum(listener.queue.qsize() for listener in _listeners.values()),
+    }
+
+
+class RouteSampler:
+    """Per-route access log sampling by longest matching path prefix."""
+
+    def __init__(self, spec: str = LOG_SAMPLE_RATES, default_rate: float = 1.0):
+        self.default_rate = default_rate
+        self.rates: Dict[str, float] = {}
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            prefix, _, rate = item.partition("=")
+            self.rates[prefix.strip()] = float(rate)
+        self._prefixes = sorted(self.rates, key=len, reverse=True)
+
+    def rate(self, path: str) -> float:
+        for prefix in self._prefixes:
+            if path.startswith(prefix):
+                return self.rates[prefix]
+        return self.default_rate
+
+    def should_log(self, path: str) -> bool:
+        rate = self.rate(path)
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
@@ -1,6 +1,9 @@
 from datetime import datetime, timedelta, timezone
-from typing import Annotated, List, Optional, Tuple
-import re
+from typing import Annotated, AsyncIterator, List, Optional, Tuple
+import json
+import os
+import random
+import time
 import jwt
 from fastapi import Depends, FastAPI, HTTPException, status, Request, Query
 from pydantic import BaseModel
@@ -16,17 +19,41 @@ class PaperDetailResponse(BaseModel):
     published_date: Optional[str] = None
     year: Optional[int] = None
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jwt.exceptions import InvalidTokenError
 from pydantic import BaseModel
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from backend import crud, models, schemas
-from backend.database import SessionLocal, engine
+from backend.database import AsyncSessionLocal, SessionLocal, async_engine, engine, replicas
+from backend.db_routing import REPLICA_CHECK_SECONDS, set_session_owner
+from backend.migrations import upgrade as upgrade_schema
+from backend.bm25 import get_bm25_index
+from backend.auth_cache import Principal, principal_cache
+from backend.circuit_breaker import vector_search_breaker
+from backend.concurrency import SingleFlight, gather_bounded
+from backend.embedding import aembed_texts, cosine_matrix, embed_texts, embedding_stats
+from backend.logging_setup import RouteSampler, logging_stats, setup_logging, stop_logging
+from backend.matching import IncrementalMatcher, amatch_answer_to_papers
+from backend.embedding_cache import normalize_text
+from backend.hybrid_search import hybrid_search
+from backend.http_client import aclose_http_clients, get_http_client, llm_timeout
 from backend.security import verify_password
+from backend.vector_store import get_papers_collection, warm_up_vector_store
+from backend.pagination import InvalidCursor, paper_cursor, row_counts, user_cursor
+from backend.serialization import FastJSONResponse, paper_columns, paper_rows, parse_paper_fields
+from backend.paper_cache import PaperDetail, build_paper_detail, etag_matches, paper_detail_cache
+from backend.semantic_cache import (
+    SEMANTIC_CACHE_WARM_ENTRIES, CachedAnswer, CachedMatch, SemanticAnswerCache
+)
 
-import requests
+from contextlib import asynccontextmanager
+import asyncio
+import httpx
+import numpy as np
 
 
 
@@ -36,8 +63,15 @@ SECRET_KEY = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# 算法层服务地址
+ALGO_URL = "http://localhost:8001"
+# 单个聊天请求内并发执行的最大子任务数
+CHAT_MAX_PARALLELISM = int(os.getenv("CHAT_MAX_PARALLELISM", "4"))
+
 
 models.Base.metadata.create_all(bind=engine)
+# create_all不会修改已有表，按顺序补上模型变更（如match_score改为FLOAT）
+upgrade_schema(engine)
 
 
 class Token(BaseModel):
@@ -51,55 +85,64 @@ class TokenData(BaseModel):
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/token")
 
-app = FastAPI()
+def load_bm25_index():
+    """Load or build the text search index before the first fallback search needs it"""
+    with SessionLocal() as db:
+        get_bm25_index(db)
 
-# 配置详细日志输出到控制台和文件
-import logging
-from logging.handlers import RotatingFileHandler
 
-# 创建logger
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-
-# 控制台handler
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-
-# 文件handler (最大10MB，保留3个备份)
-file_handler = RotatingFileHandler(
-    'backend.log', 
-    maxBytes=10*1024*1024,
-    backupCount=3,
-    encoding='utf-8'
-)
-file_handler.setLevel(logging.DEBUG)
+async def replica_health_loop():
+    """Probe the read replicas so a failed one rejoins once it answers again"""
+    while True:
+        await asyncio.to_thread(replicas.check)
+        await asyncio.sleep(REPLICA_CHECK_SECONDS)
 
-# 日志格式
-formatter = logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-console_handler.setFormatter(formatter)
-file_handler.setFormatter(formatter)
 
-# 添加handlers
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_task = asyncio.create_task(warm_answer_cache())
+    vector_warm_task = asyncio.create_task(asyncio.to_thread(warm_up_vector_store))
+    bm25_task = asyncio.create_task(asyncio.to_thread(load_bm25_index))
+    replica_task = asyncio.create_task(replica_health_loop()) if replicas.replicas else None
+    yield
+    warm_task.cancel()
+    vector_warm_task.cancel()
+    bm25_task.cancel()
+    if replica_task:
+        replica_task.cancel()
+    await aclose_http_clients()
+    await async_engine.dispose()
+    await replicas.adispose()
+    stop_logging()
+
+
+setup_logging("backend", "backend.log")
+
+app = FastAPI(lifespan=lifespan)
+
+# 日志经队列由后台线程写入控制台和文件，请求路径上不做IO
+import logging
+
+logger = logging.getLogger(__name__)
+log_sampler = RouteSampler()
 
-# 测试日志输出
 logger.info("Logger initialized successfully")
 
-# 添加请求日志中间件
+# 添加请求日志中间件：按路由采样，只记录一行摘要
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    logger.debug(f"收到请求: {request.method} {request.url}")
-    logger.debug(f"请求头: {dict(request.headers)}")
+    start = time.perf_counter()
     try:
         response = await call_next(request)
-        logger.debug(f"请求处理完成: {request.method} {request.url} 状态码: {response.status_code}")
-        return response
     except Exception as e:
-        logger.error(f"请求处理出错: {str(e)}")
+        logger.error("请求处理出错: %s %s: %s", request.method, request.url.path, e)
         raise
+    if response.status_code >= 500 or (logger.isEnabledFor(logging.INFO) and log_sampler.should_log(request.url.path)):
+        logger.info(
+            "%s %s %d %.1fms",
+            request.method, request.url.path, response.status_code, 1000 * (time.perf_counter() - start)
+        )
+    return response
 
 # 健康检查端点
 @app.get("/health")
@@ -108,7 +151,28 @@ async def health_check():
         "status": "ok", 
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "port": 8000,
-        "listening": True
+        "listening": True,
+        "vector_search": vector_search_breaker.state
+    }
+
+# 运行指标端点
+@app.get("/metrics")
+async def metrics():
+    return {
+        "embedding": embedding_stats(),
+        "answer_cache": answer_cache.stats(),
+        "single_flight": {
+            "llm": llm_flight.stats(),
+            "search": search_flight.stats(),
+        },
+        "paper_detail_cache": paper_detail_cache.stats(),
+        "auth_cache": principal_cache.stats(),
+        "logging": logging_stats(),
+        "database": replicas.stats(),
+        "row_counts": row_counts.stats(),
+        "circuit_breakers": {
+            "vector_search": vector_search_breaker.stats(),
+        },
     }
 
 # 连通性测试端点
@@ -117,7 +181,7 @@ async def echo_test(
     request: Request,
     text: str = "test"
 ):
-    logger.info(f"Echo test request from {request.client.host}")
+    logger.info("Echo test request from %s", request.client.host)
     return {
         "echo": text,
         "headers": dict(request.headers),
@@ -161,11 +225,21 @@ def get_session():
 SessionDep = Annotated[Session, Depends(get_session)]
 
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = crud.get_user_by_username(db, username)
+# async接口使用异步会话，等待数据库时事件循环可以处理其他请求
+async def get_async_session():
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
+
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await crud.aget_user_by_username(db, username, primary=True)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # bcrypt校验是CPU密集操作，放到线程中执行
+    if not await asyncio.to_thread(verify_password, password, user.hashed_password):
         return False
     return user
 
@@ -183,7 +257,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
 
 async def get_current_user(
         token: Annotated[str, Depends(oauth2_scheme)],
-        db: SessionDep
+        db: AsyncSessionDep
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -191,21 +265,29 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        logger.debug(f"Validating token: {token[:10]}...")
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             logger.warning("Token validation failed: username not found in payload")
             raise credentials_exception
         token_data = TokenData(username=username)
-        logger.debug(f"Token validated for user: {username}")
+        logger.debug("Token validated for user: %s", username)
     except InvalidTokenError as e:
-        logger.error(f"Token validation failed: {str(e)}")
-        raise credentials_exception
-    user = crud.get_user_by_username(db, username=token_data.username)
-    if user is None:
+        logger.error("Token validation failed: %s", e)
         raise credentials_exception
-    return user
+    # 同一令牌在短时间内重复请求时不再查询用户表
+    exp = payload.get("exp")
+    principal = principal_cache.get(token_data.username, exp)
+    if principal is None:
+        # 认证读主库：刚注册、刚被停用的用户不能读到滞后的副本
+        user = await crud.aget_user_by_username(db, username=token_data.username, primary=True)
+        if user is None:
+            raise credentials_exception
+        principal = Principal.from_user(user)
+        principal_cache.put(token_data.username, exp, principal)
+    # 该用户刚写入过数据时，本请求的读取走主库
+    set_session_owner(principal.username)
+    return principal
 
 
 async def get_current_active_user(
@@ -219,9 +301,9 @@ async def get_current_active_user(
 @app.post("/api/token")
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: SessionDep
+    db: AsyncSessionDep
 ) -> Token:
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -250,24 +332,54 @@ def create_user(user: schemas.UserCreate, db: SessionDep):
     return crud.create_user(db=db, user=user)
 
 
+def _check_page_params(skip: int, cursor: Optional[str]) -> None:
+    # 游标已经确定了起点，再叠加skip含义不明确，直接拒绝而不是静默忽略
+    if skip and cursor:
+        raise HTTPException(status_code=400, detail="skip cannot be combined with cursor")
+
+
 @app.get("/api/users/", response_model=schemas.UserList)
 async def read_users(
         current_user: Annotated[schemas.User, Depends(get_current_active_user)],
-        db: SessionDep,
-        skip: int = 0,
-        limit: int = 100,
+        db: AsyncSessionDep,
+        skip: int = Query(0, ge=0),
+        limit: int = Query(100, ge=1, le=500),
+        cursor: Optional[str] = None,
 ):
-    users = crud.get_users(db, skip=skip, limit=limit)
-    return schemas.UserList(total=crud.count_users(db), users=users)
+    # skip仅为兼容按页码跳转的旧客户端；顺序翻页请使用next_cursor
+    _check_page_params(skip, cursor)
+    if skip:
+        users = await crud.aget_users(db, skip=skip, limit=limit)
+        next_cursor = user_cursor(users[-1]) if len(users) == limit else None
+    else:
+        try:
+            users, next_cursor = await crud.aget_users_page(db, cursor=cursor, limit=limit)
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return schemas.UserList(total=await crud.acount_users(db), users=users, next_cursor=next_cursor)
 
 
 @app.get("/api/users/{user_id}", response_model=schemas.User)
 async def read_user(
+        current_user: Annotated[schemas.User, Depends(get_current_active_user)],
+        user_id: int,
+        db: AsyncSessionDep
+):
+    db_user = await crud.aget_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_user
+
+
+@app.post("/api/users/{user_id}/deactivate", response_model=schemas.User)
+def deactivate_user(
         current_user: Annotated[schemas.User, Depends(get_current_active_user)],
         user_id: int,
         db: SessionDep
 ):
-    db_user = crud.get_user(db, user_id=user_id)
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    db_user = crud.set_user_active(db, user_id=user_id, is_active=False)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
@@ -277,10 +389,10 @@ async def read_user(
 async def read_user(
         current_user: Annotated[schemas.User, Depends(get_current_active_user)],
         username: str,
-        db: SessionDep
+        db: AsyncSessionDep
 ):
     # print(current_user.username)
-    db_user = crud.get_user_by_username(db, username=username)
+    db_user = await crud.aget_user_by_username(db, username=username)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
@@ -288,107 +400,91 @@ async def read_user(
 
 def calculate_semantic_similarity(text1: str, text2: str) -> float:
     """计算两段文本的语义相似度"""
-    # 调用本地embedding服务
     try:
-        resp = requests.post(
-            "http://10.176.64.152:11435/v1/embeddings",
-            json={
-                "model": "bge-m3",
-                "input": [text1, text2]
-            },
-            timeout=5
-        )
-        resp.raise_for_status()
-        embeddings = resp.json()["data"]
-        vec1 = embeddings[0]["embedding"]
-        vec2 = embeddings[1]["embedding"]
-        
-        # 计算余弦相似度
-        dot_product = sum(a*b for a, b in zip(vec1, vec2))
-        norm1 = sum(a*a for a in vec1) ** 0.5
-        norm2 = sum(b*b for b in vec2) ** 0.5
-        return dot_product / (norm1 * norm2)
+        vectors = embed_texts([text1, text2])
+        return float(cosine_matrix(vectors[:1], vectors[1:])[0, 0])
     except Exception as e:
-        print(f"Error calculating similarity: {str(e)}")
+        logger.warning("Error calculating similarity: %s", e)
         return 0.0
 
-def analyze_answer_matches(answer: str, papers: List[models.Paper]) -> List[schemas.AnswerPaperMatch]:
+async def analyze_answer_matches(answer: str, papers: List[models.Paper]) -> List[schemas.AnswerPaperMatch]:
     """分析回答内容与论文的匹配关系"""
-    matches = []
-    
-    # 将回答分割成句子
-    sentences = re.split(r'(?<=[.!?])\s+', answer)
-    
-    for sentence in sentences:
-        if not sentence.strip():
-            continue
-            
-        # 为每个句子找到最佳匹配的论文
-        best_match = None
-        best_score = 0
-        
-        for paper in papers:
-            # 计算句子与论文内容的语义相似度
-            paper_content = f"Title: {paper.title}\nAbstract: {paper.abstract}"
-            similarity = calculate_semantic_similarity(sentence, paper_content)
-            
-            if similarity > best_score:
-                best_score = similarity
-                best_match = paper
-                
-        if best_match and best_score > 0.5:  # 只考虑质量较好的匹配
-            matches.append(schemas.AnswerPaperMatch(
-                paper_id=best_match.id,
-                match_score=best_score,
-                matched_section=sentence,
-                paper=best_match
-            ))
-    
-    return matches
+    # 一次批量请求嵌入所有句子和论文，再用余弦矩阵为每个句子选出最佳论文
+    return await amatch_answer_to_papers(answer, papers)
 
 def get_similar_papers(paper_id: str, limit: int = 3) -> List[models.Paper]:
     """获取与指定论文相似的论文"""
     try:
-        # 调用向量数据库获取相似论文
-        results = papers_collection.query(
-            query_texts=[f"Find papers similar to {paper_id}"],
+        # 优先读取离线计算好的近邻表
+        with SessionLocal() as db:
+            neighbors = crud.get_paper_neighbors(db, paper_id, limit=limit)
+        if neighbors:
+            return neighbors
+        
+        # 用论文自身已存储的向量查询近邻，排除当前论文
+        stored = crud.get_paper_embeddings([paper_id])
+        if paper_id not in stored:
+            return []
+        results = get_papers_collection().query(
+            query_embeddings=[stored[paper_id]],
             n_results=limit,
-            where={"paper_id": {"$ne": paper_id}}  # 排除当前论文
+            where={"paper_id": {"$ne": paper_id}}
         )
         
         # 从结果中提取论文ID
         paper_ids = [meta["paper_id"] for meta in results["metadatas"][0]]
         
         # 从数据库获取完整论文信息
-        db = SessionLocal()
-        try:
-            papers = []
-            for pid in paper_ids:
-                paper = crud.get_paper(db, paper_id=pid)
-                if paper:
-                    papers.append(paper)
+        with SessionLocal() as db:
+            papers, _ = crud.hydrate_papers(db, paper_ids)
             return papers
-        finally:
-            db.close()
             
     except Exception as e:
-        print(f"Error finding similar papers: {str(e)}")
+        logger.warning("Error finding similar papers: %s", e)
         return []
 
+# 合并并发的相同请求：同一键只有第一个调用者真正执行
+llm_flight = SingleFlight("llm")
+search_flight = SingleFlight("search")
+
+
+def _flight_key(text: str) -> str:
+    return normalize_text(text).casefold()
+
+
 async def generate_llm_response(prompt: str) -> str:
     """Generate LLM response by calling backend_algo service"""
+    return await llm_flight.do(_flight_key(prompt), lambda: _generate_llm_response(prompt))
+
+
+def _llm_busy(response: httpx.Response) -> HTTPException:
+    # 算法层排队已满，将限流信息透传给前端
+    return HTTPException(
+        status_code=429,
+        detail="LLM is busy, please retry later",
+        headers={"Retry-After": response.headers.get("Retry-After", "5")}
+    )
+
+
+async def _generate_llm_response(prompt: str) -> str:
     try:
-        response = requests.post(
-            "http://localhost:8001/chat/",
+        url = f"{ALGO_URL}/chat/"
+        response = await get_http_client(url).post(
+            url,
             json={
                 "messages": [{
                     "role": "user",
                     "content": prompt
                 }]
-            }
+            },
+            timeout=llm_timeout()
         )
+        if response.status_code == 429:
+            raise _llm_busy(response)
         response.raise_for_status()
         return response.json()["choices"][0]["message"]["content"]
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to generate LLM response: {str(e)}")
         raise HTTPException(
@@ -396,61 +492,302 @@ async def generate_llm_response(prompt: str) -> str:
             detail="Failed to generate response from LLM"
         )
 
+async def stream_llm_response(prompt: str) -> AsyncIterator[str]:
+    """Yield answer tokens from backend_algo's streaming endpoint as they arrive"""
+    url = f"{ALGO_URL}/chat/stream/"
+    async with get_http_client(url).stream(
+        "POST",
+        url,
+        json={
+            "messages": [{
+                "role": "user",
+                "content": prompt
+            }]
+        },
+        timeout=llm_timeout()
+    ) as response:
+        if response.status_code == 429:
+            raise _llm_busy(response)
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            line = line.strip()
+            if not line.startswith("data: "):
+                continue
+            line = line[len("data: "):]
+            if line == "[DONE]":
+                break
+            delta = json.loads(line)["choices"][0].get("delta", {})
+            if delta.get("content"):
+                yield delta["content"]
+
+
+async def search_papers_detached(query: str, limit: int = 5) -> List[models.Paper]:
+    """Run crud.search_papers in a worker thread with its own session
+
+    Identical concurrent searches share one execution.
+    """
+    def run():
+        with SessionLocal() as db:
+            return crud.search_papers(db, query=query, limit=limit)
+    papers = await search_flight.do(
+        (_flight_key(query), limit),
+        lambda: asyncio.to_thread(run)
+    )
+    # 合并后的结果由多个请求共享，每个调用者拿到自己的副本
+    return [crud.copy_paper(paper) for paper in papers]
+
+
+async def search_papers_by_vector_detached(embedding: np.ndarray, limit: int = 5) -> List[models.Paper]:
+    """Vector search with an embedding we already have, e.g. the prompt's from the answer cache lookup"""
+    def run():
+        with SessionLocal() as db:
+            papers, _ = crud.hydrate_papers(db, crud.vector_search_paper_ids_by_embedding(embedding, limit))
+            return papers
+    return await asyncio.to_thread(run)
+
+
+def _pipelined_matcher(prompt_vec: Optional[np.ndarray]) -> IncrementalMatcher:
+    matcher = IncrementalMatcher(search_papers_detached)
+    if prompt_vec is not None:
+        # 复用语义缓存查询时得到的提问向量：在第一句话完成前就预取候选论文向量
+        matcher.seed(search_papers_by_vector_detached(prompt_vec, limit=5))
+    return matcher
+
+
+async def pipelined_chat(
+    prompt: str,
+    prompt_vec: Optional[np.ndarray] = None
+) -> Tuple[str, List[models.Paper], List[schemas.AnswerPaperMatch]]:
+    """Stream the answer and match each sentence to papers while generation continues"""
+    matcher = _pipelined_matcher(prompt_vec)
+    tokens = []
+    try:
+        async for token in stream_llm_response(prompt):
+            tokens.append(token)
+            matcher.feed(token)
+    except BaseException:
+        # 回答中断时取消已启动的句子嵌入和检索任务
+        await matcher.aclose()
+        raise
+    papers, matches = await matcher.finish()
+    return "".join(tokens), papers, matches
+
+
+async def recommend_from_matches(answer_matches: List[schemas.AnswerPaperMatch]) -> List[models.Paper]:
+    """基于匹配度最高的3篇论文获取额外推荐论文"""
+    recommended_papers = []
+    if answer_matches:
+        top_matches = sorted(answer_matches, key=lambda x: x.match_score, reverse=True)[:3]
+        # 并发获取每篇匹配论文的相似论文（各自在线程中使用独立会话）
+        results = await gather_bounded(
+            (asyncio.to_thread(get_similar_papers, match.paper_id, 1) for match in top_matches),
+            CHAT_MAX_PARALLELISM
+        )
+        for similar in results:
+            recommended_papers.extend(similar)
+        logger.info(f"Found {len(recommended_papers)} recommended papers")
+    return recommended_papers
+
+
+def save_chat_response(
+        db: Session,
+        user_id: int,
+        prompt: str,
+        response: str,
+        answer_matches: List[schemas.AnswerPaperMatch]
+) -> models.ChatResponse:
+    """保存回答及其论文匹配结果"""
+    chat_response = models.ChatResponse(
+        user_id=user_id,
+        prompt=prompt,
+        response=response
+    )
+    db.add(chat_response)
+    db.commit()
+    
+    for match in answer_matches:
+        db_match = models.AnswerPaperMatch(
+            response_id=chat_response.id,
+            paper_id=match.paper_id,
+            match_score=match.match_score,
+            matched_section=match.matched_section
+        )
+        db.add(db_match)
+    db.commit()
+    return chat_response
+
+
+async def persist_chat_response(
+        user_id: int,
+        prompt: str,
+        response: str,
+        answer_matches: List[schemas.AnswerPaperMatch]
+) -> int:
+    """save_chat_response in a worker thread with its own session; returns the response id"""
+    def run():
+        with SessionLocal() as db:
+            return save_chat_response(db, user_id, prompt, response, answer_matches).id
+    return await asyncio.to_thread(run)
+
+
+async def finish_chat(
+        user_id: int,
+        prompt: str,
+        response: str,
+        answer_matches: List[schemas.AnswerPaperMatch]
+) -> Tuple[List[models.Paper], int]:
+    """Fetch recommendations and persist the chat concurrently"""
+    recommended_papers, response_id = await asyncio.gather(
+        recommend_from_matches(answer_matches),
+        persist_chat_response(user_id, prompt, response, answer_matches)
+    )
+    return recommended_papers, response_id
+
+
+# 语义缓存：相似提问直接复用已缓存的回答和论文匹配
+answer_cache = SemanticAnswerCache()
+
+
+async def lookup_cached_answer(prompt: str) -> Tuple[Optional[np.ndarray], Optional[CachedAnswer]]:
+    """Embed the prompt and look it up in the semantic answer cache"""
+    try:
+        prompt_vec = (await aembed_texts([prompt]))[0]
+    except Exception as e:
+        logger.warning(f"Could not embed prompt for answer cache: {str(e)}")
+        return None, None
+    return prompt_vec, answer_cache.lookup(prompt_vec)
+
+
+def remember_answer(
+        prompt_vec: Optional[np.ndarray],
+        prompt: str,
+        response: str,
+        papers: List[models.Paper],
+        answer_matches: List[schemas.AnswerPaperMatch]
+):
+    if prompt_vec is None:
+        return
+    answer_cache.store(prompt_vec, CachedAnswer(
+        prompt=prompt,
+        response=response,
+        paper_ids=[p.id for p in papers],
+        matches=[
+            CachedMatch(m.paper_id, m.match_score, m.matched_section)
+            for m in answer_matches
+        ]
+    ))
+
+
+async def hydrate_cached_answer(cached: CachedAnswer) -> Tuple[List[models.Paper], List[schemas.AnswerPaperMatch]]:
+    """Load the papers of a cached answer and rebuild its matches"""
+    def run():
+        with SessionLocal() as db:
+            by_id = {}
+            crud.hydrate_papers(db, cached.paper_ids + [m.paper_id for m in cached.matches], identity_map=by_id)
+            return by_id
+    by_id = await asyncio.to_thread(run)
+    papers = [by_id[pid] for pid in cached.paper_ids if pid in by_id]
+    answer_matches = [
+        schemas.AnswerPaperMatch(
+            paper_id=m.paper_id,
+            match_score=m.match_score,
+            matched_section=m.matched_section,
+            paper=by_id[m.paper_id]
+        )
+        for m in cached.matches if m.paper_id in by_id
+    ]
+    return papers, answer_matches
+
+
+def _warmable_scores(matches: List[models.AnswerPaperMatch]) -> bool:
+    # match_score曾是Integer列，旧记录中的余弦分数被截断为0/1，这类记录不用于预热
+    return all(m.match_score is not None and not float(m.match_score).is_integer() for m in matches)
+
+
+async def warm_answer_cache():
+    """Warm-start the answer cache from recent chat history"""
+    def load():
+        with SessionLocal() as db:
+            return [
+                (r.prompt, r.response, r.created_at, [
+                    CachedMatch(m.paper_id, m.match_score, m.matched_section)
+                    for m in r.matched_papers
+                ])
+                for r in crud.get_recent_chat_responses(db, limit=SEMANTIC_CACHE_WARM_ENTRIES)
+                if r.prompt and r.response and _warmable_scores(r.matched_papers)
+            ]
+    try:
+        history = await asyncio.to_thread(load)
+        if not history:
+            return
+        vectors = await aembed_texts([prompt for prompt, *_ in history])
+        # Oldest first so that the most recent answers end up most recently used
+        for (prompt, response, created_at, cached_matches), vec in reversed(list(zip(history, vectors))):
+            answer = CachedAnswer(
+                prompt=prompt,
+                response=response,
+                paper_ids=list(dict.fromkeys(m.paper_id for m in cached_matches)),
+                matches=cached_matches
+            )
+            if created_at:
+                answer.created_at = created_at.replace(tzinfo=timezone.utc).timestamp()
+            answer_cache.store(vec, answer)
+        logger.info(f"Answer cache warm-started with {len(history)} chat responses")
+    except Exception as e:
+        logger.warning(f"Answer cache warm start failed: {str(e)}")
+
+
 # [新修改]搜索结果将基于模型回答内容而非用户提问
 @app.post("/api/chat", response_model=schemas.ChatResponse)
 async def chat(
         current_user: Annotated[schemas.User, Depends(get_current_active_user)],
-        chat_request: schemas.ChatRequest,
-        db: SessionDep
+        chat_request: schemas.ChatRequest
 ):
     """Enhanced chat endpoint with answer-based recommendations"""
     try:
         logger.info(f"Chat request from user {current_user.id}: {chat_request.prompt[:50]}...")
         
-        # 1. 获取模型回答
-        llm_response = await generate_llm_response(chat_request.prompt)
+        # 0. 查询语义缓存
+        prompt_vec, cached = None, None
+        if chat_request.bypass_cache:
+            answer_cache.record_bypass()
+        else:
+            prompt_vec, cached = await lookup_cached_answer(chat_request.prompt)
+        if cached:
+            logger.info(f"Answer cache hit for prompt: {cached.prompt[:50]}")
+            papers, answer_matches = await hydrate_cached_answer(cached)
+            await persist_chat_response(
+                current_user.id, chat_request.prompt, cached.response, answer_matches
+            )
+            return schemas.ChatResponse(
+                response=cached.response,
+                papers=papers,
+                matches=answer_matches
+            )
         
-        # 2. 基于模型回答搜索相关论文
-        initial_papers = crud.search_papers(db, query=llm_response, limit=5)
+        if chat_request.pipelined:
+            # 1-3. 边生成回答边检索和匹配论文
+            llm_response, initial_papers, answer_matches = await pipelined_chat(chat_request.prompt, prompt_vec)
+        else:
+            # 1. 获取模型回答
+            llm_response = await generate_llm_response(chat_request.prompt)
+            
+            # 2. 基于模型回答搜索相关论文
+            initial_papers = await search_papers_detached(llm_response, limit=5)
+            
+            # 3. 分析回答与论文的匹配关系
+            answer_matches = await analyze_answer_matches(llm_response, initial_papers)
         logger.info(f"Found {len(initial_papers)} initial papers")
-        
-        # 3. 分析回答与论文的匹配关系
-        answer_matches = analyze_answer_matches(llm_response, initial_papers)
         logger.info(f"Found {len(answer_matches)} answer matches")
         
-        # 3. 基于回答内容获取额外推荐论文
-        recommended_papers = []
-        if answer_matches:
-            # 获取匹配度最高的3篇论文
-            top_matches = sorted(answer_matches, key=lambda x: x.match_score, reverse=True)[:3]
-            for match in top_matches:
-                # 获取每篇匹配论文的相似论文
-                similar = get_similar_papers(match.paper_id, limit=1)
-                if similar:
-                    recommended_papers.extend(similar)
-            logger.info(f"Found {len(recommended_papers)} recommended papers")
-        
-        # 4. 合并结果并去重
-        all_papers = list({p.id: p for p in initial_papers + recommended_papers}.values())
-        
-        # 5. 保存结果到数据库
-        chat_response = models.ChatResponse(
-            user_id=current_user.id,
-            prompt=chat_request.prompt,
-            response=llm_response
+        # 4. 基于回答内容获取额外推荐论文，同时保存结果到数据库
+        recommended_papers, _ = await finish_chat(
+            current_user.id, chat_request.prompt, llm_response, answer_matches
         )
-        db.add(chat_response)
-        db.commit()
         
-        for match in answer_matches:
-            db_match = models.AnswerPaperMatch(
-                response_id=chat_response.id,
-                paper_id=match.paper_id,
-                match_score=match.match_score,
-                matched_section=match.matched_section
-            )
-            db.add(db_match)
-        db.commit()
+        # 5. 合并结果并去重
+        all_papers = list({p.id: p for p in initial_papers + recommended_papers}.values())
+        remember_answer(prompt_vec, chat_request.prompt, llm_response, all_papers, answer_matches)
         
         logger.info(f"Returning {len(all_papers)} papers to user")
         return schemas.ChatResponse(
@@ -458,17 +795,123 @@ async def chat(
             papers=all_papers,
             matches=answer_matches
         )
-    except requests.exceptions.RequestException as e:
-        print(f"Error calling chat service: {str(e)}")
+    except httpx.HTTPError as e:
+        logger.error("Error calling chat service: %s", e)
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Chat service is currently unavailable"
         )
 
 
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _papers_payload(papers: List[models.Paper]) -> list:
+    return [schemas.Paper.model_validate(p).model_dump(mode="json") for p in papers]
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(
+        current_user: Annotated[schemas.User, Depends(get_current_active_user)],
+        chat_request: schemas.ChatRequest
+):
+    """Streaming chat: answer tokens first, then papers, matches and recommendations as SSE events"""
+    logger.info(f"Streaming chat request from user {current_user.id}: {chat_request.prompt[:50]}...")
+    user_id = current_user.id
+
+    async def chat_events():
+        prompt_vec, cached = None, None
+        if chat_request.bypass_cache:
+            answer_cache.record_bypass()
+        else:
+            prompt_vec, cached = await lookup_cached_answer(chat_request.prompt)
+        if cached:
+            # 缓存命中：整段回答作为一个token事件发送
+            papers, answer_matches = await hydrate_cached_answer(cached)
+            yield _sse("token", {"content": cached.response})
+            yield _sse("papers", _papers_payload(papers))
+            yield _sse("matches", [m.model_dump(mode="json") for m in answer_matches])
+            yield _sse("recommendations", [])
+            response_id = await persist_chat_response(
+                user_id, chat_request.prompt, cached.response, answer_matches
+            )
+            yield _sse("done", {"response_id": response_id, "cached": True})
+            return
+
+        tokens = []
+        # 流水线模式下，每个完整句子在后续token生成的同时完成嵌入和匹配
+        matcher = _pipelined_matcher(prompt_vec) if chat_request.pipelined else None
+        try:
+            # 1. 逐个转发模型输出的token
+            async for token in stream_llm_response(chat_request.prompt):
+                tokens.append(token)
+                if matcher:
+                    matcher.feed(token)
+                yield _sse("token", {"content": token})
+        except HTTPException as e:
+            if matcher:
+                await matcher.aclose()
+            yield _sse("error", {"detail": e.detail, "status_code": e.status_code})
+            return
+        except httpx.HTTPError as e:
+            logger.error(f"Error calling chat stream service: {str(e)}")
+            if matcher:
+                await matcher.aclose()
+            yield _sse("error", {"detail": "Chat service is currently unavailable"})
+            return
+        except BaseException:
+            # 客户端断开或其他异常：先回收流水线任务
+            if matcher:
+                await matcher.aclose()
+            raise
+        llm_response = "".join(tokens)
+
+        # The request-scoped session is closed before the body is streamed,
+        # so the post-answer stages open their own sessions
+        if matcher:
+            initial_papers, answer_matches = await matcher.finish()
+            yield _sse("papers", _papers_payload(initial_papers))
+        else:
+            # 2. 基于模型回答搜索相关论文
+            initial_papers = await search_papers_detached(llm_response, limit=5)
+            yield _sse("papers", _papers_payload(initial_papers))
+
+            # 3. 分析回答与论文的匹配关系
+            answer_matches = await analyze_answer_matches(llm_response, initial_papers)
+        yield _sse("matches", [m.model_dump(mode="json") for m in answer_matches])
+
+        # 4. 获取推荐论文，同时在流结束前保存结果到数据库
+        recommended_papers, response_id = await finish_chat(
+            user_id, chat_request.prompt, llm_response, answer_matches
+        )
+        yield _sse("recommendations", _papers_payload(recommended_papers))
+        remember_answer(
+            prompt_vec, chat_request.prompt, llm_response,
+            list({p.id: p for p in initial_papers + recommended_papers}.values()),
+            answer_matches
+        )
+        yield _sse("done", {"response_id": response_id})
+
+    async def event_stream():
+        # 已经发出token后无法再返回错误状态码，出错时以error事件结束流
+        try:
+            async for frame in chat_events():
+                yield frame
+        except Exception as e:
+            logger.error("Chat stream failed after it started: %s", e, exc_info=True)
+            yield _sse("error", {"detail": "Failed to complete the chat response"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # Paper related endpoints
 @app.post("/api/papers/", response_model=schemas.Paper)
-async def create_paper(
+def create_paper(
         current_user: Annotated[schemas.User, Depends(get_current_active_user)],
         paper: schemas.PaperCreate,
         db: SessionDep
@@ -476,27 +919,136 @@ async def create_paper(
     return crud.create_paper(db=db, paper=paper)
 
 
-@app.get("/api/papers/", response_model=schemas.PaperList)
+def _paper_fields(fields: Optional[str]) -> Optional[List[str]]:
+    try:
+        return parse_paper_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# 响应由FastJSONResponse直接返回，不经过response_model校验；文档模型按fields投影，未请求的字段不会出现
+@app.get("/api/papers/", response_model=schemas.PaperProjectionList, response_class=FastJSONResponse)
 async def read_papers(
         current_user: Annotated[schemas.User, Depends(get_current_active_user)],
-        db: SessionDep,
-        skip: int = 0,
-        limit: int = 100
+        db: AsyncSessionDep,
+        skip: int = Query(0, ge=0),
+        limit: int = Query(100, ge=1, le=500),
+        cursor: Optional[str] = None,
+        fields: Optional[str] = None  # 例如 "id,title,published_date"，只查询并返回这些字段
 ):
-    papers = crud.get_papers(db, skip=skip, limit=limit)
-    return schemas.PaperList(total=crud.count_papers(db), papers=papers)
+    field_names = _paper_fields(fields)
+    columns = paper_columns(field_names)
+    # 基于(created_at, id)的游标分页，深页与首页代价相同；skip仅为兼容旧客户端
+    _check_page_params(skip, cursor)
+    if skip:
+        papers = await crud.aget_papers(db, skip=skip, limit=limit, columns=columns)
+        next_cursor = paper_cursor(papers[-1]) if len(papers) == limit else None
+    else:
+        try:
+            papers, next_cursor = await crud.aget_papers_page(db, cursor=cursor, limit=limit, columns=columns)
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    # 直接由ORM行构造字典并序列化，跳过逐行的Pydantic校验和jsonable_encoder
+    return FastJSONResponse({
+        "total": await crud.acount_papers(db),
+        "papers": paper_rows(papers, field_names),
+        "next_cursor": next_cursor,
+    })
+
+
+@app.get(
+    "/api/papers/search/", response_model=schemas.PaperProjectionSearchResponse, response_class=FastJSONResponse
+)
+async def search_papers(
+        current_user: Annotated[schemas.User, Depends(get_current_active_user)],
+        query: str,
+        db: AsyncSessionDep,
+        limit: int = 10,
+        search_type: str = "keyword",  # "keyword", "answer" or "hybrid"
+        fields: Optional[str] = None
+):
+    field_names = _paper_fields(fields)
+    start = time.perf_counter()
+    legs = None
+    if search_type == "hybrid":
+        # 向量与BM25两路并发检索，按倒数排名融合
+        papers, legs = await search_flight.do(
+            ("hybrid", _flight_key(query), limit),
+            lambda: hybrid_search(query, limit=limit)
+        )
+        papers = [crud.copy_paper(paper) for paper in papers]
+    elif search_type == "answer":
+        # Get recent chat responses for this user
+        responses = await crud.aget_recent_user_responses(db, current_user.id, limit=3)
+        
+        if not responses:
+            raise HTTPException(
+                status_code=400,
+                detail="No chat history available for answer-based search"
+            )
+            
+        # Combine responses to form search context
+        answer_text = " ".join([r.response for r in responses])
+        papers = await search_papers_detached(query, limit=limit)
+        matches = await analyze_answer_matches(answer_text, papers)
+        
+        # Sort papers by match score
+        paper_scores = {m.paper_id: m.match_score for m in matches}
+        papers.sort(key=lambda p: paper_scores.get(p.id, 0), reverse=True)
+    else:
+        # Standard keyword search
+        papers = await search_papers_detached(query, limit=limit)
+    
+    # Record searched papers in user_paper_interactions
+    await crud.arecord_user_interactions(db, [
+        schemas.UserPaperInteractionCreate(
+            user_id=current_user.id,
+            paper_id=paper.id,
+            action_type="search"
+        )
+        for paper in papers
+    ])
+    # 检索结果来自共享的整行加载，这里只按fields裁剪响应
+    return FastJSONResponse({
+        "papers": paper_rows(papers[:limit], field_names),
+        "search_time": time.perf_counter() - start,
+        "legs": [leg.model_dump() for leg in legs] if legs is not None else None,
+    })
+
+
+async def _apaper_detail(db: AsyncSession, paper_id: str) -> Optional[PaperDetail]:
+    """Serialized paper detail from the hot cache, loading it on a miss"""
+    detail = paper_detail_cache.get(paper_id)
+    if detail is None:
+        db_paper = await crud.aget_paper(db, paper_id=paper_id)
+        if not db_paper:
+            return None
+        detail = build_paper_detail(db_paper)
+        paper_detail_cache.put(detail)
+    return detail
+
+
+def _paper_detail_response(detail: PaperDetail, if_none_match: Optional[str] = None) -> Response:
+    if etag_matches(if_none_match, detail.etag):
+        return Response(status_code=304, headers=detail.headers())
+    return Response(content=detail.body, media_type="application/json", headers=detail.headers())
+
+
+async def _recommended_paper(db: AsyncSession, paper_id: str) -> Response:
+    detail = await _apaper_detail(db, paper_id)
+    if not detail:
+        raise HTTPException(status_code=404, detail=f"Paper with ID '{paper_id}' not found")
+    return _paper_detail_response(detail)
 
 
 @app.get("/api/papers/{paper_id:path}", response_model=PaperDetailResponse)
 async def read_paper(
         current_user: Annotated[schemas.User, Depends(get_current_active_user)],
         paper_id: str,
-        db: SessionDep,
+        db: AsyncSessionDep,
         request: Request
 ):
-    logger.info(f"Paper detail request - User: {current_user.id}, Paper: {paper_id}")
-    logger.debug(f"Request headers: {dict(request.headers)}")
-    logger.debug(f"Request URL: {request.url}")
+    logger.debug("Paper detail request - User: %s, Paper: %s", current_user.id, paper_id)
     
     try:
         # 规范化paper_id
@@ -507,29 +1059,17 @@ async def read_paper(
                 detail="Paper ID cannot be empty"
             )
 
-        # 尝试获取论文
-        db_paper = crud.get_paper(db, paper_id=paper_id)
-        if not db_paper:
+        # 优先读取热缓存，未命中才查询数据库
+        detail = await _apaper_detail(db, paper_id)
+        if not detail:
             logger.warning(f"Paper not found: {paper_id}")
             raise HTTPException(
                 status_code=404,
                 detail=f"Paper with ID '{paper_id}' not found"
             )
 
-        # 验证并准备响应数据
-        response_data = {
-            "id": str(db_paper.id),
-            "title": str(db_paper.title) if db_paper.title else "",
-            "authors": list(db_paper.authors) if db_paper.authors else [],
-            "abstract": str(db_paper.abstract) if db_paper.abstract else "",
-            "pdf_url": str(db_paper.pdf_url) if db_paper.pdf_url else "",
-            "keywords": list(db_paper.keywords) if db_paper.keywords else [],
-            "published_date": db_paper.published_date.isoformat() if db_paper.published_date else None,
-            "year": db_paper.published_date.year if db_paper.published_date else None
-        }
-
-        logger.debug(f"Prepared response data: {response_data}")
-        return response_data
+        # 客户端已有相同版本时返回304，不再传输正文
+        return _paper_detail_response(detail, request.headers.get("if-none-match"))
 
     except HTTPException:
         raise
@@ -539,69 +1079,11 @@ async def read_paper(
             status_code=422,
             detail=f"Error processing paper details: {str(e)}"
         )
-        
-        
-        logger.info(f"Successfully retrieved paper: {paper_id}")
-        return response_data
-        
-    except HTTPException:
-        raise  # Re-raise HTTP exceptions
-    except Exception as e:
-        logger.error(f"Error processing paper detail request: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=422,
-            detail=f"Error processing paper details: {str(e)}"
-        )
-
-
-@app.get("/api/papers/search/", response_model=schemas.PaperSearchResponse)
-async def search_papers(
-        current_user: Annotated[schemas.User, Depends(get_current_active_user)],
-        query: str,
-        db: SessionDep,
-        limit: int = 10,
-        search_type: str = "keyword"  # "keyword" or "answer"
-):
-    if search_type == "answer":
-        # Get recent chat responses for this user
-        responses = db.query(models.ChatResponse).filter(
-            models.ChatResponse.user_id == current_user.id
-        ).order_by(models.ChatResponse.created_at.desc()).limit(3).all()
-        
-        if not responses:
-            raise HTTPException(
-                status_code=400,
-                detail="No chat history available for answer-based search"
-            )
-            
-        # Combine responses to form search context
-        answer_text = " ".join([r.response for r in responses])
-        papers = crud.search_papers(db, query=query, limit=limit)
-        matches = analyze_answer_matches(answer_text, papers)
-        
-        # Sort papers by match score
-        paper_scores = {m.paper_id: m.match_score for m in matches}
-        papers.sort(key=lambda p: paper_scores.get(p.id, 0), reverse=True)
-    else:
-        # Standard keyword search
-        papers = crud.search_papers(db, query=query, limit=limit)
-    
-    # Record searched papers in user_paper_interactions
-    for paper in papers:
-        interaction = schemas.UserPaperInteractionCreate(
-            user_id=current_user.id,
-            paper_id=paper.id,
-            action_type="search"
-        )
-        crud.record_user_interaction(db=db, interaction=interaction)
-    
-    db.commit()
-    return schemas.PaperSearchResponse(papers=papers[:limit], search_time=0.0)
 
 
 async def _handle_recommendation(
     current_user: schemas.User,
-    db: Session,
+    db: AsyncSession,
     paper_id: str,
     source: str
 ) -> PaperDetailResponse:
@@ -610,14 +1092,14 @@ async def _handle_recommendation(
     
     try:
         # Verify current paper exists
-        current_paper = crud.get_paper(db, paper_id=paper_id)
+        current_paper = await crud.aget_paper(db, paper_id=paper_id)
         if not current_paper:
             logger.warning(f"Paper not found: {paper_id}")
             raise HTTPException(status_code=404, detail=f"Paper not found: {paper_id}")
         
         # Get user's recently viewed papers
-        viewed_papers = crud.get_user_interactions(
-            db, 
+        viewed_papers = await crud.aget_user_interactions(
+            db,
             user_id=current_user.id,
             action_type="view",
             limit=5
@@ -625,8 +1107,8 @@ async def _handle_recommendation(
         viewed_papers = [p for p in viewed_papers if p.id != paper_id]
         
         if not viewed_papers:
-            logger.info("No user history, using random recommendation")
-            return await _get_random_recommendation(current_user, db, paper_id)
+            logger.info("No user history, using nearest-neighbor recommendation")
+            return await _get_neighbor_recommendation(current_user, db, paper_id)
         
         # Build search query from viewed papers
         search_terms = []
@@ -637,31 +1119,26 @@ async def _handle_recommendation(
                 search_terms.append(paper.title.split()[0])
         
         if not search_terms:
-            logger.info("No keywords, using random recommendation")
-            return await _get_random_recommendation(current_user, db, paper_id)
+            logger.info("No keywords, using nearest-neighbor recommendation")
+            return await _get_neighbor_recommendation(current_user, db, paper_id)
         
         # Get most frequent terms
         from collections import Counter
         query = " ".join([term for term, _ in Counter(search_terms).most_common(3)])
         
         # Find similar papers
-        candidate_papers = crud.search_papers(db, query=query, limit=10)
+        candidate_papers = await search_papers_detached(query, limit=10)
         candidate_papers = [p for p in candidate_papers if p.id != paper_id]
         
         if not candidate_papers:
-            logger.info("No similar papers, using random recommendation")
-            return await _get_random_recommendation(current_user, db, paper_id)
+            logger.info("No similar papers, using nearest-neighbor recommendation")
+            return await _get_neighbor_recommendation(current_user, db, paper_id)
         
         # Return top candidate
         recommended_paper = candidate_papers[0]
         logger.info(f"Recommended paper: {recommended_paper.id}")
         
-        return await read_paper(
-            current_user=current_user,
-            paper_id=recommended_paper.id,
-            db=db,
-            request=Request(scope={"type": "http"})
-        )
+        return await _recommended_paper(db, recommended_paper.id)
         
     except HTTPException:
         raise
@@ -673,21 +1150,21 @@ async def _handle_recommendation(
 async def get_recommendation(
     request: Request,
     current_user: Annotated[schemas.User, Depends(get_current_active_user)],
-    db: SessionDep,
+    db: AsyncSessionDep,
     paper_id: str
 ) -> PaperDetailResponse:
     """Get paper recommendations based on user history"""
-    logger.debug(f"Recommendation request for paper: {paper_id}")
+    logger.debug("Recommendation request for paper: %s", paper_id)
     
     # Verify paper exists
-    paper = crud.get_paper(db, paper_id=paper_id)
+    paper = await crud.aget_paper(db, paper_id=paper_id)
     if not paper:
         logger.warning(f"Paper not found: {paper_id}")
         raise HTTPException(status_code=404, detail="Paper not found")
     
     # Get user's recently viewed papers (last 5)
-    viewed_papers = crud.get_user_interactions(
-        db, 
+    viewed_papers = await crud.aget_user_interactions(
+        db,
         user_id=current_user.id,
         action_type="view",
         limit=5
@@ -700,129 +1177,67 @@ async def get_recommendation(
             keywords.update(p.keywords)
     
     if not keywords:
-        # Fallback to random recommendation if no history
-        papers = db.query(models.Paper).filter(models.Paper.id != paper_id).all()
-        if not papers:
-            raise HTTPException(status_code=404, detail="No papers available")
-        recommended = random.choice(papers)
+        # Fallback to the nearest neighbor, then random, if no history
+        neighbors = await crud.aget_paper_neighbors(db, paper_id, limit=1)
+        if neighbors:
+            recommended_id = neighbors[0].id
+        else:
+            paper_ids = await crud.aget_other_paper_ids(db, paper_id)
+            if not paper_ids:
+                raise HTTPException(status_code=404, detail="No papers available")
+            recommended_id = random.choice(paper_ids)
     else:
         # Find papers with matching keywords
         query = " ".join(keywords)
-        candidates = crud.search_papers(db, query=query, limit=10)
+        candidates = await search_papers_detached(query, limit=10)
         candidates = [p for p in candidates if p.id != paper_id]
-        recommended = candidates[0] if candidates else None
+        recommended_id = candidates[0].id if candidates else None
     
-    if not recommended:
+    if not recommended_id:
         raise HTTPException(status_code=404, detail="No recommendations available")
     
-    return await read_paper(
-        current_user=current_user,
-        paper_id=recommended.id,
-        db=db,
-        request=request
-    )
-    """Get personalized recommendation based on user history and current paper"""
-    logger.info(f"Recommendation request - User: {current_user.id}, Paper: {paper_id}")
-    logger.debug(f"Full request URL: {Request.url}")
-    
-    try:
-        # Verify current paper exists with actual paper_id
-        logger.debug(f"Querying paper with ID: {paper_id}")
-        current_paper = crud.get_paper(db, paper_id=paper_id)
-        if not current_paper:
-            logger.warning(f"Paper not found: {paper_id}")
-            raise HTTPException(status_code=404, detail=f"Paper not found: {paper_id}")
-        
-        # Get user's recently viewed papers (excluding current paper)
-        viewed_papers = crud.get_user_interactions(
-            db, 
-            user_id=current_user.id,
-            action_type="view",
-            limit=5
-        )
-        viewed_papers = [p for p in viewed_papers if p.id != paper_id]
-        
-        if not viewed_papers:
-            logger.info("No user history available, falling back to random recommendation")
-            return await _get_random_recommendation(current_user, db, paper_id)
-        
-        # Build search query from viewed papers' keywords
-        search_terms = []
-        for paper in viewed_papers:
-            if paper.keywords:
-                search_terms.extend(paper.keywords)
-            if paper.title:
-                search_terms.append(paper.title.split()[0])  # Add first word of title
-        
-        if not search_terms:
-            logger.info("No keywords available, falling back to random recommendation")
-            return await _get_random_recommendation(current_user, db, paper_id)
-        
-        # Use most frequent 3 terms as query
-        from collections import Counter
-        query = " ".join([term for term, _ in Counter(search_terms).most_common(3)])
-        logger.debug(f"Generated search query from user history: {query}")
-        
-        # Search for similar papers (excluding current paper)
-        candidate_papers = crud.search_papers(db, query=query, limit=10)
-        candidate_papers = [p for p in candidate_papers if p.id != paper_id]
-        
-        if not candidate_papers:
-            logger.info("No similar papers found, falling back to random recommendation")
-            return await _get_random_recommendation(current_user, db, paper_id)
-        
-        # Select top candidate
-        recommended_paper = candidate_papers[0]
-        logger.info(f"Recommended paper: {recommended_paper.id} ({recommended_paper.title})")
-        
-        return await read_paper(
-            current_user=current_user,
-            paper_id=recommended_paper.id,
-            db=db,
-            request=Request(scope={"type": "http"})
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Recommendation error: {str(e)}", exc_info=True)
-        # Fallback to random recommendation on error
+    return await _recommended_paper(db, recommended_id)
+
+
+async def _get_neighbor_recommendation(
+    current_user: schemas.User,
+    db: AsyncSession,
+    paper_id: str
+) -> PaperDetailResponse:
+    """Most similar paper from the precomputed neighbor table, else random"""
+    neighbors = await crud.aget_paper_neighbors(db, paper_id, limit=1)
+    if not neighbors:
         return await _get_random_recommendation(current_user, db, paper_id)
+    logger.info(f"Nearest-neighbor recommended paper: {neighbors[0].id}")
+    return await _recommended_paper(db, neighbors[0].id)
 
 
 async def _get_random_recommendation(
     current_user: schemas.User,
-    db: Session,
+    db: AsyncSession,
     exclude_paper_id: str
 ) -> PaperDetailResponse:
     """Fallback random recommendation"""
-    all_papers = db.query(models.Paper)\
-        .filter(models.Paper.id != exclude_paper_id)\
-        .all()
+    # 只取id，不必为随机选一篇加载全部论文的摘要
+    paper_ids = await crud.aget_other_paper_ids(db, exclude_paper_id)
     
-    if not all_papers:
+    if not paper_ids:
         raise HTTPException(
             status_code=404,
             detail="No papers available for recommendation"
         )
     
-    import random
-    recommended_paper = random.choice(all_papers)
-    logger.info(f"Randomly recommended paper: {recommended_paper.id}")
+    recommended_id = random.choice(paper_ids)
+    logger.info(f"Randomly recommended paper: {recommended_id}")
     
-    return await read_paper(
-        current_user=current_user,
-        paper_id=recommended_paper.id,
-        db=db,
-        request=Request(scope={"type": "http"})
-    )
+    return await _recommended_paper(db, recommended_id)
 
 
 @app.post("/api/papers/{paper_id}/interact")
 async def record_paper_interaction(
     current_user: Annotated[schemas.User, Depends(get_current_active_user)],
     paper_id: str,
-    db: SessionDep,
+    db: AsyncSessionDep,
     action_type: str = "view"
 ):
     """Simplified interaction recording endpoint"""
@@ -835,17 +1250,16 @@ async def record_paper_interaction(
     )
     
     try:
-        crud.record_user_interaction(db=db, interaction=interaction)
-        db.commit()
+        await crud.arecord_user_interactions(db, [interaction])
         return {"status": "success", "message": "Interaction recorded"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Error recording interaction: {str(e)}")
         return {"status": "error", "message": "Failed to record interaction"}
 
 # 调试接口 - 获取所有论文数据
 @app.get("/test/papers")
-async def debug_papers(db: SessionDep):
+def debug_papers(db: SessionDep):
     papers = crud.get_papers(db, skip=0, limit=100)
     return {
         "count": len(papers),
@@ -867,7 +1281,7 @@ async def debug_paper_request(paper_id: str):
 
 # 调试接口 - 添加测试论文数据
 @app.post("/test/papers")
-async def add_test_papers(db: SessionDep):
+def add_test_papers(db: SessionDep):
     test_papers = [
         {
             "title": "深度学习在自然语言处理中的应用",
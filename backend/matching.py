@@ -0,0 +1,311 @@
+"""Answer-to-paper matching.
+
+Paper vectors are read from the Chroma ``papers`` collection where they were
+stored at ingest time; only the answer sentences (plus any paper that has not
+been embedded yet) go to the embedding server, in one batched request. The
+best paper for each sentence is picked from the full sentence x paper cosine
+matrix.
+
+``IncrementalMatcher`` does the same work while the answer is still being
+generated: sentences are embedded as soon as they are complete and the
+candidate papers are refreshed from vector search as the answer grows.
+"""
+import asyncio
+import logging
+import re
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import crud, models, schemas
+from .embedding import aembed_texts, cosine_matrix, embed_texts
+
+logger = logging.getLogger(__name__)
+
+# 只考虑质量较好的匹配
+MATCH_THRESHOLD = 0.5
+# Pipelined mode: refresh the candidate papers every N completed sentences
+CANDIDATE_REFRESH_SENTENCES = 2
+
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+
+
+def split_sentences(text: str) -> List[str]:
+    """将回答分割成句子"""
+    return [s for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+
+
+class SentenceStream:
+    """Finds sentence boundaries in a token stream.
+
+    Uses the same rule as ``split_sentences``: a sentence ends at ``.``, ``!``
+    or ``?`` followed by whitespace, so a sentence is only known to be complete
+    once the whitespace after it has arrived.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, token: str) -> List[str]:
+        """Add a token and return the sentences it completed."""
+        self._buffer += token
+        parts = _SENTENCE_SPLIT.split(self._buffer)
+        self._buffer = parts.pop().lstrip()
+        return [s for s in parts if s.strip()]
+
+    def flush(self) -> List[str]:
+        """Return the trailing sentence once the stream has ended."""
+        rest, self._buffer = self._buffer, ""
+        return [rest] if rest.strip() else []
+
+
+def paper_text(paper: models.Paper) -> str:
+    """Text used to represent a paper when it has to be embedded on the fly."""
+    return f"Title: {paper.title}\nAbstract: {paper.abstract}"
+
+
+def load_paper_vectors(papers: List[models.Paper]) -> Dict[str, np.ndarray]:
+    """Stored vectors of the given papers, keyed by paper id."""
+    try:
+        stored = crud.get_paper_embeddings([p.id for p in papers])
+    except Exception as e:
+        logger.warning("Could not read stored paper embeddings: %s", e)
+        return {}
+    return {pid: np.asarray(vec, dtype=np.float32) for pid, vec in stored.items()}
+
+
+def _texts_to_embed(
+    sentences: List[str],
+    papers: List[models.Paper],
+    stored: Dict[str, np.ndarray]
+) -> Tuple[List[str], List[models.Paper]]:
+    missing = [p for p in papers if p.id not in stored]
+    if missing:
+        logger.debug("%s papers have no stored embedding, embedding on the fly", len(missing))
+    return sentences + [paper_text(p) for p in missing], missing
+
+
+def _split_vectors(
+    vectors: np.ndarray,
+    sentences: List[str],
+    papers: List[models.Paper],
+    missing: List[models.Paper],
+    stored: Dict[str, np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    sentence_vecs = vectors[:len(sentences)]
+    fresh = dict(zip((p.id for p in missing), vectors[len(sentences):]))
+    paper_vecs = np.vstack([stored[p.id] if p.id in stored else fresh[p.id] for p in papers])
+    return sentence_vecs, paper_vecs
+
+
+def embed_answer_and_papers(
+    sentences: List[str],
+    papers: List[models.Paper]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Sentence and paper matrices, embedding only what is not stored yet."""
+    stored = load_paper_vectors(papers)
+    texts, missing = _texts_to_embed(sentences, papers, stored)
+    return _split_vectors(embed_texts(texts), sentences, papers, missing, stored)
+
+
+async def aembed_answer_and_papers(
+    sentences: List[str],
+    papers: List[models.Paper]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Async ``embed_answer_and_papers`` going through the embedding batcher."""
+    stored = await asyncio.to_thread(load_paper_vectors, papers)
+    texts, missing = _texts_to_embed(sentences, papers, stored)
+    return _split_vectors(await aembed_texts(texts), sentences, papers, missing, stored)
+
+
+def best_matches(
+    sentences: List[str],
+    sentence_vecs: np.ndarray,
+    papers: List[models.Paper],
+    paper_vecs: np.ndarray,
+    threshold: float = MATCH_THRESHOLD
+) -> List[schemas.AnswerPaperMatch]:
+    """Pick the best paper for every sentence from the cosine matrix."""
+    if not sentences or not papers:
+        return []
+
+    scores = cosine_matrix(sentence_vecs, paper_vecs)
+    best_idx = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(sentences)), best_idx]
+
+    matches = []
+    for sentence, idx, score in zip(sentences, best_idx, best_scores):
+        if score > threshold:
+            paper = papers[idx]
+            matches.append(schemas.AnswerPaperMatch(
+                paper_id=paper.id,
+                match_score=float(score),
+                matched_section=sentence,
+                paper=paper
+            ))
+    return matches
+
+
+def match_answer_to_papers(answer: str, papers: List[models.Paper]) -> List[schemas.AnswerPaperMatch]:
+    """分析回答内容与论文的匹配关系"""
+    sentences = split_sentences(answer)
+    if not sentences or not papers:
+        return []
+
+    try:
+        sentence_vecs, paper_vecs = embed_answer_and_papers(sentences, papers)
+    except Exception as e:
+        logger.error("Error embedding answer for matching: %s", e)
+        return []
+
+    return best_matches(sentences, sentence_vecs, papers, paper_vecs)
+
+
+class IncrementalMatcher:
+    """Matches answer sentences to papers while the answer is being generated.
+
+    ``feed`` every token as it arrives. Completed sentences are embedded right
+    away (through the embedding batcher), and every
+    ``CANDIDATE_REFRESH_SENTENCES`` sentences the candidate set is refreshed
+    by running ``search_fn`` on the answer so far, loading the new papers'
+    vectors in the background. ``finish`` runs the final search on the whole
+    answer, as the non-pipelined path does; by then nearly every sentence and
+    paper vector is already available, so only the cosine matrix remains.
+
+    Background tasks are owned by the matcher: ``finish`` cleans them up, and
+    callers that abandon the answer early (the LLM stream failed, the client
+    went away) must call ``aclose``.
+    """
+
+    def __init__(
+        self,
+        search_fn: Callable[[str], Awaitable[List[models.Paper]]],
+        refresh_every: int = CANDIDATE_REFRESH_SENTENCES
+    ):
+        self.search_fn = search_fn
+        self.refresh_every = refresh_every
+        self._stream = SentenceStream()
+        self._text: List[str] = []
+        self.sentences: List[str] = []
+        self._sentence_tasks: List[asyncio.Task] = []
+        self._paper_vecs: Dict[str, asyncio.Task] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_pending = False
+        self._since_refresh = 0
+        self._tasks: set = set()
+
+    def seed(self, candidates: Awaitable[List[models.Paper]]) -> None:
+        """Start loading vectors for an early candidate set, e.g. papers near the prompt."""
+        async def run():
+            try:
+                self._load_vectors(await candidates)
+            except Exception as e:
+                logger.warning("Seeding candidates failed: %s", e)
+        self._spawn(run())
+
+    def feed(self, token: str) -> List[str]:
+        """Consume a token; returns the sentences it completed."""
+        self._text.append(token)
+        completed = self._stream.feed(token)
+        for sentence in completed:
+            self._add_sentence(sentence)
+        return completed
+
+    async def finish(self) -> Tuple[List[models.Paper], List[schemas.AnswerPaperMatch]]:
+        """Final candidate papers and sentence matches for the whole answer."""
+        try:
+            for sentence in self._stream.flush():
+                self._add_sentence(sentence)
+            answer = "".join(self._text)
+
+            papers = await self.search_fn(answer)
+            self._load_vectors(papers)
+            if not self.sentences or not papers:
+                return papers, []
+
+            try:
+                sentence_vecs = np.vstack(await asyncio.gather(*self._sentence_tasks))
+                paper_vecs = np.vstack(await asyncio.gather(*(self._paper_vecs[p.id] for p in papers)))
+            except Exception as e:
+                logger.error("Error embedding answer for matching: %s", e)
+                return papers, []
+            return papers, best_matches(self.sentences, sentence_vecs, papers, paper_vecs)
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        """Cancel the background embedding and refresh tasks and reap them."""
+        tasks = list(self._tasks)
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        # Retrieves their exceptions too, so none is reported as never retrieved
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        return task
+
+    def _add_sentence(self, sentence: str) -> None:
+        self.sentences.append(sentence)
+        self._sentence_tasks.append(self._spawn(self._embed_sentence(sentence)))
+        self._since_refresh += 1
+        if self._since_refresh >= self.refresh_every:
+            self._since_refresh = 0
+            self._schedule_refresh()
+
+    @staticmethod
+    async def _embed_sentence(sentence: str) -> np.ndarray:
+        return (await aembed_texts([sentence]))[0]
+
+    def _schedule_refresh(self) -> None:
+        # At most one search in flight; coalesce requests that arrive meanwhile
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_pending = True
+            return
+        self._refresh_task = self._spawn(self._refresh("".join(self._text)))
+
+    async def _refresh(self, partial_answer: str) -> None:
+        try:
+            papers = await self.search_fn(partial_answer)
+            self._load_vectors(papers)
+            logger.debug("Pipelined matching refreshed candidates: %s papers", len(papers))
+        except Exception as e:
+            logger.warning("Candidate refresh failed: %s", e)
+        if self._refresh_pending:
+            self._refresh_pending = False
+            self._refresh_task = self._spawn(self._refresh("".join(self._text)))
+
+    def _load_vectors(self, papers: List[models.Paper]) -> None:
+        new = [p for p in papers if p.id not in self._paper_vecs]
+        if not new:
+            return
+        task = self._spawn(self._paper_vectors(new))
+        for index, paper in enumerate(new):
+            self._paper_vecs[paper.id] = self._spawn(_pick(task, index))
+
+    @staticmethod
+    async def _paper_vectors(papers: List[models.Paper]) -> np.ndarray:
+        stored = await asyncio.to_thread(load_paper_vectors, papers)
+        texts, missing = _texts_to_embed([], papers, stored)
+        return _split_vectors(await aembed_texts(texts), [], papers, missing, stored)[1]
+
+
+async def _pick(task: asyncio.Task, index: int) -> np.ndarray:
+    return (await task)[index]
+
+
+async def amatch_answer_to_papers(answer: str, papers: List[models.Paper]) -> List[schemas.AnswerPaperMatch]:
+    """``match_answer_to_papers`` for request handlers."""
+    sentences = split_sentences(answer)
+    if not sentences or not papers:
+        return []
+
+    try:
+        sentence_vecs, paper_vecs = await aembed_answer_and_papers(sentences, papers)
+    except Exception as e:
+        logger.error("Error embedding answer for matching: %s", e)
+        return []
+
+    return best_matches(sentences, sentence_vecs, papers, paper_vecs)
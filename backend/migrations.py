@@ -0,0 +1,123 @@
+"""Schema steps for databases created before a model change.
+
+``create_all`` only creates missing tables; it never changes an existing one.
+Each step here checks the live schema and applies one change if it is still
+missing, so running them is idempotent and safe on a fresh database. The
+backend applies pending steps at startup right after ``create_all``; operators
+can also run them by hand::
+
+    python -m backend.migrations --dry-run   # list pending steps
+    python -m backend.migrations             # apply them
+"""
+import logging
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import sqltypes
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+
+class Step(NamedTuple):
+    id: str
+    needed: Callable[[Connection], bool]
+    apply: Callable[[Connection], None]
+
+
+def _match_score_is_integer(conn: Connection) -> bool:
+    # SQLite stores non-integral values in an INTEGER column as REAL, nothing is truncated
+    if conn.dialect.name == "sqlite":
+        return False
+    columns = {c["name"]: c for c in inspect(conn).get_columns("answer_paper_matches")}
+    return isinstance(columns["match_score"]["type"], sqltypes.Integer)
+
+
+def _match_score_to_float(conn: Connection) -> None:
+    if conn.dialect.name == "mysql":
+        conn.execute(text("ALTER TABLE answer_paper_matches MODIFY match_score FLOAT"))
+    else:
+        conn.execute(text("ALTER TABLE answer_paper_matches ALTER COLUMN match_score TYPE FLOAT"))
+
+
+def _index_missing(table: str, name: str) -> Callable[[Connection], bool]:
+    def needed(conn: Connection) -> bool:
+        return name not in {index["name"] for index in inspect(conn).get_indexes(table)}
+    return needed
+
+
+def _create_index(table, name: str) -> Callable[[Connection], None]:
+    def apply(conn: Connection) -> None:
+        next(index for index in table.indexes if index.name == name).create(conn)
+    return apply
+
+
+def _papers_created_at_nullable(conn: Connection) -> bool:
+    if conn.execute(text("SELECT 1 FROM papers WHERE created_at IS NULL LIMIT 1")).first():
+        return True
+    # SQLite can't add NOT NULL to an existing column; the backfill is all it gets
+    if conn.dialect.name == "sqlite":
+        return False
+    columns = {c["name"]: c for c in inspect(conn).get_columns("papers")}
+    return columns["created_at"]["nullable"]
+
+
+def _papers_created_at_not_null(conn: Connection) -> None:
+    conn.execute(text(
+        "UPDATE papers SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL"
+    ))
+    if conn.dialect.name == "mysql":
+        conn.execute(text("ALTER TABLE papers MODIFY created_at DATETIME NOT NULL"))
+    elif conn.dialect.name != "sqlite":
+        conn.execute(text("ALTER TABLE papers ALTER COLUMN created_at SET NOT NULL"))
+
+
+STEPS: List[Step] = [
+    # Cosine scores were truncated to 0/1 by the old INT column
+    Step("0001_answer_match_score_float", _match_score_is_integer, _match_score_to_float),
+    Step(
+        "0002_ix_papers_created_at_id",
+        _index_missing("papers", "ix_papers_created_at_id"),
+        _create_index(models.Paper.__table__, "ix_papers_created_at_id"),
+    ),
+    Step(
+        "0003_ix_papers_updated_at",
+        _index_missing("papers", "ix_papers_updated_at"),
+        _create_index(models.Paper.__table__, "ix_papers_updated_at"),
+    ),
+    # Keyset pages seek on (created_at, id); rows with a NULL created_at were unreachable
+    Step("0004_papers_created_at_not_null", _papers_created_at_nullable, _papers_created_at_not_null),
+]
+
+
+def pending_steps(engine: Engine) -> List[str]:
+    with engine.connect() as conn:
+        return [step.id for step in STEPS if step.needed(conn)]
+
+
+def upgrade(engine: Engine) -> List[str]:
+    """Apply every pending step in order; returns the ids that were applied"""
+    applied = []
+    for step in STEPS:
+        with engine.begin() as conn:
+            if not step.needed(conn):
+                continue
+            logger.warning("Applying schema step %s", step.id)
+            step.apply(conn)
+        applied.append(step.id)
+    return applied
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Bring an existing database up to the current models")
+    parser.add_argument("--dry-run", action="store_true", help="only list pending steps")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    steps = pending_steps(engine) if args.dry_run else upgrade(engine)
+    print(("Pending: " if args.dry_run else "Applied: ") + (", ".join(steps) or "none"))
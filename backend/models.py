@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, JSON
+from sqlalchemy import Boolean, Column, ForeignKey, Float, Index, Integer, String, Text, DateTime, JSON
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -30,12 +30,20 @@ class Paper(Base):
     keywords = Column(JSON)  # Store as JSON array
     published_date = Column(DateTime, nullable=True)
     pdf_url = Column(String(512))
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # 非空：分页游标按 (created_at, id) 定位，NULL 行会在第一页之后无法到达
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_processed = Column(Boolean, default=False)
 
     users = relationship("UserPaperInteraction", back_populates="paper")
 
+    __table_args__ = (
+        # Keyset pagination order of the paper list
+        Index("ix_papers_created_at_id", "created_at", "id"),
+        # BM25 sync picks up papers changed since its watermark
+        Index("ix_papers_updated_at", "updated_at"),
+    )
+
 
 class UserPaperInteraction(Base):
     __tablename__ = "user_paper_interactions"
@@ -69,9 +77,27 @@ class AnswerPaperMatch(Base):
     id = Column(Integer, primary_key=True)
     response_id = Column(Integer, ForeignKey("chat_responses.id"))
     paper_id = Column(String(50), ForeignKey("papers.id"))
-    match_score = Column(Integer)  # 匹配分数
+    match_score = Column(Float)  # 匹配分数（余弦相似度）
     matched_section = Column(Text)  # 回答中匹配的部分
     created_at = Column(DateTime, default=datetime.utcnow)
 
     chat_response = relationship("ChatResponse", back_populates="matched_papers")
     paper = relationship("Paper")
+
+
+class PaperNeighbor(Base):
+    """Precomputed top-k nearest neighbors of a paper by embedding cosine similarity"""
+    __tablename__ = "paper_neighbors"
+
+    id = Column(Integer, primary_key=True)
+    paper_id = Column(String(50), ForeignKey("papers.id"))
+    neighbor_id = Column(String(50), ForeignKey("papers.id"))
+    rank = Column(Integer)  # 0 = most similar
+    score = Column(Float)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    neighbor = relationship("Paper", foreign_keys=[neighbor_id])
+
+    __table_args__ = (
+        Index("ix_paper_neighbors_paper_rank", "paper_id", "rank"),
+    )
@@ -0,0 +1,124 @@
+"""Keyset pagination cursors and cached table totals for the list endpoints.
+
+A cursor is the sort key of the last row on a page, JSON encoded and then
+base64url encoded so that clients treat it as opaque. The next page is read
+with a ``WHERE key > cursor ORDER BY key LIMIT n`` seek (descending for
+papers, newest first) that goes straight to the position through the index.
+Deep pages therefore cost the same as the first one, unlike ``OFFSET`` which
+reads and discards the skipped rows.
+
+Totals are cached per table for ``ROW_COUNT_TTL_SECONDS``. Inserts and
+deletes made through the ORM in this process drop the cached value. Writes
+from other processes, such as the crawler, show up once the TTL expires.
+"""
+import base64
+import binascii
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+from . import models
+
+ROW_COUNT_TTL_SECONDS = float(os.getenv("ROW_COUNT_TTL_SECONDS", "60"))
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by this API"""
+
+
+def encode_cursor(*values) -> str:
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(str(e)) from e
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("unexpected cursor shape")
+    return values
+
+
+def paper_cursor(paper: models.Paper) -> str:
+    return encode_cursor(paper.created_at, paper.id)
+
+
+def decode_paper_cursor(cursor: str) -> Tuple[datetime, str]:
+    created_at, paper_id = decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(created_at), str(paper_id)
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor(str(e)) from e
+
+
+def user_cursor(user: models.User) -> str:
+    return encode_cursor(user.id)
+
+
+def decode_user_cursor(cursor: str) -> int:
+    (user_id,) = decode_cursor(cursor, 1)
+    if not isinstance(user_id, int):
+        raise InvalidCursor("user cursor must hold an integer id")
+    return user_id
+
+
+class RowCountCache:
+    def __init__(self, ttl_seconds: float = ROW_COUNT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        # table -> (count, cached_at)
+        self._counts: Dict[str, Tuple[int, float]] = {}
+        # Bumped on every invalidation so a count that raced with a write isn't stored
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, table: str) -> Optional[int]:
+        with self._lock:
+            entry = self._counts.get(table)
+            if entry is None or time.monotonic() - entry[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def generation(self, table: str) -> int:
+        return self._generations.get(table, 0)
+
+    def put(self, table: str, count: int, generation: int) -> None:
+        with self._lock:
+            if self._generations.get(table, 0) == generation:
+                self._counts[table] = (count, time.monotonic())
+
+    def invalidate(self, table: str) -> None:
+        with self._lock:
+            self._counts.pop(table, None)
+            self._generations[table] = self._generations.get(table, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tables": {table: count for table, (count, _) in self._counts.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+row_counts = RowCountCache()
+
+
+@event.listens_for(models.Paper, "after_insert")
+@event.listens_for(models.Paper, "after_delete")
+@event.listens_for(models.User, "after_insert")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_row_count(mapper, connection, target):
+    row_counts.invalidate(mapper.local_table.name)
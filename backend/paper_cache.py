@@ -0,0 +1,159 @@
+"""LRU cache of serialized paper detail responses.
+
+Entries hold the JSON body together with an ETag and Last-Modified value
+derived from ``Paper.updated_at``, so a hit costs neither a database query
+nor re-serialization, and a client that already has the body gets a 304.
+Entries are dropped once a transaction that updated or deleted the paper
+through the ORM in this process commits, so a rolled-back change doesn't
+evict anything and a concurrent reader can't re-cache the row between the
+flush and the commit. Entries expire after ``ttl_seconds`` to pick up changes
+made by other processes.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import timezone
+from email.utils import format_datetime
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import models
+
+PAPER_DETAIL_CACHE_ITEMS = int(os.getenv("PAPER_DETAIL_CACHE_ITEMS", "5000"))
+PAPER_DETAIL_CACHE_TTL_SECONDS = float(os.getenv("PAPER_DETAIL_CACHE_TTL_SECONDS", "300"))
+
+
+@dataclass
+class PaperDetail:
+    paper_id: str
+    body: bytes
+    etag: str
+    last_modified: Optional[str]
+    cached_at: float = field(default_factory=time.monotonic)
+
+    def headers(self) -> dict:
+        headers = {"ETag": self.etag}
+        if self.last_modified:
+            headers["Last-Modified"] = self.last_modified
+        return headers
+
+
+def paper_detail_payload(paper: models.Paper) -> dict:
+    return {
+        "id": str(paper.id),
+        "title": str(paper.title) if paper.title else "",
+        "authors": list(paper.authors) if paper.authors else [],
+        "abstract": str(paper.abstract) if paper.abstract else "",
+        "pdf_url": str(paper.pdf_url) if paper.pdf_url else "",
+        "keywords": list(paper.keywords) if paper.keywords else [],
+        "published_date": paper.published_date.isoformat() if paper.published_date else None,
+        "year": paper.published_date.year if paper.published_date else None
+    }
+
+
+def build_paper_detail(paper: models.Paper) -> PaperDetail:
+    version = paper.updated_at.isoformat() if paper.updated_at else ""
+    last_modified = None
+    if paper.updated_at:
+        # updated_at is stored as naive UTC
+        last_modified = format_datetime(paper.updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+    return PaperDetail(
+        paper_id=str(paper.id),
+        body=json.dumps(paper_detail_payload(paper), ensure_ascii=False).encode("utf-8"),
+        etag='"' + hashlib.sha1(f"{paper.id}:{version}".encode("utf-8")).hexdigest()[:20] + '"',
+        last_modified=last_modified
+    )
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return "*" in candidates or etag in [tag.removeprefix("W/") for tag in candidates]
+
+
+class PaperDetailCache:
+    def __init__(
+        self,
+        max_items: int = PAPER_DETAIL_CACHE_ITEMS,
+        ttl_seconds: float = PAPER_DETAIL_CACHE_TTL_SECONDS
+    ):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[str, PaperDetail]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, paper_id: str) -> Optional[PaperDetail]:
+        with self._lock:
+            detail = self._items.get(paper_id)
+            if detail is None or time.monotonic() - detail.cached_at > self.ttl_seconds:
+                if detail is not None:
+                    del self._items[paper_id]
+                self.misses += 1
+                return None
+            self._items.move_to_end(paper_id)
+            self.hits += 1
+            return detail
+
+    def put(self, detail: PaperDetail) -> None:
+        with self._lock:
+            self._items[detail.paper_id] = detail
+            self._items.move_to_end(detail.paper_id)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def invalidate(self, paper_id: str) -> None:
+        with self._lock:
+            if self._items.pop(paper_id, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+paper_detail_cache = PaperDetailCache()
+
+
+# session.info key for paper ids written in the current transaction
+_PENDING_KEY = "paper_detail_evict"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_written_papers(session, flush_context):
+    # Still the pre-flush state here: dirty/deleted hold what was just written
+    written = [
+        obj for obj in session.dirty
+        if isinstance(obj, models.Paper) and session.is_modified(obj, include_collections=False)
+    ]
+    written += [obj for obj in session.deleted if isinstance(obj, models.Paper)]
+    if written:
+        session.info.setdefault(_PENDING_KEY, set()).update(str(paper.id) for paper in written)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_committed_papers(session):
+    for paper_id in session.info.pop(_PENDING_KEY, ()):
+        paper_detail_cache.invalidate(paper_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_papers(session):
+    session.info.pop(_PENDING_KEY, None)
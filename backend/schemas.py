@@ -50,10 +50,15 @@ class User(UserBase):
 class UserList(BaseModel):
     total: int
     users: List[User]
+    next_cursor: Optional[str] = None
 
 
 class ChatRequest(BaseModel):
     prompt: str
+    # Match answer sentences to papers while the answer is still being generated
+    pipelined: bool = False
+    # Skip the semantic answer cache and always ask the LLM
+    bypass_cache: bool = False
 
 
 class AnswerPaperMatch(BaseModel):
@@ -74,6 +79,7 @@ class ChatResponse(BaseModel):
 class PaperList(BaseModel):
     total: int
     papers: List[Paper]
+    next_cursor: Optional[str] = None
 
 
 class AnswerSearchRequest(BaseModel):
@@ -84,6 +90,7 @@ class AnswerSearchRequest(BaseModel):
 class PaperList(BaseModel):
     total: int
     papers: List[Paper]
+    next_cursor: Optional[str] = None
 
 
 class PaperSearchRequest(BaseModel):
@@ -91,9 +98,44 @@ class PaperSearchRequest(BaseModel):
     limit: int = 10
 
 
+class SearchLegStats(BaseModel):
+    name: str  # "vector" or "lexical"
+    status: str  # "ok", "timeout", "error" or "circuit_open"
+    latency_ms: float
+    hits: int
+    contributed: int  # returned papers this leg ranked
+
+
 class PaperSearchResponse(BaseModel):
     papers: List[Paper]
     search_time: float
+    legs: Optional[List[SearchLegStats]] = None
+
+
+class PaperProjection(BaseModel):
+    """A paper limited to the ``fields`` query parameter: only ``id`` is always present."""
+    id: str
+    title: Optional[str] = None
+    authors: Optional[List[str]] = None
+    abstract: Optional[str] = None
+    keywords: Optional[List[str]] = None
+    published_date: Optional[datetime] = None
+    pdf_url: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    is_processed: Optional[bool] = None
+
+
+class PaperProjectionList(BaseModel):
+    total: int
+    papers: List[PaperProjection]
+    next_cursor: Optional[str] = None
+
+
+class PaperProjectionSearchResponse(BaseModel):
+    papers: List[PaperProjection]
+    search_time: float
+    legs: Optional[List[SearchLegStats]] = None
 
 
 class PaperRecommendRequest(BaseModel):
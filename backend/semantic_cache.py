@@ -0,0 +1,125 @@
+"""Semantic cache of LLM answers keyed by prompt embedding.
+
+A new prompt whose embedding is within ``threshold`` cosine similarity of a
+cached prompt reuses that prompt's answer and paper matches. Entries expire
+after ``ttl_seconds`` and the least recently used ones are evicted beyond
+``max_entries``. The cache can be warm-started from the ``chat_responses``
+table, which already stores every prompt/answer pair.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", str(24 * 3600)))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_WARM_ENTRIES = int(os.getenv("SEMANTIC_CACHE_WARM_ENTRIES", "200"))
+
+
+@dataclass
+class CachedMatch:
+    paper_id: str
+    match_score: float
+    matched_section: str
+
+
+@dataclass
+class CachedAnswer:
+    prompt: str
+    response: str
+    paper_ids: List[str]
+    matches: List[CachedMatch]
+    created_at: float = field(default_factory=time.time)
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds: float = SEMANTIC_CACHE_TTL_SECONDS,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._vectors: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._next_id = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def lookup(self, prompt_vec: np.ndarray) -> Optional[CachedAnswer]:
+        """Closest cached answer above the similarity threshold, if any."""
+        with self._lock:
+            self._expire()
+            if not self._entries:
+                self.misses += 1
+                return None
+            matrix, ids = self._get_matrix()
+            scores = matrix @ _unit(prompt_vec)
+            best = int(scores.argmax())
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            entry_id = ids[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return self._entries[entry_id]
+
+    def store(self, prompt_vec: np.ndarray, answer: CachedAnswer) -> None:
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = answer
+            self._vectors[entry_id] = _unit(prompt_vec)
+            while len(self._entries) > self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                del self._vectors[oldest]
+            self._matrix = None
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+    def _expire(self) -> None:
+        deadline = time.time() - self.ttl_seconds
+        expired = [k for k, v in self._entries.items() if v.created_at < deadline]
+        for k in expired:
+            del self._entries[k]
+            del self._vectors[k]
+        if expired:
+            self._matrix = None
+
+    def _get_matrix(self):
+        if self._matrix is None:
+            self._matrix_ids = list(self._vectors.keys())
+            self._matrix = np.vstack([self._vectors[k] for k in self._matrix_ids])
+        return self._matrix, self._matrix_ids
+
+
+def _unit(vec: np.ndarray) -> np.ndarray:
+    vec = np.asarray(vec, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
@@ -0,0 +1,69 @@
+"""Fast JSON rendering and field projection for list-heavy paper responses.
+
+The default FastAPI path validates every row into a ``schemas.Paper`` model,
+runs ``jsonable_encoder`` over it and then calls ``json.dumps``. List
+endpoints instead build plain dicts straight from the ORM rows. These hold
+only the fields the client asked for with ``fields=``, so a page of titles
+doesn't carry 100 abstracts. ``FastJSONResponse`` then renders the dicts
+with orjson when it is installed and falls back to the standard library.
+
+    GET /api/papers/?fields=id,title,published_date
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Iterable, List, Optional
+
+from fastapi.responses import JSONResponse
+
+from . import models, schemas
+
+try:
+    import orjson
+except ImportError:  # optional, json fallback below
+    orjson = None
+
+PAPER_FIELDS = tuple(schemas.Paper.model_fields)
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def parse_paper_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Requested paper fields in schema order, or None for all of them.
+
+    ``id`` is always included. Raises ValueError naming unknown fields.
+    """
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(PAPER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown paper fields: {', '.join(sorted(unknown))}")
+    requested.add("id")
+    return [name for name in PAPER_FIELDS if name in requested]
+
+
+def paper_columns(fields: Optional[List[str]]) -> Optional[list]:
+    """Mapped columns for ``load_only``; None when every column is wanted"""
+    if fields is None:
+        return None
+    return [getattr(models.Paper, name) for name in fields]
+
+
+def paper_rows(papers: Iterable[models.Paper], fields: Optional[List[str]] = None) -> List[dict]:
+    names = fields or PAPER_FIELDS
+    return [{name: getattr(paper, name) for name in names} for paper in papers]
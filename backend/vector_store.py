@@ -0,0 +1,69 @@
+"""Process-wide handle on the Chroma ``papers`` collection.
+
+The HTTP client and the collection handle are created once and reused by every
+request, so a search costs one query round trip instead of a client setup plus
+a ``get_collection`` call. ``warm_up_vector_store`` is run from the
+application's startup hook so the first user request doesn't pay for the
+connection, the collection lookup or a cold embedding service.
+"""
+import logging
+import os
+import threading
+
+from .embedding import CachedEmbeddingFunction
+
+CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8002"))
+PAPERS_COLLECTION = "papers"
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_collection = None
+_lock = threading.Lock()
+
+
+def get_chroma_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import chromadb
+                _client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+    return _client
+
+
+def get_papers_collection():
+    """Cached handle on the papers collection; created on first use."""
+    global _collection
+    if _collection is None:
+        client = get_chroma_client()
+        with _lock:
+            if _collection is None:
+                _collection = client.get_collection(
+                    name=PAPERS_COLLECTION,
+                    embedding_function=CachedEmbeddingFunction()
+                )
+    return _collection
+
+
+def reset_papers_collection() -> None:
+    """Drop the cached handles, e.g. after the collection was recreated or Chroma restarted."""
+    global _client, _collection
+    with _lock:
+        _client = None
+        _collection = None
+
+
+def warm_up_vector_store() -> bool:
+    """Open the connection, resolve the collection and run one query."""
+    try:
+        collection = get_papers_collection()
+        if collection.count() > 0:
+            collection.query(query_texts=["warm up"], n_results=1)
+        logger.info("Vector store warmed up")
+        return True
+    except Exception as e:
+        reset_papers_collection()
+        logger.warning("Vector store warm-up failed: %s", e)
+        return False
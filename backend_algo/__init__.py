@@ -1,5 +1,4 @@
 # Make backend_algo a Python package
-from .main import app
 from .schemas import (
     Conversation,
     ConversationResponse,
@@ -22,3 +21,12 @@ __all__ = [
     'PaperRecommendRequest',
     'PaperRecommendResponse'
 ]
+
+
+def __getattr__(name):
+    # The app opens the Chroma store on import; scripts importing a sibling
+    # module (e.g. backend_algo.build_neighbors) shouldn't start the service
+    if name == "app":
+        from .main import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
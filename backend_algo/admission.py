@@ -0,0 +1,135 @@
+"""Admission control in front of the LLM upstream.
+
+Each ``AdmissionController`` lets at most ``max_concurrency`` generations run
+against Ollama at once and parks up to ``max_queue`` more requests in a FIFO
+wait queue. Requests beyond that, or ones that wait longer than
+``queue_timeout``, are rejected right away with ``AdmissionRejected`` so the
+endpoint can answer 429 with a Retry-After hint instead of timing out.
+"""
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+LLM_STREAM_MAX_CONCURRENCY = int(os.getenv("LLM_STREAM_MAX_CONCURRENCY", "4"))
+LLM_STREAM_MAX_QUEUE = int(os.getenv("LLM_STREAM_MAX_QUEUE", "16"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """A granted slot; ``release`` is idempotent."""
+
+    def __init__(self, controller: "AdmissionController", wait: float):
+        self.controller = controller
+        self.wait = wait
+        self.started_at = time.perf_counter()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.controller._release(time.perf_counter() - self.started_at)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        # Exponentially weighted service time, used for Retry-After
+        self.avg_service_time = 5.0
+
+    async def acquire(self) -> Ticket:
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected("queue full", self.retry_after())
+
+        start = time.perf_counter()
+        self.queued += 1
+        waiter = asyncio.ensure_future(self._semaphore.acquire())
+        try:
+            done, _ = await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        finally:
+            self.queued -= 1
+        if not done:
+            self._abandon(waiter)
+            self.timed_out += 1
+            self.rejected += 1
+            raise AdmissionRejected("queue wait timed out", self.retry_after())
+
+        wait = time.perf_counter() - start
+        self.active += 1
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        return Ticket(self, wait)
+
+    @asynccontextmanager
+    async def slot(self):
+        ticket = await self.acquire()
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def retry_after(self) -> int:
+        """Seconds until a queued request would likely get a slot."""
+        waves = (self.queued + 1) / max(1, self.max_concurrency)
+        return max(1, math.ceil(waves * self.avg_service_time))
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_wait_ms": 1000 * self.total_wait / self.admitted if self.admitted else 0.0,
+            "max_wait_ms": 1000 * self.max_wait,
+            "avg_service_ms": 1000 * self.avg_service_time,
+        }
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        # The acquire can win the race against the timeout or a cancellation;
+        # a permit it took for a caller that has given up goes straight back
+        def give_back(task: asyncio.Future) -> None:
+            if not task.cancelled() and task.exception() is None:
+                self._semaphore.release()
+
+        waiter.cancel()
+        waiter.add_done_callback(give_back)
+
+    def _release(self, service_time: float) -> None:
+        self.active -= 1
+        self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * service_time
+        self._semaphore.release()
@@ -2,7 +2,6 @@ import sys
 import time
 import requests
 import chromadb
-from chromadb.utils import embedding_functions
 from typing import List
 from sqlalchemy.orm import Session
 from pathlib import Path
@@ -13,17 +12,14 @@ sys.path.append(project_root)
 
 from backend.database import SessionLocal
 from backend import models, schemas
+from backend.embedding import CachedEmbeddingFunction
+from backend_algo.build_neighbors import update_neighbors
 
 # Initialize ChromaDB HTTP client
 chroma_client = chromadb.HttpClient(host='localhost', port=8002)
-openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-    api_key="API_KEY_IS_NOT_NEEDED",
-    api_base="http://10.176.64.152:11435/v1",
-    model_name="bge-m3"
-)
 papers_collection = chroma_client.get_or_create_collection(
     name="papers",
-    embedding_function=openai_ef
+    embedding_function=CachedEmbeddingFunction()
 )
 
 # 测试API连接
@@ -88,12 +84,21 @@ def batch_process_papers(batch_size: int = 10):
                 break
                 
             print(f"Processing {len(papers)} papers...")
-            success = 0
+            processed_ids = []
             for paper in papers:
                 if process_paper(db, paper):
-                    success += 1
+                    processed_ids.append(paper.id)
+            
+            print(f"Processed {len(processed_ids)}/{len(papers)} papers successfully")
             
-            print(f"Processed {success}/{len(papers)} papers successfully")
+            # 增量更新相似论文近邻表
+            if processed_ids:
+                try:
+                    changed = update_neighbors(db, processed_ids)
+                    print(f"Updated neighbors of {changed} papers")
+                except Exception as e:
+                    db.rollback()
+                    print(f"Failed to update paper neighbors: {str(e)}")
             time.sleep(1)  # Avoid rate limiting
             
     finally:
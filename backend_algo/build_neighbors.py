@@ -0,0 +1,267 @@
+"""Offline job that precomputes the k nearest neighbors of every paper.
+
+Neighbors are ranked by cosine similarity of the stored bge-m3 vectors in the
+Chroma ``papers`` collection and written to the ``paper_neighbors`` table, so
+"similar papers" becomes one indexed read at request time.
+
+    python backend_algo/build_neighbors.py          # rebuild everything
+    python backend_algo/build_neighbors.py ID ...   # update for new papers only
+
+The similarity matrix is computed in row blocks (``block @ all.T``) so memory
+stays at ``block_size x N``; blocks run on a thread pool, which uses all cores
+because NumPy releases the GIL inside matmul and argpartition. Incremental
+updates keep the matrix in memory and only fetch the new papers' vectors.
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func, insert
+from sqlalchemy.orm import Session
+
+# Add project root to path
+project_root = str(Path(__file__).parent.parent)
+sys.path.append(project_root)
+
+from backend import models
+from backend.database import SessionLocal
+from backend.embedding import normalize_rows
+from backend.vector_store import get_papers_collection
+
+NEIGHBORS_K = int(os.getenv("NEIGHBORS_K", "10"))
+NEIGHBORS_BLOCK_SIZE = int(os.getenv("NEIGHBORS_BLOCK_SIZE", "1024"))
+NEIGHBORS_WORKERS = int(os.getenv("NEIGHBORS_WORKERS", str(os.cpu_count() or 1)))
+# Page size when reading vectors out of Chroma
+EMBEDDING_PAGE_SIZE = 5000
+# Max ids per DELETE ... IN (...) statement
+WRITE_CHUNK_SIZE = 500
+
+
+def load_embeddings() -> Tuple[List[str], np.ndarray]:
+    """All paper ids and their L2-normalized vectors from the vector store."""
+    collection = get_papers_collection()
+    ids, vectors = [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings"], limit=EMBEDDING_PAGE_SIZE, offset=offset)
+        if not len(page["ids"]):
+            break
+        ids.extend(page["ids"])
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    if not ids:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    return ids, normalize_rows(np.vstack(vectors))
+
+
+class EmbeddingMatrix:
+    """``load_embeddings`` kept in memory between ``update_neighbors`` calls.
+
+    After the first full read only the vectors of the papers being added are
+    fetched. If the collection size doesn't match what we hold afterwards,
+    another writer changed it and the matrix is read again in full.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.position: dict[str, int] = {}
+        self._buffer = np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._buffer[:len(self.ids)]
+
+    def refresh(self, new_ids: List[str]) -> None:
+        collection = get_papers_collection()
+        if not self.ids:
+            self._reload()
+            return
+        page = collection.get(ids=list(new_ids), include=["embeddings"]) if new_ids else {"ids": []}
+        added = [pid for pid in page["ids"] if pid not in self.position]
+        if collection.count() != len(self.ids) + len(added):
+            self._reload()
+            return
+        if len(page["ids"]):
+            self._put(page["ids"], normalize_rows(np.asarray(page["embeddings"], dtype=np.float32)))
+
+    def _reload(self) -> None:
+        ids, matrix = load_embeddings()
+        self.ids = list(ids)
+        self.position = {pid: i for i, pid in enumerate(self.ids)}
+        self._buffer = matrix
+
+    def _put(self, ids: List[str], vectors: np.ndarray) -> None:
+        for pid, vector in zip(ids, vectors):
+            row = self.position.get(pid)
+            if row is None:
+                row = len(self.ids)
+                if row == len(self._buffer):
+                    # Grow geometrically so appending a batch doesn't copy the whole matrix each time
+                    grown = np.zeros((max(2 * row, 64), len(vector)), dtype=np.float32)
+                    grown[:row] = self._buffer[:row]
+                    self._buffer = grown
+                self.ids.append(pid)
+                self.position[pid] = row
+            self._buffer[row] = vector
+
+
+# Shared by successive update_neighbors calls in one process (e.g. batch_embed's loop)
+embedding_matrix = EmbeddingMatrix()
+
+
+def _top_k(matrix: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and scores of the k most similar rows of ``matrix`` for each of ``rows``, best first."""
+    k = min(k, matrix.shape[0] - 1)
+    if k <= 0:
+        return np.zeros((len(rows), 0), dtype=np.int64), np.zeros((len(rows), 0), dtype=np.float32)
+    sims = matrix[rows] @ matrix.T
+    sims[np.arange(len(rows)), rows] = -np.inf  # a paper is not its own neighbor
+    idx = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    scores = np.take_along_axis(sims, idx, axis=1)
+    order = np.argsort(-scores, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def compute_neighbors(
+    matrix: np.ndarray,
+    rows: np.ndarray,
+    k: int = NEIGHBORS_K,
+    block_size: int = NEIGHBORS_BLOCK_SIZE,
+    workers: int = NEIGHBORS_WORKERS
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Blockwise, parallel ``_top_k`` for the given rows."""
+    blocks = [rows[i:i + block_size] for i in range(0, len(rows), block_size)]
+    if not blocks:
+        return np.zeros((0, 0), dtype=np.int64), np.zeros((0, 0), dtype=np.float32)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(lambda block: _top_k(matrix, block, k), blocks))
+    return np.vstack([r[0] for r in results]), np.vstack([r[1] for r in results])
+
+
+def write_neighbors(db: Session, neighbors: dict[str, List[Tuple[str, float]]]) -> None:
+    """Replace the neighbor lists of the given papers."""
+    paper_ids = list(neighbors)
+    for i in range(0, len(paper_ids), WRITE_CHUNK_SIZE):
+        chunk = paper_ids[i:i + WRITE_CHUNK_SIZE]
+        db.execute(delete(models.PaperNeighbor).where(models.PaperNeighbor.paper_id.in_(chunk)))
+        rows = [
+            {"paper_id": pid, "neighbor_id": nid, "rank": rank, "score": float(score)}
+            for pid in chunk
+            for rank, (nid, score) in enumerate(neighbors[pid])
+        ]
+        if rows:
+            db.execute(insert(models.PaperNeighbor), rows)
+    db.commit()
+
+
+def _as_lists(ids: List[str], rows: np.ndarray, idx: np.ndarray, scores: np.ndarray):
+    return {
+        ids[row]: [(ids[j], s) for j, s in zip(idx[n], scores[n])]
+        for n, row in enumerate(rows)
+    }
+
+
+def build_all(db: Session, k: int = NEIGHBORS_K) -> int:
+    """Recompute the neighbors of every embedded paper."""
+    ids, matrix = load_embeddings()
+    if not ids:
+        return 0
+    start = time.perf_counter()
+    rows = np.arange(len(ids))
+    idx, scores = compute_neighbors(matrix, rows, k)
+    print(f"Computed neighbors for {len(ids)} papers in {time.perf_counter() - start:.1f}s")
+    write_neighbors(db, _as_lists(ids, rows, idx, scores))
+    return len(ids)
+
+
+def update_neighbors(
+    db: Session,
+    new_ids: List[str],
+    k: int = NEIGHBORS_K,
+    vectors: Optional[EmbeddingMatrix] = None
+) -> int:
+    """Add newly embedded papers to the neighbor graph.
+
+    New papers, and existing ones whose stored list is missing or incomplete,
+    get a full top-k list. Other papers are only rewritten when one of the new
+    papers beats their current k-th neighbor. Returns the number of papers
+    whose list changed.
+    """
+    vectors = vectors or embedding_matrix
+    new_ids = list(dict.fromkeys(new_ids))
+    vectors.refresh(new_ids)
+    ids, matrix, position = vectors.ids, vectors.matrix, vectors.position
+    new_rows = np.array([position[pid] for pid in new_ids if pid in position], dtype=np.int64)
+    if not len(new_rows):
+        return 0
+
+    idx, scores = compute_neighbors(matrix, new_rows, k)
+    changed = _as_lists(ids, new_rows, idx, scores)
+
+    # Similarity of every paper to the new ones
+    sims = matrix @ matrix[new_rows].T
+    sims[new_rows, :] = -np.inf
+    best_new = sims.max(axis=1)
+
+    # Current k-th score and list length of each paper
+    floor = {
+        pid: (min_score, count)
+        for pid, min_score, count in db.query(
+            models.PaperNeighbor.paper_id,
+            func.min(models.PaperNeighbor.score),
+            func.count(models.PaperNeighbor.id)
+        ).group_by(models.PaperNeighbor.paper_id)
+    }
+    new_set = set(new_rows.tolist())
+    # Length a complete list had before this batch; shorter ones (no rows yet,
+    # or an interrupted build) can't be merged and get a full top-k instead
+    expected = min(k, len(ids) - len(new_rows) - 1)
+    affected, incomplete = [], []
+    for row in np.flatnonzero(best_new > -np.inf):
+        if row in new_set:
+            continue
+        min_score, count = floor.get(ids[row], (-np.inf, 0))
+        if count < expected:
+            incomplete.append(int(row))
+        elif count < k or best_new[row] > min_score:
+            affected.append(int(row))
+
+    if incomplete:
+        rows = np.array(incomplete, dtype=np.int64)
+        idx, scores = compute_neighbors(matrix, rows, k)
+        changed.update(_as_lists(ids, rows, idx, scores))
+
+    if affected:
+        current = {}
+        for neighbor in db.query(models.PaperNeighbor).filter(
+            models.PaperNeighbor.paper_id.in_([ids[row] for row in affected])
+        ):
+            current.setdefault(neighbor.paper_id, []).append((neighbor.neighbor_id, neighbor.score))
+        for row in affected:
+            pid = ids[row]
+            candidates = dict(current.get(pid, []))
+            for col, new_row in enumerate(new_rows):
+                candidates[ids[new_row]] = float(sims[row, col])
+            merged = sorted(candidates.items(), key=lambda item: item[1], reverse=True)[:k]
+            if merged != sorted(current.get(pid, []), key=lambda item: item[1], reverse=True):
+                changed[pid] = merged
+
+    write_neighbors(db, changed)
+    return len(changed)
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        if len(sys.argv) > 1:
+            count = update_neighbors(db, sys.argv[1:])
+            print(f"Updated neighbors of {count} papers")
+        else:
+            count = build_all(db)
+            print(f"Stored neighbors of {count} papers")
+    finally:
+        db.close()
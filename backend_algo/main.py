@@ -1,31 +1,61 @@
+from contextlib import asynccontextmanager
+import copy
+import json
+import os
+import random
+import time
+
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from backend_algo import schemas
-import requests
+from backend_algo.admission import (
+    LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_STREAM_MAX_CONCURRENCY, LLM_STREAM_MAX_QUEUE,
+    AdmissionController, AdmissionRejected
+)
+from backend_algo.rerank import RERANK_CANDIDATE_MULTIPLIER, RERANK_DEFAULT_BUDGET_MS, Reranker
+from backend_algo.reembed import EmbeddingModelMismatch, open_papers_collection
 import chromadb
-import chromadb.utils.embedding_functions as embedding_functions
+from backend.concurrency import SingleFlight
+from backend.embedding import CachedEmbeddingFunction, aembed_texts, embedding_stats
+from backend.http_client import aclose_http_clients, get_http_client, llm_timeout
+from backend.logging_setup import logging_stats, setup_logging, stop_logging
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await aclose_http_clients()
+    stop_logging()
 
 
-app = FastAPI()
+# backend.*辅助模块（嵌入、HTTP客户端等）的日志也走同一个队列
+logger = setup_logging("backend_algo", "backend_algo.log", include=("backend",))
+
+app = FastAPI(lifespan=lifespan)
 
 # Initialize ChromaDB client with persistent mode
+CHROMA_PERSIST_PATH = os.getenv("CHROMA_PERSIST_PATH", "chroma_data")
 chroma_client = None
 papers_collection = None
 try:
-    print("Initializing ChromaDB in persistent mode...")
+    logger.info("Initializing ChromaDB in persistent mode...")
     chroma_client = chromadb.PersistentClient(
-        path="chroma_data",
+        path=CHROMA_PERSIST_PATH,
         settings=chromadb.config.Settings(allow_reset=True)
     )
     
     # Verify connection
-    print("ChromaDB initialized in persistent mode")
+    logger.info("ChromaDB initialized in persistent mode")
     
-    # Get or create collection
-    papers_collection = chroma_client.get_or_create_collection("papers")
-    print("Successfully connected to ChromaDB collection")
+    # Get or create collection; a collection from another embedding model is refused, not migrated
+    papers_collection = open_papers_collection(chroma_client, "papers", CachedEmbeddingFunction())
+    logger.info("Successfully connected to ChromaDB collection")
+except EmbeddingModelMismatch as e:
+    logger.error("Papers collection not opened: %s", e)
+    papers_collection = None
 except Exception as e:
-    print(f"Failed to initialize ChromaDB: {str(e)}")
+    logger.error("Failed to initialize ChromaDB: %s", e)
     papers_collection = None
 
 
@@ -33,10 +63,45 @@ URL = 'http://10.176.64.152:11434/v1'
 MODEL = 'qwen2.5:7b'
 
 
+# 向量检索结果的二阶段重排
+reranker = Reranker()
+
+# 合并并发的相同对话请求
+chat_flight = SingleFlight("chat")
+
+# 限制同时发往大模型的生成请求数，流式与非流式分开计数
+chat_admission = AdmissionController("chat", LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE)
+chat_stream_admission = AdmissionController(
+    "chat_stream", LLM_STREAM_MAX_CONCURRENCY, LLM_STREAM_MAX_QUEUE
+)
+
+
+def _too_busy(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=f"LLM is busy ({e.reason}), please retry later",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "embedding": embedding_stats(),
+        "single_flight": {"chat": chat_flight.stats()},
+        "admission": {
+            "chat": chat_admission.stats(),
+            "chat_stream": chat_stream_admission.stats(),
+        },
+        "rerank": reranker.stats(),
+        "logging": logging_stats(),
+    }
+
+
 @app.post("/chat/stream/")
 async def chat_stream(conversation: schemas.Conversation):
 
-    def generator():
+    async def generator():
         # Add prompt prefix to user messages
         processed_messages = []
         for msg in conversation.messages:
@@ -47,27 +112,41 @@ async def chat_stream(conversation: schemas.Conversation):
             else:
                 processed_messages.append(msg.model_dump())
                 
-        with requests.post(f'{URL}/chat/completions', json={
+        client = get_http_client(URL)
+        async with client.stream('POST', f'{URL}/chat/completions', json={
             'model': MODEL,
             'stream': True,
             'messages': processed_messages,
-        }, stream=True, timeout=60) as resp:
-            for raw_line in resp.iter_lines():
-                line = raw_line.decode('utf-8').strip()
+        }, timeout=llm_timeout()) as resp:
+            async for raw_line in resp.aiter_lines():
+                line = raw_line.strip()
                 if line == '':
                     continue
                 if line.startswith('data: '):
                     line = line[len('data: '):]
                     if line == '[DONE]':
-                        yield raw_line + b'\n'
+                        yield raw_line.encode('utf-8') + b'\n'
                         break
                 else:
-                    yield raw_line + b'\n'
+                    yield raw_line.encode('utf-8') + b'\n'
                     break
                 # print(json.loads(line))
-                yield raw_line + b'\n'
+                yield raw_line.encode('utf-8') + b'\n'
     
-    return StreamingResponse(generator())
+    try:
+        ticket = await chat_stream_admission.acquire()
+    except AdmissionRejected as e:
+        raise _too_busy(e)
+
+    async def guarded():
+        try:
+            async for chunk in generator():
+                yield chunk
+        finally:
+            ticket.release()
+
+    # The background task covers a stream that is never iterated
+    return StreamingResponse(guarded(), background=BackgroundTask(ticket.release))
 
 
 @app.post("/chat/", response_model=schemas.ConversationResponse)
@@ -81,13 +160,23 @@ async def chat(conversation: schemas.Conversation):
             processed_messages.append(processed_msg)
         else:
             processed_messages.append(msg.model_dump())
-            
-    resp = requests.post(f'{URL}/chat/completions', json={
-        'model': MODEL,
-        'stream': False,
-        'messages': processed_messages,
-    }, stream=False, timeout=60)
-    return resp.json()
+
+    async def complete():
+        async with chat_admission.slot():
+            resp = await get_http_client(URL).post(f'{URL}/chat/completions', json={
+                'model': MODEL,
+                'stream': False,
+                'messages': processed_messages,
+            }, timeout=llm_timeout())
+            return resp.json()
+
+    # Duplicates coalesced by the single flight share one admission slot
+    key = json.dumps(processed_messages, ensure_ascii=False, sort_keys=True)
+    try:
+        # Coalesced callers share the parsed body; each gets its own copy
+        return copy.deepcopy(await chat_flight.do(key, complete))
+    except AdmissionRejected as e:
+        raise _too_busy(e)
 
 
 # Paper processing endpoints
@@ -125,7 +214,7 @@ async def embed_paper(paper: schemas.PaperEmbedRequest):
         )
         
     except Exception as e:
-        print(f"Failed to embed paper: {e}")
+        logger.error("Failed to embed paper: %s", e)
         return schemas.PaperEmbedResponse(
             paper_id=paper.paper_id,
             status="failed",
@@ -142,10 +231,14 @@ async def vector_search(request: schemas.VectorSearchRequest):
         )
     
     try:
-        # Perform vector search
+        start = time.perf_counter()
+        # Perform vector search; the query embedding joins concurrent batches
+        query_embedding = await aembed_texts([request.query])
+        # 需要重排时先多取一些候选，再由交叉编码器精排
+        n_results = request.limit * RERANK_CANDIDATE_MULTIPLIER if request.rerank else request.limit
         results = papers_collection.query(
-            query_texts=[request.query],
-            n_results=request.limit,
+            query_embeddings=query_embedding.tolist(),
+            n_results=n_results,
             include=["documents", "metadatas", "distances"]
         )
         
@@ -159,13 +252,27 @@ async def vector_search(request: schemas.VectorSearchRequest):
                 "distance": results["distances"][0][i]
             })
         
+        rerank_info = None
+        if request.rerank and formatted_results:
+            by_id = {r["paper_id"]: r for r in formatted_results}
+            ranked, rerank_info = await reranker.rerank(
+                request.query,
+                [(r["paper_id"], r["content"]) for r in formatted_results],
+                budget_ms=request.rerank_budget_ms or RERANK_DEFAULT_BUDGET_MS
+            )
+            formatted_results = []
+            for paper_id, score in ranked:
+                by_id[paper_id]["rerank_score"] = score
+                formatted_results.append(by_id[paper_id])
+        
         return schemas.VectorSearchResponse(
-            results=formatted_results,
-            search_time=0.0
+            results=formatted_results[:request.limit],
+            search_time=time.perf_counter() - start,
+            rerank=rerank_info
         )
         
     except Exception as e:
-        print(f"Vector search failed: {e}")
+        logger.error("Vector search failed: %s", e)
         raise HTTPException(
             status_code=500,
             detail="Vector search failed"
@@ -181,13 +288,13 @@ async def recommend_papers(request: schemas.PaperRecommendRequest):
         )
     
     try:
-        print(f"Recommendation request received for papers: {request.paper_ids}")
+        logger.info("Recommendation request received for %d papers", len(request.paper_ids))
         
         # Get user's interacted papers
         if not request.paper_ids:
-            print("No paper IDs provided, returning random papers")
-            all_papers = papers_collection.get()
-            print(f"Total papers in DB: {len(all_papers['ids'])}")
+            logger.debug("No paper IDs provided, returning random papers")
+            all_papers = papers_collection.get(include=[])
+            logger.debug("Total papers in DB: %d", len(all_papers["ids"]))
             
             if not all_papers["ids"]:
                 raise HTTPException(
@@ -196,64 +303,61 @@ async def recommend_papers(request: schemas.PaperRecommendRequest):
                 )
                 
             # Get random papers
-            import random
             random_ids = random.sample(all_papers["ids"], min(request.limit, len(all_papers["ids"])))
-            print(f"Selected random paper IDs: {random_ids}")
+            logger.debug("Selected random paper IDs: %s", random_ids)
             results = papers_collection.get(ids=random_ids)
         else:
-            print(f"Looking for embeddings for papers: {request.paper_ids}")
             # Get embeddings for user's interacted papers
             interacted_papers = papers_collection.get(
                 ids=[str(pid) for pid in request.paper_ids],
                 include=["embeddings"]
             )
-            print(f"Found interacted papers: {interacted_papers}")
+            logger.debug("Found embeddings for %d interacted papers", len(interacted_papers["ids"]))
             
             if not interacted_papers["embeddings"]:
-                print("No embeddings found, falling back to random papers")
-                all_papers = papers_collection.get()
+                logger.debug("No embeddings found, falling back to random papers")
+                all_papers = papers_collection.get(include=[])
                 random_ids = random.sample(all_papers["ids"], min(request.limit, len(all_papers["ids"])))
                 results = papers_collection.get(ids=random_ids)
             else:
-                print("Calculating average embedding")
                 # Calculate average embedding of interacted papers
                 avg_embedding = [
                     sum(emb) / len(emb) 
                     for emb in zip(*interacted_papers["embeddings"])
                 ]
-                print(f"Average embedding: {avg_embedding[:5]}...")
                 
                 # Search similar papers
-                print("Querying similar papers")
                 results = papers_collection.query(
                     query_embeddings=[avg_embedding],
                     n_results=request.limit,
                     include=["metadatas", "distances"]
                 )
-                print(f"Query results: {results}")
+                logger.debug("Query returned %d papers", len(results["ids"][0]))
         
         # Format recommendations with strict validation
         recommendations = []
-        valid_papers = papers_collection.get()
-        print(f"Valid papers in collection: {len(valid_papers['ids'])}")
+        # Only ask the collection about the candidate ids instead of loading all of it
+        candidate_ids = [
+            meta["paper_id"] for meta in (results.get("metadatas") or [[]])[0]
+            if meta and "paper_id" in meta
+        ]
+        valid_ids = set(papers_collection.get(ids=candidate_ids, include=[])["ids"]) if candidate_ids else set()
         
         if "metadatas" in results and results["metadatas"]:
             for i in range(len(results["ids"][0])):
                 if not results["metadatas"][0][i] or "paper_id" not in results["metadatas"][0][i]:
-                    print(f"Invalid metadata for paper {results['ids'][0][i]}")
+                    logger.warning("Invalid metadata for paper %s", results["ids"][0][i])
                     continue
                     
                 paper_id = results["metadatas"][0][i]["paper_id"]
-                print(f"Checking paper ID: {paper_id}")
-                
                 # Verify paper exists in collection
-                if paper_id not in valid_papers["ids"]:
-                    print(f"Paper ID {paper_id} not found in collection")
+                if paper_id not in valid_ids:
+                    logger.warning("Paper ID %s not found in collection", paper_id)
                     continue
                 
                 # Ensure required fields exist
                 if "title" not in results["metadatas"][0][i]:
-                    print(f"Missing title for paper {paper_id}")
+                    logger.warning("Missing title for paper %s", paper_id)
                     continue
                     
                 recommendations.append({
@@ -262,11 +366,11 @@ async def recommend_papers(request: schemas.PaperRecommendRequest):
                     "score": 1 - results["distances"][0][i] if results.get("distances") else 1.0
                 })
             
-        print(f"Final recommendations: {recommendations}")
+        logger.info("Returning %d recommendations", len(recommendations))
         
         if not recommendations:
             error_msg = "No valid recommendations found after validation"
-            print(error_msg)
+            logger.warning(error_msg)
             raise HTTPException(
                 status_code=404,
                 detail=error_msg
@@ -278,7 +382,7 @@ async def recommend_papers(request: schemas.PaperRecommendRequest):
         )
         
     except Exception as e:
-        print(f"Recommendation failed: {e}")
+        logger.error("Recommendation failed: %s", e)
         raise HTTPException(
             status_code=500,
             detail="Recommendation failed"
@@ -0,0 +1,166 @@
+"""Keep the algorithm service's ``papers`` collection in the bge-m3 space.
+
+The collection used to be created with Chroma's default embedding function,
+which uses a different model and dimension. Querying those vectors with bge-m3
+embeddings fails with a dimension error or returns garbage. At startup,
+``open_papers_collection`` only checks: it compares a stored vector's dimension
+with a bge-m3 probe and refuses a mismatched collection. The migration is run
+by an operator::
+
+    python -m backend_algo.reembed --dry-run   # print the plan
+    python -m backend_algo.reembed             # re-embed and swap in
+
+It re-embeds the stored documents into a temporary collection, swaps that in
+under the original name and records the model in the collection metadata.
+"""
+import logging
+import os
+
+from backend.embedding import EMBEDDING_MODEL
+
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "64"))
+EMBEDDING_MODEL_KEY = "embedding_model"
+
+logger = logging.getLogger(__name__)
+
+
+def _collection_names(client) -> set:
+    # chromadb < 0.6 returns Collection objects, newer versions return names
+    return {c if isinstance(c, str) else c.name for c in client.list_collections()}
+
+
+def _stored_dimension(collection):
+    result = collection.get(limit=1, include=["embeddings"])
+    embeddings = result.get("embeddings")
+    if embeddings is None or len(embeddings) == 0:
+        return None
+    return len(embeddings[0])
+
+
+def reembed_collection(client, source, name: str, embedding_function, model: str = EMBEDDING_MODEL):
+    """Copy ``source``'s documents into a collection embedded by ``embedding_function``,
+    swapped in under ``name``"""
+    tmp_name = f"{name}__reembed"
+    if tmp_name in _collection_names(client):
+        # Left over from an interrupted run; the source is still intact
+        client.delete_collection(tmp_name)
+    target = client.create_collection(
+        tmp_name, embedding_function=embedding_function, metadata={EMBEDDING_MODEL_KEY: model}
+    )
+
+    copied = skipped = offset = 0
+    while True:
+        page = source.get(limit=REEMBED_BATCH_SIZE, offset=offset, include=["documents", "metadatas"])
+        ids = page["ids"]
+        if not ids:
+            break
+        offset += len(ids)
+        rows = [
+            (pid, doc, meta)
+            for pid, doc, meta in zip(ids, page["documents"], page["metadatas"])
+            if doc
+        ]
+        skipped += len(ids) - len(rows)
+        if rows:
+            pids, docs, metas = zip(*rows)
+            target.add(ids=list(pids), documents=list(docs), metadatas=list(metas))
+            copied += len(rows)
+        logger.info("Re-embedded %d papers into %s", copied, tmp_name)
+
+    if skipped:
+        logger.warning("%d papers have no stored document and were not re-embedded", skipped)
+    client.delete_collection(name)
+    target.modify(name=name)
+    return copied
+
+
+class EmbeddingModelMismatch(RuntimeError):
+    """The stored vectors come from another embedding model than the service uses"""
+
+
+def _plan(client, name: str, embedding_function, model: str) -> dict:
+    """What ``migrate_collection`` would do to bring ``name`` to ``model``"""
+    if name not in _collection_names(client):
+        return {"action": "create", "count": 0}
+    existing = client.get_collection(name)
+    metadata = existing.metadata or {}
+    plan = {"count": existing.count(), "model": metadata.get(EMBEDDING_MODEL_KEY)}
+    if plan["model"] == model:
+        return {**plan, "action": "none"}
+    stored_dim = _stored_dimension(existing)
+    if stored_dim is None:
+        return {**plan, "action": "recreate"}
+    target_dim = len(embedding_function(["dimension probe"])[0])
+    plan.update(stored_dim=stored_dim, target_dim=target_dim)
+    return {**plan, "action": "reembed" if stored_dim != target_dim else "tag"}
+
+
+def open_papers_collection(client, name: str, embedding_function, model: str = EMBEDDING_MODEL):
+    """Collection ``name`` bound to ``embedding_function``, for service startup.
+
+    Never deletes, renames or re-embeds anything. A missing collection is
+    created; vectors of another dimension raise ``EmbeddingModelMismatch`` so
+    the operator runs ``python -m backend_algo.reembed`` first.
+    """
+    plan = _plan(client, name, embedding_function, model)
+    if plan["action"] == "create":
+        return client.create_collection(
+            name, embedding_function=embedding_function, metadata={EMBEDDING_MODEL_KEY: model}
+        )
+    if plan["action"] == "reembed":
+        raise EmbeddingModelMismatch(
+            f"Collection {name} holds {plan['stored_dim']}-dim vectors but {model} produces "
+            f"{plan['target_dim']}-dim ones; run `python -m backend_algo.reembed` to migrate it"
+        )
+    if plan["action"] != "none":
+        logger.warning(
+            "Collection %s is not tagged with embedding model %s; run `python -m backend_algo.reembed` to tag it",
+            name, model
+        )
+    return client.get_collection(name, embedding_function=embedding_function)
+
+
+def migrate_collection(client, name: str, embedding_function, model: str = EMBEDDING_MODEL, dry_run: bool = False) -> dict:
+    """Bring collection ``name`` to ``model``; with ``dry_run`` only report the plan"""
+    plan = _plan(client, name, embedding_function, model)
+    logger.info("Collection %s: %s", name, plan)
+    if dry_run or plan["action"] == "none":
+        return plan
+    if plan["action"] == "create":
+        client.create_collection(name, embedding_function=embedding_function, metadata={EMBEDDING_MODEL_KEY: model})
+    elif plan["action"] == "recreate":
+        # Nothing to migrate; recreate it bound to the new model
+        client.delete_collection(name)
+        client.create_collection(name, embedding_function=embedding_function, metadata={EMBEDDING_MODEL_KEY: model})
+    elif plan["action"] == "reembed":
+        logger.warning("Re-embedding %d papers of %s with %s", plan["count"], name, model)
+        reembed_collection(client, client.get_collection(name), name, embedding_function, model)
+    else:
+        # Already in the model's dimension: just record the model
+        existing = client.get_collection(name)
+        metadata = {k: v for k, v in (existing.metadata or {}).items() if not k.startswith("hnsw:")}
+        existing.modify(metadata={**metadata, EMBEDDING_MODEL_KEY: model})
+    return plan
+
+
+def main(argv=None) -> None:
+    import argparse
+
+    import chromadb
+
+    from backend.embedding import CachedEmbeddingFunction
+
+    parser = argparse.ArgumentParser(description="Migrate a Chroma collection to the bge-m3 embedding space")
+    parser.add_argument("--path", default=os.getenv("CHROMA_PERSIST_PATH", "chroma_data"))
+    parser.add_argument("--collection", default="papers")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would be done")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    client = chromadb.PersistentClient(path=args.path)
+    plan = migrate_collection(client, args.collection, CachedEmbeddingFunction(), dry_run=args.dry_run)
+    print(("Would " if args.dry_run else "Done: ") + plan["action"], plan)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Second-stage reranking with bge-reranker-v2-m3.
+
+The first stage retrieves a larger candidate set from Chroma; only the top
+``M`` candidates are sent to the cross-encoder, where ``M`` is chosen so that
+the predicted rerank latency fits the request's budget. Latency is predicted
+from a linear fit (fixed overhead + per-document cost) over recent calls.
+Scores are cached per (query, paper_id) in an LRU, so a repeated query does
+not call the reranker at all.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from backend.embedding_cache import text_key
+from backend.http_client import default_timeout, get_http_client
+
+RERANK_API_BASE = os.getenv("RERANK_API_BASE", "http://10.176.64.152:11436/v1")
+RERANK_MODEL = "bge-reranker-v2-m3"
+RERANK_CACHE_ITEMS = int(os.getenv("RERANK_CACHE_ITEMS", "50000"))
+RERANK_DEFAULT_BUDGET_MS = float(os.getenv("RERANK_DEFAULT_BUDGET_MS", "300"))
+# First stage fetches this many times the requested limit when reranking
+RERANK_CANDIDATE_MULTIPLIER = int(os.getenv("RERANK_CANDIDATE_MULTIPLIER", "4"))
+RERANK_MIN_DOCS = 1
+RERANK_MAX_DOCS = 100
+# Latency model used until enough calls have been observed
+DEFAULT_OVERHEAD_MS = 40.0
+DEFAULT_PER_DOC_MS = 8.0
+
+logger = logging.getLogger(__name__)
+
+
+class RerankScoreCache:
+    def __init__(self, max_items: int = RERANK_CACHE_ITEMS):
+        self.max_items = max_items
+        self._items: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query_key: str, paper_id: str) -> Optional[float]:
+        score = self._items.get((query_key, paper_id))
+        if score is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end((query_key, paper_id))
+        self.hits += 1
+        return score
+
+    def put(self, query_key: str, paper_id: str, score: float) -> None:
+        self._items[(query_key, paper_id)] = score
+        self._items.move_to_end((query_key, paper_id))
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class Reranker:
+    def __init__(self, api_base: str = RERANK_API_BASE, model: str = RERANK_MODEL):
+        self.api_base = api_base
+        self.model = model
+        self.cache = RerankScoreCache()
+        # Recent (documents sent, latency ms) samples for the latency model
+        self._samples = deque(maxlen=50)
+        self.overhead_ms = DEFAULT_OVERHEAD_MS
+        self.per_doc_ms = DEFAULT_PER_DOC_MS
+        self.calls = 0
+        self.failures = 0
+
+    def docs_for_budget(self, budget_ms: float) -> int:
+        """Largest number of documents predicted to rerank within ``budget_ms``."""
+        m = int((budget_ms - self.overhead_ms) / max(self.per_doc_ms, 1e-3))
+        return max(RERANK_MIN_DOCS, min(RERANK_MAX_DOCS, m))
+
+    async def rerank(
+        self,
+        query: str,
+        candidates: List[Tuple[str, str]],
+        budget_ms: float = RERANK_DEFAULT_BUDGET_MS
+    ) -> Tuple[List[Tuple[str, Optional[float]]], dict]:
+        """Reorder (paper_id, text) candidates, best first.
+
+        The reranked prefix comes first with its scores, followed by the
+        remaining candidates in first-stage order with a score of None.
+        """
+        query_key = text_key(query)
+        # Only the top M candidates are reranked; cached ones among them cost nothing
+        prefix = min(len(candidates), self.docs_for_budget(budget_ms))
+        scores: dict = {}
+        to_score = []
+        for paper_id, text in candidates[:prefix]:
+            cached = self.cache.get(query_key, paper_id)
+            if cached is not None:
+                scores[paper_id] = cached
+            else:
+                to_score.append((paper_id, text))
+
+        info = {
+            "budget_ms": budget_ms,
+            "candidates": len(candidates),
+            "reranked": prefix,
+            "cached": len(scores),
+            "sent": len(to_score),
+            "latency_ms": 0.0,
+            "status": "ok",
+        }
+        if to_score:
+            start = time.perf_counter()
+            try:
+                fresh = await self._request(query, [text for _, text in to_score], budget_ms)
+            except Exception as e:
+                self.failures += 1
+                logger.warning("Rerank failed, keeping first-stage order: %s", e)
+                info["status"] = "error"
+                return [(paper_id, None) for paper_id, _ in candidates], info
+            latency_ms = 1000 * (time.perf_counter() - start)
+            info["latency_ms"] = latency_ms
+            self._observe(len(to_score), latency_ms)
+            for (paper_id, _), score in zip(to_score, fresh):
+                scores[paper_id] = score
+                self.cache.put(query_key, paper_id, score)
+
+        head = sorted(
+            ((paper_id, scores[paper_id]) for paper_id, _ in candidates[:prefix]),
+            key=lambda item: item[1],
+            reverse=True
+        )
+        tail = [(paper_id, None) for paper_id, _ in candidates[prefix:]]
+        return head + tail, info
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "overhead_ms": self.overhead_ms,
+            "per_doc_ms": self.per_doc_ms,
+            "cache": self.cache.stats(),
+        }
+
+    async def _request(self, query: str, documents: List[str], budget_ms: float) -> List[float]:
+        self.calls += 1
+        url = f"{self.api_base}/rerank"
+        # Allow some slack over the budget before giving up on the call
+        timeout = default_timeout(read=max(1.0, 2 * budget_ms / 1000))
+        response = await get_http_client(url).post(url, json={
+            "model": self.model,
+            "query": query,
+            "documents": documents,
+            "top_n": len(documents),
+        }, timeout=timeout)
+        response.raise_for_status()
+        scores = [0.0] * len(documents)
+        for item in response.json()["results"]:
+            scores[item["index"]] = float(item["relevance_score"])
+        return scores
+
+    def _observe(self, n_docs: int, latency_ms: float) -> None:
+        self._samples.append((n_docs, latency_ms))
+        sizes = np.array([n for n, _ in self._samples], dtype=np.float64)
+        if len(self._samples) < 5 or np.ptp(sizes) == 0:
+            return
+        latencies = np.array([ms for _, ms in self._samples], dtype=np.float64)
+        per_doc, overhead = np.polyfit(sizes, latencies, 1)
+        self.per_doc_ms = max(float(per_doc), 0.1)
+        self.overhead_ms = max(float(overhead), 0.0)
@@ -51,11 +51,14 @@ class PaperEmbedResponse(BaseModel):
 class VectorSearchRequest(BaseModel):
     query: str
     limit: int = 10
+    rerank: bool = False  # rerank the candidates with bge-reranker
+    rerank_budget_ms: Optional[float] = None  # latency budget for the rerank stage
 
 
 class VectorSearchResponse(BaseModel):
     results: List[dict]
     search_time: float
+    rerank: Optional[dict] = None
 
 
 class PaperRecommendRequest(BaseModel):
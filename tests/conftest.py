@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+# Point the data layer at throwaway SQLite files before backend is imported
+_tmp = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(_tmp, "embedding_cache.sqlite3")
+os.environ["BM25_INDEX_PATH"] = os.path.join(_tmp, "bm25_index")
+os.environ["LOG_DIR"] = _tmp
+# Everything goes to the one test database unless a test builds its own replicas
+os.environ.pop("REPLICA_URLS", None)
+os.environ.pop("ASYNC_DATABASE_URL", None)
+# Importing backend_algo opens its Chroma store; keep it away from the real data
+os.environ["CHROMA_PERSIST_PATH"] = os.path.join(_tmp, "chroma_data")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db():
+    from backend.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def client(db):
+    """TestClient signed in as an active superuser, without a token"""
+    from fastapi.testclient import TestClient
+
+    from backend import main
+
+    user = SimpleNamespace(id=1, username="alice", is_active=True, is_superuser=True)
+    main.app.dependency_overrides[main.get_current_active_user] = lambda: user
+    try:
+        yield TestClient(main.app)
+    finally:
+        main.app.dependency_overrides.clear()
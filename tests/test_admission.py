@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from backend_algo import admission
+from backend_algo.admission import AdmissionController, AdmissionRejected
+
+
+def test_queue_full_is_rejected_with_retry_after():
+    async def run():
+        controller = AdmissionController("test", max_concurrency=1, max_queue=0)
+        ticket = await controller.acquire()
+        with pytest.raises(AdmissionRejected) as e:
+            await controller.acquire()
+        ticket.release()
+        ticket.release()
+        return controller, e.value
+
+    controller, rejected = asyncio.run(run())
+    assert rejected.reason == "queue full"
+    assert rejected.retry_after >= 1
+    assert controller.stats()["active"] == 0
+    assert controller._semaphore._value == 1
+
+
+def test_queued_request_times_out_without_leaking_a_permit():
+    async def run():
+        controller = AdmissionController("test", max_concurrency=1, max_queue=4, queue_timeout=0.01)
+        async with controller.slot():
+            with pytest.raises(AdmissionRejected, match="timed out"):
+                await controller.acquire()
+        await asyncio.sleep(0)
+        return controller
+
+    controller = asyncio.run(run())
+    assert controller.timed_out == 1
+    assert controller.queued == 0
+    assert controller._semaphore._value == 1
+
+
+def test_permit_won_in_the_timeout_race_is_returned(monkeypatch):
+    async def late_wait(aws, timeout):
+        # The acquire completes, but the wait reports a timeout anyway
+        await asyncio.gather(*aws)
+        return set(), set(aws)
+
+    monkeypatch.setattr(admission.asyncio, "wait", late_wait)
+
+    async def run():
+        controller = AdmissionController("test", max_concurrency=1, max_queue=4)
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire()
+        await asyncio.sleep(0)
+        return controller
+
+    assert asyncio.run(run())._semaphore._value == 1
+
+
+def test_cancelled_waiter_does_not_keep_a_permit():
+    async def run():
+        controller = AdmissionController("test", max_concurrency=1, max_queue=4)
+        ticket = await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        ticket.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.sleep(0)
+        return controller
+
+    controller = asyncio.run(run())
+    assert controller.queued == 0
+    assert controller._semaphore._value == 1
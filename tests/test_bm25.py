@@ -0,0 +1,122 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from backend import models
+from backend.bm25 import BM25Index, query_tokens, tokenize
+
+DOCS = [
+    ("p1", "Graph neural networks", "Message passing over graph structure", ["cs.LG"]),
+    ("p2", "Transformers for language", "Attention is all you need for language models", ["cs.CL"]),
+    ("p3", "Protein folding", "Predicting structure with deep networks", ["q-bio.BM"]),
+]
+
+
+def _index(docs=DOCS, path=None):
+    index = BM25Index(path)
+    index.add_documents(docs)
+    return index
+
+
+def test_tokenize_splits_words_and_cjk_bigrams():
+    assert tokenize("Graph-based GNNs, a 2nd try") == ["graph", "based", "gnns", "2nd", "try"]
+    assert tokenize("图神经网络") == ["图神", "神经", "经网", "网络"]
+    assert "kw:cs.cl" in query_tokens("recent cs.CL papers")
+
+
+def test_search_ranks_by_bm25_and_weights_titles():
+    index = _index()
+    hits = index.search("graph networks", limit=3)
+    assert [pid for pid, _ in hits] == ["p1", "p3"]
+    assert hits[0][1] > hits[1][1] > 0
+    assert index.search("cs.CL")[0][0] == "p2"
+    assert index.search("nonexistent") == []
+
+
+def test_compaction_builds_csr_postings_without_changing_results():
+    index = _index()
+    before = index.search("structure networks", limit=3)
+    index.compact()
+
+    assert index._delta == {}
+    assert index.offsets[0] == 0 and index.offsets[-1] == len(index.post_docs) == len(index.post_tf)
+    assert len(index.offsets) == len(index.vocab) + 1
+    term = index.vocab["structure"]
+    docs = index.post_docs[index.offsets[term]:index.offsets[term + 1]]
+    assert [index.doc_ids[d] for d in docs] == ["p1", "p3"]
+    assert index.search("structure networks", limit=3) == before
+
+
+def test_readding_a_paper_replaces_its_postings():
+    index = _index()
+    index.add_documents([("p1", "Diffusion models", "Denoising score matching", [])])
+    index.compact()
+    assert len(index) == 3
+    assert index.search("graph") == []
+    assert index.search("diffusion")[0][0] == "p1"
+    assert not np.isin(np.flatnonzero(index.deleted), index.post_docs).any()
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = _index(path=str(tmp_path / "bm25"))
+    index.save()
+    loaded = BM25Index.load(str(tmp_path / "bm25"))
+    assert loaded.search("graph networks") == index.search("graph networks")
+    assert loaded.doc_digest == index.doc_digest
+
+
+
+def test_interrupted_save_keeps_the_previous_index(tmp_path, monkeypatch):
+    path = str(tmp_path / "bm25")
+    index = _index(path=path)
+    index.save()
+    expected = index.search("graph networks")
+
+    index.add_documents([("p4", "Graph transformers", "", [])])
+
+    def crash(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("backend.bm25.json.dump", crash)
+    with pytest.raises(OSError):
+        index.save()
+    monkeypatch.undo()
+    assert BM25Index.load(path).search("graph networks") == expected
+
+    index.save()
+    assert [e for e in os.listdir(path) if e.startswith("gen-")] == [open(os.path.join(path, "CURRENT")).read()]
+    assert len(BM25Index.load(path).search("graph")) == 2
+
+
+def test_load_reads_indexes_saved_before_generations(tmp_path):
+    path = tmp_path / "bm25"
+    index = _index(path=str(path))
+    index.save()
+    generation = path / (path / "CURRENT").read_text()
+    for entry in generation.iterdir():
+        entry.rename(path / entry.name)
+    (path / "CURRENT").unlink()
+    assert BM25Index.load(str(path)).search("graph networks") == index.search("graph networks")
+
+def test_sync_reindexes_updated_papers_only_when_text_changes(db):
+    now = datetime(2024, 1, 1)
+    db.add_all([
+        models.Paper(id="p1", title="Graph networks", abstract="", keywords=[], created_at=now, updated_at=now),
+        models.Paper(id="p2", title="Protein folding", abstract="", keywords=[], created_at=now, updated_at=now),
+    ])
+    db.commit()
+    index = BM25Index()
+    assert index.sync(db) == 2
+
+    p1, p2 = db.get(models.Paper, "p1"), db.get(models.Paper, "p2")
+    p1.title, p1.updated_at = "Diffusion models", now + timedelta(minutes=1)
+    p2.is_processed, p2.updated_at = True, now + timedelta(minutes=1)
+    db.commit()
+
+    assert index.sync(db) == 1
+    assert index.search("graph") == []
+    assert index.search("diffusion")[0][0] == "p1"
+    assert index.watermark == now + timedelta(minutes=1)
+    assert len(index) == 2
@@ -0,0 +1,96 @@
+import numpy as np
+
+from backend import models
+from backend_algo import build_neighbors
+from backend_algo.build_neighbors import EmbeddingMatrix, build_all, update_neighbors
+
+
+class FakeCollection:
+    def __init__(self, vectors):
+        self.vectors = dict(vectors)
+        self.requests = []
+
+    def count(self):
+        return len(self.vectors)
+
+    def get(self, ids=None, include=None, limit=None, offset=0):
+        self.requests.append(ids)
+        keys = list(self.vectors) if ids is None else [pid for pid in ids if pid in self.vectors]
+        if ids is None:
+            keys = keys[offset:offset + limit]
+        return {"ids": keys, "embeddings": [self.vectors[pid] for pid in keys]}
+
+
+VECTORS = {
+    "a": [1.0, 0.0, 0.0],
+    "b": [0.9, 0.1, 0.0],
+    "c": [0.0, 1.0, 0.0],
+    "d": [0.0, 0.9, 0.1],
+}
+
+
+def _neighbors(db):
+    graph = {}
+    for row in db.query(models.PaperNeighbor).order_by(models.PaperNeighbor.rank):
+        graph.setdefault(row.paper_id, []).append(row.neighbor_id)
+    return graph
+
+
+def test_update_matches_a_full_rebuild(db, monkeypatch):
+    collection = FakeCollection(VECTORS)
+    monkeypatch.setattr(build_neighbors, "get_papers_collection", lambda: collection)
+    build_all(db, k=2)
+
+    vectors = EmbeddingMatrix()
+    vectors.refresh([])
+    collection.vectors["e"] = [0.95, 0.0, 0.05]
+    collection.requests.clear()
+    update_neighbors(db, ["e"], k=2, vectors=vectors)
+    incremental = _neighbors(db)
+
+    # Only the new paper's vector was read
+    assert collection.requests == [["e"]]
+    build_all(db, k=2)
+    assert incremental == _neighbors(db)
+
+
+def test_matrix_reloads_when_another_writer_added_papers(monkeypatch):
+    collection = FakeCollection(VECTORS)
+    monkeypatch.setattr(build_neighbors, "get_papers_collection", lambda: collection)
+    vectors = EmbeddingMatrix()
+    vectors.refresh([])
+    collection.vectors["x"] = [0.0, 0.0, 1.0]
+    collection.vectors["e"] = [1.0, 1.0, 0.0]
+    vectors.refresh(["e"])
+    assert sorted(vectors.ids) == ["a", "b", "c", "d", "e", "x"]
+    assert np.allclose(np.linalg.norm(vectors.matrix, axis=1), 1.0)
+
+
+def test_matrix_grows_without_losing_rows(monkeypatch):
+    collection = FakeCollection({"p0": [1.0, 0.0]})
+    monkeypatch.setattr(build_neighbors, "get_papers_collection", lambda: collection)
+    vectors = EmbeddingMatrix()
+    vectors.refresh([])
+    for i in range(1, 100):
+        collection.vectors[f"p{i}"] = [1.0, float(i)]
+        vectors.refresh([f"p{i}"])
+    assert vectors.ids == [f"p{i}" for i in range(100)]
+    assert vectors.matrix.shape == (100, 2)
+    assert np.allclose(vectors.matrix[99], np.array([1.0, 99.0]) / np.hypot(1.0, 99.0))
+
+
+def test_update_fills_papers_without_stored_neighbors(db, monkeypatch):
+    collection = FakeCollection(VECTORS)
+    monkeypatch.setattr(build_neighbors, "get_papers_collection", lambda: collection)
+    build_all(db, k=2)
+    db.query(models.PaperNeighbor).filter(models.PaperNeighbor.paper_id.in_(["a", "c"])).delete()
+    db.commit()
+
+    vectors = EmbeddingMatrix()
+    vectors.refresh([])
+    collection.vectors["e"] = [0.0, 0.0, 1.0]
+    update_neighbors(db, ["e"], k=2, vectors=vectors)
+    incremental = _neighbors(db)
+
+    build_all(db, k=2)
+    assert incremental == _neighbors(db)
@@ -0,0 +1,36 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from backend import main
+from backend.auth_cache import Principal
+
+USER = Principal(id=1, username="u", email="e", first_name="a", last_name="b", is_active=True, is_superuser=False)
+
+
+def sse_events(body: str) -> list:
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_failure_after_tokens_ends_stream_with_error_event(monkeypatch):
+    async def fake_llm(prompt):
+        yield "Graph networks."
+
+    async def failing_search(query, limit=5):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(main, "stream_llm_response", fake_llm)
+    monkeypatch.setattr(main, "search_papers_detached", failing_search)
+    main.app.dependency_overrides[main.get_current_active_user] = lambda: USER
+    try:
+        resp = TestClient(main.app).post("/api/chat/stream", json={"prompt": "hi", "bypass_cache": True})
+    finally:
+        main.app.dependency_overrides.clear()
+
+    events = sse_events(resp.text)
+    assert events[0] == ("token", {"content": "Graph networks."})
+    assert events[-1][0] == "error"
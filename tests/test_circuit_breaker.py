@@ -0,0 +1,83 @@
+import pytest
+
+from backend import circuit_breaker, crud
+from backend.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def test_opens_on_error_rate_and_recovers_through_half_open(clock):
+    breaker = CircuitBreaker("test", min_calls=4, error_rate_threshold=0.5, open_seconds=10)
+    breaker.record_success(0.01)
+    breaker.record_success(0.01)
+    breaker.record_failure(0.01)
+    assert breaker.state == CLOSED
+    breaker.record_failure(0.01)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success(0.01)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["rejected"] == 2
+
+
+def test_failed_or_slow_probe_reopens(clock):
+    breaker = CircuitBreaker("test", min_calls=1, slow_call_seconds=1, open_seconds=5)
+    breaker.record_failure(0.01)
+    clock.now += 5
+    assert breaker.allow()
+    breaker.record_success(3.0)
+    assert breaker.state == OPEN
+    assert breaker.times_opened == 2
+
+
+def test_slow_calls_open_the_circuit(clock):
+    breaker = CircuitBreaker("test", min_calls=2, slow_call_seconds=1, slow_rate_threshold=0.8)
+    breaker.record_success(1.5)
+    breaker.record_success(2.0)
+    assert breaker.state == OPEN
+
+
+def test_old_calls_leave_the_window(clock):
+    breaker = CircuitBreaker("test", window_seconds=30, min_calls=2)
+    breaker.record_failure(0.01)
+    clock.now += 31
+    breaker.record_success(0.01)
+    assert breaker.state == CLOSED
+    assert breaker.stats()["window_calls"] == 1
+
+
+def test_database_errors_during_hydration_do_not_trip_the_breaker(monkeypatch):
+    class Collection:
+        def query(self, **query):
+            return {"ids": [["p1", "p2"]]}
+
+    def broken_hydrate(db, paper_ids):
+        raise RuntimeError("database unavailable")
+
+    breaker = CircuitBreaker("test", min_calls=1)
+    monkeypatch.setattr(crud, "vector_search_breaker", breaker)
+    monkeypatch.setattr(crud, "get_papers_collection", lambda: Collection())
+    monkeypatch.setattr(crud, "hydrate_papers", broken_hydrate)
+    monkeypatch.setattr(crud, "text_search_papers", lambda db, query, limit: [])
+
+    assert crud.search_papers(None, "graph networks") == []
+    stats = breaker.stats()
+    assert (stats["state"], stats["window_calls"], stats["error_rate"]) == (CLOSED, 1, 0.0)
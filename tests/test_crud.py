@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from backend import crud, models
+
+
+def test_copy_paper_is_transient_and_independent():
+    paper = models.Paper(id="2107.12345", title="Graph nets", authors=["Ada"], created_at=datetime(2024, 1, 1))
+    copied = crud.copy_paper(paper)
+    copied.authors.append("Bob")
+    assert copied is not paper
+    assert (copied.id, copied.title, copied.created_at) == (paper.id, paper.title, paper.created_at)
+    assert paper.authors == ["Ada"]
+
+
+def _add_papers(db, *ids):
+    db.add_all(models.Paper(id=pid, title=f"Paper {pid}", created_at=datetime(2024, 1, 1)) for pid in ids)
+    db.commit()
+    db.expunge_all()
+
+
+def test_hydrate_papers_keeps_ranking_and_reports_missing(db):
+    _add_papers(db, "a", "b", "c")
+    papers, missing = crud.hydrate_papers(db, ["c", "x", "a", "c", "b", "y"])
+    assert [p.id for p in papers] == ["c", "a", "b"]
+    assert missing == ["x", "y"]
+
+
+def test_hydrate_papers_reuses_request_identity_map(db):
+    _add_papers(db, "a", "b")
+    known = models.Paper(id="a", title="already loaded")
+    identity_map = {"a": known}
+    papers, missing = crud.hydrate_papers(db, ["b", "a"], identity_map)
+    assert papers[1] is known
+    assert missing == []
+    assert set(identity_map) == {"a", "b"}
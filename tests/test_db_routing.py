@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from backend import crud, models, schemas
+from backend.database import Base
+from backend.db_routing import Replica, ReplicaSet, RoutingSession, set_session_owner
+
+
+@pytest.fixture
+def routed(tmp_path):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica_engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for engine in (primary, replica_engine):
+        Base.metadata.create_all(bind=engine)
+    replica = Replica("replica-0", replica_engine)
+    replicas = ReplicaSet([replica], sticky_seconds=60)
+    make_session = sessionmaker(class_=RoutingSession, bind=primary, replicas=replicas)
+    # The row only exists on the primary, as if replication lagged behind
+    with make_session() as db:
+        db.add(models.User(id=1, username="alice", email="a@example.com", hashed_password="x", is_active=True))
+        db.commit()
+    set_session_owner(None)
+    replicas._last_write.clear()
+    yield make_session, replica, replicas
+    set_session_owner(None)
+
+
+def _alice(db, **options):
+    return db.execute(select(models.User).where(models.User.username == "alice").execution_options(**options))\
+        .scalars().first()
+
+
+def test_plain_reads_use_a_healthy_replica(routed):
+    make_session, replica, replicas = routed
+    with make_session() as db:
+        assert _alice(db) is None
+    replica.mark_down("gone")
+    with make_session() as db:
+        assert _alice(db) is not None
+    assert replicas.stats()["primary_reads"] == 1
+
+
+def test_primary_option_and_session_info_pin_reads(routed):
+    make_session, _, _ = routed
+    with make_session() as db:
+        assert _alice(db, primary=True) is not None
+    with make_session(info={"primary": True}) as db:
+        assert _alice(db) is not None
+
+
+def test_writer_reads_own_writes_after_commit(routed):
+    make_session, _, replicas = routed
+    set_session_owner("bob")
+    with make_session() as db:
+        db.add(models.Paper(id="p1", title="t"))
+        db.commit()
+    assert replicas.reads_own_writes("bob")
+    assert not replicas.reads_own_writes("carol")
+
+
+def test_deactivation_makes_the_target_user_sticky(routed):
+    make_session, _, replicas = routed
+    set_session_owner("admin")
+    with make_session() as db:
+        assert crud.set_user_active(db, user_id=1, is_active=False).is_active is False
+    assert replicas.reads_own_writes("alice")
+
+
+def test_sign_up_is_sticky_for_the_new_username(routed):
+    make_session, _, replicas = routed
+    with make_session() as db:
+        crud.create_user(db, schemas.UserCreate(
+            username="dave", email="d@example.com", first_name="D", last_name="E", password="secret"
+        ))
+    assert replicas.reads_own_writes("dave")
+
+
+def test_rolled_back_writes_are_not_sticky(routed):
+    make_session, _, replicas = routed
+    set_session_owner("erin")
+    with make_session() as db:
+        db.add(models.Paper(id="p2", title="t"))
+        crud.stick_to_primary(db, "frank")
+        db.flush()
+        db.rollback()
+        db.commit()
+    assert not replicas.reads_own_writes("frank")
+    assert not replicas.reads_own_writes("erin")
@@ -0,0 +1,52 @@
+import numpy as np
+
+from backend.embedding_cache import EmbeddingCache, normalize_text, text_key
+
+
+def test_text_key_ignores_whitespace_and_width():
+    assert normalize_text("  graph\n neural\tnets ") == "graph neural nets"
+    assert text_key("ＧＮＮ  models") == text_key("GNN models")
+
+
+def test_memory_hit_and_miss():
+    cache = EmbeddingCache(path=None)
+    cache.put_many("m", ["a"], np.array([[1.0, 2.0]]))
+    a, b = cache.get_many("m", ["a", "b"])
+    assert np.allclose(a, [1.0, 2.0]) and b is None
+    assert cache.get_many("other-model", ["a"]) == [None]
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1 and stats["misses"] == 2
+
+
+def test_disk_tier_survives_memory_eviction(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path=path, memory_items=1)
+    cache.put_many("m", ["a", "b"], np.array([[1.0], [2.0]], dtype=np.float32))
+    # "a" was pushed out of the 1-item LRU but is still on disk
+    assert np.allclose(cache.get_many("m", ["a"])[0], [1.0])
+    assert cache.stats()["disk_hits"] == 1
+    # and is shared with another process opening the same file
+    assert np.allclose(EmbeddingCache(path=path).get_many("m", ["b"])[0], [2.0])
+
+
+def test_disk_eviction_drops_least_recently_used(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite3"), memory_items=1, disk_items=20)
+    cache.put_many("m", [f"t{i}" for i in range(25)], np.arange(25, dtype=np.float32).reshape(25, 1))
+    assert cache.stats()["disk_items"] <= 20
+    assert cache.evictions > 0
+    assert cache.get_many("m", ["t24"])[0] is not None
+
+
+def test_disk_hits_do_not_write_until_the_next_put(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path=path, memory_items=1, disk_items=3)
+    cache.put_many("m", ["a", "b", "c"], np.array([[1.0], [2.0], [3.0]], dtype=np.float32))
+    changes = cache._conn.total_changes
+    assert cache.get_many("m", ["a"])[0] is not None
+    assert cache._conn.total_changes == changes
+
+    # The pending touch is applied before the sweep, so "a" survives and "b" goes
+    cache.put_many("m", ["d"], np.array([[4.0]], dtype=np.float32))
+    fresh = EmbeddingCache(path=path)
+    assert fresh.get_many("m", ["a"])[0] is not None
+    assert fresh.get_many("m", ["b"])[0] is None
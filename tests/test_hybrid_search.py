@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+import pytest
+
+from backend import crud, hybrid_search, models
+from backend.hybrid_search import reciprocal_rank_fusion
+
+
+def test_rrf_rewards_agreement_between_legs():
+    fused = reciprocal_rank_fusion({"vector": ["a", "b", "c"], "lexical": ["c", "a"]}, k=60)
+    assert [pid for pid, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+    assert fused[2][1] == pytest.approx(1 / 62)
+
+
+def test_rrf_of_a_single_leg_keeps_its_order():
+    assert [pid for pid, _ in reciprocal_rank_fusion({"vector": ["x", "y", "z"]})] == ["x", "y", "z"]
+    assert reciprocal_rank_fusion({}) == []
+
+
+def test_failed_and_slow_legs_are_dropped(db, monkeypatch):
+    db.add_all(models.Paper(id=pid, title=pid) for pid in ("a", "b"))
+    db.commit()
+
+    def circuit_open(query, n):
+        raise crud.VectorSearchUnavailable("open")
+
+    def slow(query, n):
+        time.sleep(0.2)
+        return ["b"]
+
+    monkeypatch.setattr(hybrid_search, "_vector_leg", circuit_open)
+    monkeypatch.setattr(hybrid_search, "_lexical_leg", lambda query, n: ["b", "missing", "a"])
+    papers, stats = asyncio.run(hybrid_search.hybrid_search("graphs", limit=5))
+    assert [p.id for p in papers] == ["b", "a"]
+    assert {s.name: (s.status, s.hits, s.contributed) for s in stats} == {
+        "vector": ("circuit_open", 0, 0),
+        "lexical": ("ok", 3, 2),
+    }
+
+    monkeypatch.setattr(hybrid_search, "_vector_leg", slow)
+    monkeypatch.setattr(hybrid_search, "HYBRID_VECTOR_TIMEOUT", 0.01)
+    papers, stats = asyncio.run(hybrid_search.hybrid_search("graphs", limit=1))
+    assert [p.id for p in papers] == ["b"]
+    assert stats[0].status == "timeout"
@@ -0,0 +1,11 @@
+import logging
+
+from backend import logging_setup
+
+
+def test_included_hierarchies_share_the_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(logging_setup, "LOG_DIR", str(tmp_path))
+    logging_setup.setup_logging("algo_test", "algo_test.log", include=("helpers_test",))
+    logging.getLogger("helpers_test.embedding").warning("cache miss for %s", "p1")
+    logging_setup._listeners.pop("algo_test").stop()
+    assert "helpers_test.embedding - WARNING - cache miss for p1" in (tmp_path / "algo_test.log").read_text()
@@ -0,0 +1,148 @@
+import asyncio
+import gc
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from backend import main, matching
+from backend.matching import IncrementalMatcher, SentenceStream, split_sentences
+
+
+def test_sentence_stream_matches_split_sentences():
+    answer = "GNNs pass messages. They aggregate neighbors!  Why does it work? Depth"
+    stream = SentenceStream()
+    streamed = []
+    for i in range(0, len(answer), 3):
+        streamed += stream.feed(answer[i:i + 3])
+    streamed += stream.flush()
+    assert streamed == split_sentences(answer)
+
+
+def test_sentence_is_complete_only_after_following_whitespace():
+    stream = SentenceStream()
+    assert stream.feed("Version 2.") == []
+    assert stream.feed("5 is out. ") == ["Version 2.5 is out."]
+    assert stream.flush() == []
+
+
+def test_aclose_cancels_and_reaps_background_tasks(monkeypatch):
+    started = asyncio.Event()
+
+    async def slow_embed(texts):
+        started.set()
+        await asyncio.sleep(10)
+
+    async def search(text):
+        return []
+
+    monkeypatch.setattr(matching, "aembed_texts", slow_embed)
+
+    async def run():
+        matcher = IncrementalMatcher(search, refresh_every=1)
+        matcher.feed("First sentence. Second one. ")
+        tasks = list(matcher._tasks)
+        await started.wait()
+        await matcher.aclose()
+        return tasks, matcher
+
+    tasks, matcher = asyncio.run(run())
+    assert tasks and all(task.done() for task in tasks)
+    assert not matcher._tasks
+
+
+def test_finish_retrieves_failed_sentence_embeddings(monkeypatch):
+    async def failing_embed(texts):
+        raise RuntimeError("embedding server down")
+
+    async def search(text):
+        return []
+
+    monkeypatch.setattr(matching, "aembed_texts", failing_embed)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        unretrieved = []
+        loop.set_exception_handler(lambda loop, context: unretrieved.append(context))
+        matcher = IncrementalMatcher(search)
+        matcher.feed("One sentence. ")
+        await asyncio.sleep(0)
+        assert await matcher.finish() == ([], [])
+        del matcher
+        gc.collect()
+        return unretrieved
+
+    assert asyncio.run(run()) == []
+
+
+def test_pipelined_chat_cleans_up_when_llm_stream_fails(monkeypatch):
+    spawned = []
+
+    async def slow_embed(texts):
+        await asyncio.sleep(10)
+        return np.zeros((len(texts), 2))
+
+    async def broken_stream(prompt):
+        yield "A complete sentence. "
+        yield "Another one. "
+        raise httpx.ReadError("connection reset")
+
+    original_spawn = IncrementalMatcher._spawn
+
+    def spawn(self, coro):
+        task = original_spawn(self, coro)
+        spawned.append(task)
+        return task
+
+    monkeypatch.setattr(matching, "aembed_texts", slow_embed)
+    monkeypatch.setattr(IncrementalMatcher, "_spawn", spawn)
+    monkeypatch.setattr(main, "stream_llm_response", broken_stream)
+
+    with pytest.raises(httpx.ReadError):
+        asyncio.run(main.pipelined_chat("question"))
+    assert spawned and all(task.done() for task in spawned)
+
+
+def test_stream_llm_response_propagates_429(monkeypatch):
+    transport = httpx.MockTransport(lambda request: httpx.Response(429, headers={"Retry-After": "7"}))
+    client = httpx.AsyncClient(transport=transport)
+    monkeypatch.setattr(main, "get_http_client", lambda url: client)
+
+    async def consume():
+        return [token async for token in main.stream_llm_response("hi")]
+
+    with pytest.raises(HTTPException) as info:
+        asyncio.run(consume())
+    assert info.value.status_code == 429
+    assert info.value.headers["Retry-After"] == "7"
+
+
+def test_seed_loads_candidate_vectors_before_first_sentence(monkeypatch):
+    embedded = []
+
+    async def embed(texts):
+        embedded.extend(texts)
+        return [np.ones(3) for _ in texts]
+
+    async def search(text):
+        return []
+
+    async def candidates():
+        return [SimpleNamespace(id="p1", title="Graph nets", abstract="Message passing")]
+
+    monkeypatch.setattr(matching, "aembed_texts", embed)
+    monkeypatch.setattr(matching, "load_paper_vectors", lambda papers: {})
+
+    async def run():
+        matcher = IncrementalMatcher(search)
+        matcher.seed(candidates())
+        while "p1" not in matcher._paper_vecs:
+            await asyncio.sleep(0)
+        vec = await matcher._paper_vecs["p1"]
+        await matcher.aclose()
+        return vec
+
+    assert np.allclose(asyncio.run(run()), np.ones(3))
+    assert len(embedded) == 1
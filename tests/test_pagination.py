@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import pytest
+
+from backend import models
+from backend.pagination import (
+    InvalidCursor,
+    RowCountCache,
+    decode_cursor,
+    decode_paper_cursor,
+    decode_user_cursor,
+    encode_cursor,
+)
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 8, 30, 15, 123456)
+    assert decode_paper_cursor(encode_cursor(created_at, "2107.12345")) == (created_at, "2107.12345")
+    assert decode_user_cursor(encode_cursor(42)) == 42
+    assert "=" not in encode_cursor("a")
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", encode_cursor(1, 2), encode_cursor("x")])
+def test_foreign_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_user_cursor(cursor)
+
+
+def test_malformed_paper_cursor_is_rejected():
+    with pytest.raises(InvalidCursor):
+        decode_paper_cursor(encode_cursor("yesterday", "p1"))
+    with pytest.raises(InvalidCursor):
+        decode_cursor(encode_cursor(1), 2)
+
+
+def test_row_count_cache_drops_counts_that_raced_a_write():
+    cache = RowCountCache(ttl_seconds=60)
+    generation = cache.generation("papers")
+    cache.invalidate("papers")
+    cache.put("papers", 10, generation)
+    assert cache.get("papers") is None
+
+    cache.put("papers", 11, cache.generation("papers"))
+    assert cache.get("papers") == 11
+    cache.invalidate("papers")
+    assert cache.get("papers") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_paper_pages_walk_ties_in_order(db, client):
+    same_time = datetime(2024, 1, 1)
+    db.add_all(models.Paper(id=f"p{i}", title=f"Paper {i}", created_at=same_time) for i in range(5))
+    db.add(models.Paper(id="new", title="Newest", created_at=datetime(2024, 2, 1)))
+    db.commit()
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, "fields": "title"}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/api/papers/", params=params).json()
+        seen += [paper["id"] for paper in body["papers"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["new", "p4", "p3", "p2", "p1", "p0"]
+    assert body["total"] == 6
+
+
+@pytest.mark.parametrize("path", ["/api/papers/", "/api/users/"])
+def test_page_parameters_are_validated(db, client, path):
+    assert client.get(path, params={"limit": 0}).status_code == 422
+    assert client.get(path, params={"limit": 501}).status_code == 422
+    assert client.get(path, params={"skip": -1}).status_code == 422
+    assert client.get(path, params={"cursor": "garbage"}).status_code == 400
+    response = client.get(path, params={"skip": 5, "cursor": encode_cursor(1)})
+    assert response.status_code == 400
+    assert "skip" in response.json()["detail"]
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from backend import models
+from backend.paper_cache import PaperDetailCache, build_paper_detail, etag_matches, paper_detail_cache
+
+
+def _paper(**kwargs):
+    values = dict(id="2107.12345", title="Graph nets", updated_at=datetime(2024, 1, 1, 12, 0))
+    values.update(kwargs)
+    return models.Paper(**values)
+
+
+def test_etag_matches_weak_lists_and_wildcard():
+    etag = build_paper_detail(_paper()).etag
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"other"', etag)
+
+
+def test_etag_and_last_modified_follow_updated_at():
+    old = build_paper_detail(_paper())
+    new = build_paper_detail(_paper(updated_at=datetime(2024, 1, 2)))
+    assert old.etag != new.etag
+    assert old.last_modified == "Mon, 01 Jan 2024 12:00:00 GMT"
+    assert build_paper_detail(_paper(updated_at=None)).last_modified is None
+
+
+def test_cache_lru_and_ttl(monkeypatch):
+    cache = PaperDetailCache(max_items=2, ttl_seconds=60)
+    for pid in ("a", "b"):
+        cache.put(build_paper_detail(_paper(id=pid)))
+    assert cache.get("a") is not None
+    cache.put(build_paper_detail(_paper(id="c")))
+    assert cache.get("b") is None
+
+    expired = build_paper_detail(_paper(id="d"))
+    expired.cached_at -= 61
+    cache.put(expired)
+    assert cache.get("d") is None
+
+
+def test_update_evicts_on_commit_only(db):
+    db.add(_paper(id="p1"))
+    db.commit()
+    paper_detail_cache.put(build_paper_detail(db.get(models.Paper, "p1")))
+
+    db.get(models.Paper, "p1").title = "Renamed"
+    db.flush()
+    assert paper_detail_cache.get("p1") is not None
+    db.rollback()
+    assert paper_detail_cache.get("p1") is not None
+
+    db.get(models.Paper, "p1").title = "Renamed"
+    db.flush()
+    db.commit()
+    assert paper_detail_cache.get("p1") is None
+
+
+def test_delete_evicts_on_commit(db):
+    db.add(_paper(id="p2"))
+    db.commit()
+    paper_detail_cache.put(build_paper_detail(db.get(models.Paper, "p2")))
+    db.delete(db.get(models.Paper, "p2"))
+    db.commit()
+    assert paper_detail_cache.get("p2") is None
@@ -0,0 +1,34 @@
+from backend import models
+
+
+def _add_papers(db, *ids):
+    db.add_all(models.Paper(id=pid, title=f"Paper {pid}") for pid in ids)
+    db.commit()
+
+
+def test_recommendation_without_history_uses_nearest_neighbor(db, client):
+    _add_papers(db, "a", "b", "c")
+    db.add(models.PaperNeighbor(paper_id="a", neighbor_id="c", rank=0, score=0.9))
+    db.commit()
+    response = client.get("/api/recommendations/a")
+    assert response.status_code == 200
+    assert response.json()["id"] == "c"
+
+
+def test_recommendation_falls_back_to_a_random_other_paper(db, client):
+    _add_papers(db, "a", "b")
+    response = client.get("/api/recommendations/a")
+    assert response.status_code == 200
+    assert response.json()["id"] == "b"
+    assert client.get("/api/recommendations/missing").status_code == 404
+
+
+def test_deactivate_user_runs_as_a_sync_endpoint(db, client):
+    db.add(models.User(
+        id=2, username="bob", email="bob@example.com", first_name="Bob", last_name="B",
+        hashed_password="x", is_active=True
+    ))
+    db.commit()
+    response = client.post("/api/users/2/deactivate")
+    assert response.status_code == 200
+    assert response.json()["is_active"] is False
@@ -0,0 +1,128 @@
+import pytest
+
+from backend_algo.reembed import EMBEDDING_MODEL_KEY, EmbeddingModelMismatch, migrate_collection, open_papers_collection
+
+
+class FakeCollection:
+    def __init__(self, name, embedding_function=None, metadata=None):
+        self.name = name
+        self.embedding_function = embedding_function
+        self.metadata = metadata
+        self.rows = {}  # id -> (document, metadata, embedding)
+
+    def add(self, ids, documents, metadatas, embeddings=None):
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        for row in zip(ids, documents, metadatas, embeddings):
+            self.rows[row[0]] = row[1:]
+
+    def count(self):
+        return len(self.rows)
+
+    def get(self, limit=None, offset=0, include=()):
+        ids = list(self.rows)[offset:offset + limit if limit else None]
+        return {
+            "ids": ids,
+            "documents": [self.rows[i][0] for i in ids],
+            "metadatas": [self.rows[i][1] for i in ids],
+            "embeddings": [self.rows[i][2] for i in ids],
+        }
+
+    def modify(self, name=None, metadata=None):
+        if name is not None:
+            self.client.collections[name] = self.client.collections.pop(self.name)
+            self.name = name
+        if metadata is not None:
+            self.metadata = metadata
+
+
+class FakeClient:
+    def __init__(self):
+        self.collections = {}
+
+    def list_collections(self):
+        return list(self.collections)
+
+    def create_collection(self, name, embedding_function=None, metadata=None):
+        collection = FakeCollection(name, embedding_function, metadata)
+        collection.client = self
+        self.collections[name] = collection
+        return collection
+
+    def get_collection(self, name, embedding_function=None):
+        collection = self.collections[name]
+        if embedding_function is not None:
+            collection.embedding_function = embedding_function
+        return collection
+
+    def delete_collection(self, name):
+        del self.collections[name]
+
+
+def bge(texts):
+    return [[float(len(t))] * 4 for t in texts]
+
+
+def test_new_collection_is_tagged_with_model():
+    client = FakeClient()
+    collection = open_papers_collection(client, "papers", bge, model="bge-m3")
+    assert collection.metadata == {EMBEDDING_MODEL_KEY: "bge-m3"}
+
+
+def _legacy(client):
+    old = client.create_collection("papers")
+    old.add(["p1", "p2", "p3"], ["abc", "de", None], [{"t": 1}, {"t": 2}, {"t": 3}], [[0.1, 0.2]] * 3)
+    return old
+
+
+def test_startup_refuses_vectors_of_another_dimension_without_touching_them():
+    client = FakeClient()
+    old = _legacy(client)
+    with pytest.raises(EmbeddingModelMismatch, match="backend_algo.reembed"):
+        open_papers_collection(client, "papers", bge, model="bge-m3")
+    assert client.collections == {"papers": old}
+    assert old.count() == 3 and old.metadata is None
+
+
+def test_dry_run_only_reports_the_plan():
+    client = FakeClient()
+    old = _legacy(client)
+    plan = migrate_collection(client, "papers", bge, model="bge-m3", dry_run=True)
+    assert (plan["action"], plan["stored_dim"], plan["target_dim"]) == ("reembed", 2, 4)
+    assert client.collections == {"papers": old}
+
+
+def test_migration_reembeds_vectors_of_another_dimension():
+    client = FakeClient()
+    _legacy(client)
+    migrate_collection(client, "papers", bge, model="bge-m3")
+    collection = client.collections["papers"]
+
+    assert list(client.collections) == ["papers"]
+    assert collection.metadata[EMBEDDING_MODEL_KEY] == "bge-m3"
+    # p3 has no document to embed
+    assert sorted(collection.rows) == ["p1", "p2"]
+    assert collection.rows["p1"] == ("abc", {"t": 1}, [3.0] * 4)
+
+
+def test_same_dimension_opens_at_startup_and_is_tagged_by_migration():
+    client = FakeClient()
+    old = client.create_collection("papers", metadata={"hnsw:space": "cosine"})
+    old.add(["p1"], ["abc"], [{}], [[9.0] * 4])
+
+    assert open_papers_collection(client, "papers", bge, model="bge-m3") is old
+    assert old.metadata == {"hnsw:space": "cosine"}
+    migrate_collection(client, "papers", bge, model="bge-m3")
+    assert old.rows["p1"][2] == [9.0] * 4
+    assert old.metadata == {EMBEDDING_MODEL_KEY: "bge-m3"}
+
+
+def test_tagged_collection_is_left_alone():
+    client = FakeClient()
+    old = client.create_collection("papers", metadata={EMBEDDING_MODEL_KEY: "bge-m3"})
+    old.add(["p1"], ["abc"], [{}], [[0.5, 0.5]])
+
+    def probe(texts):
+        raise AssertionError("no probe expected")
+
+    assert open_papers_collection(client, "papers", probe, model="bge-m3") is old
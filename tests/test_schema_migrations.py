@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from sqlalchemy import MetaData, create_engine, inspect, text
+
+from backend import migrations, models
+
+
+def _legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_papers_created_at_id"))
+        conn.execute(text("DROP INDEX ix_papers_updated_at"))
+    return engine
+
+
+def test_upgrade_creates_missing_indexes_once(tmp_path):
+    engine = _legacy_engine(tmp_path)
+
+    assert migrations.pending_steps(engine) == ["0002_ix_papers_created_at_id", "0003_ix_papers_updated_at"]
+    assert migrations.upgrade(engine) == ["0002_ix_papers_created_at_id", "0003_ix_papers_updated_at"]
+
+    names = {index["name"] for index in inspect(engine).get_indexes("papers")}
+    assert {"ix_papers_created_at_id", "ix_papers_updated_at"} <= names
+    assert migrations.pending_steps(engine) == []
+    assert migrations.upgrade(engine) == []
+
+
+def test_upgrade_backfills_null_created_at(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    legacy = MetaData()
+    papers = models.Paper.__table__.to_metadata(legacy)
+    papers.c.created_at.nullable = True
+    legacy.create_all(bind=engine)
+    updated = datetime(2024, 1, 2)
+    with engine.begin() as conn:
+        conn.execute(papers.insert(), [
+            {"id": "p1", "title": "Dated", "created_at": datetime(2024, 1, 1), "updated_at": updated},
+            {"id": "p2", "title": "Undated", "created_at": None, "updated_at": updated},
+        ])
+
+    assert migrations.pending_steps(engine) == ["0004_papers_created_at_not_null"]
+    migrations.upgrade(engine)
+
+    with engine.connect() as conn:
+        rows = dict(conn.execute(text("SELECT id, created_at FROM papers")).all())
+    assert rows == {"p1": "2024-01-01 00:00:00.000000", "p2": "2024-01-02 00:00:00.000000"}
+    assert migrations.pending_steps(engine) == []
+
+
+def test_match_score_step_alters_mysql_column():
+    class Conn:
+        class dialect:
+            name = "mysql"
+
+        def __init__(self):
+            self.sql = []
+
+        def execute(self, statement):
+            self.sql.append(str(statement))
+
+    conn = Conn()
+    migrations._match_score_to_float(conn)
+    assert conn.sql == ["ALTER TABLE answer_paper_matches MODIFY match_score FLOAT"]
@@ -0,0 +1,45 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from backend import main
+from backend.semantic_cache import CachedAnswer, CachedMatch, SemanticAnswerCache
+
+
+def _answer(prompt, created_at=None):
+    answer = CachedAnswer(prompt, f"answer to {prompt}", ["p1"], [CachedMatch("p1", 0.83, "s")])
+    if created_at is not None:
+        answer.created_at = created_at
+    return answer
+
+
+def test_lookup_hits_only_above_threshold():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store(np.array([1.0, 0.0]), _answer("a"))
+    assert cache.lookup(np.array([2.0, 0.1])).prompt == "a"
+    assert cache.lookup(np.array([1.0, 1.0])) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_expired_entries_are_not_returned():
+    cache = SemanticAnswerCache(ttl_seconds=60)
+    cache.store(np.array([1.0, 0.0]), _answer("old", created_at=time.time() - 120))
+    assert cache.lookup(np.array([1.0, 0.0])) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(max_entries=2)
+    cache.store(np.array([1.0, 0.0, 0.0]), _answer("a"))
+    cache.store(np.array([0.0, 1.0, 0.0]), _answer("b"))
+    assert cache.lookup(np.array([1.0, 0.0, 0.0])).prompt == "a"
+    cache.store(np.array([0.0, 0.0, 1.0]), _answer("c"))
+    assert cache.lookup(np.array([0.0, 1.0, 0.0])) is None
+    assert cache.lookup(np.array([1.0, 0.0, 0.0])).prompt == "a"
+
+
+def test_truncated_integer_scores_are_not_warmed():
+    legacy = [SimpleNamespace(match_score=1), SimpleNamespace(match_score=0.0)]
+    assert not main._warmable_scores(legacy)
+    assert main._warmable_scores([SimpleNamespace(match_score=0.83)])
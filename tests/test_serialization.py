@@ -0,0 +1,66 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from backend import models, serialization
+from backend.serialization import PAPER_FIELDS, dumps, paper_columns, paper_rows, parse_paper_fields
+
+
+def test_parse_paper_fields_orders_and_always_includes_id():
+    assert parse_paper_fields(None) is None
+    assert parse_paper_fields("") is None
+    fields = parse_paper_fields(" title , published_date,title")
+    assert fields == [name for name in PAPER_FIELDS if name in {"id", "title", "published_date"}]
+
+
+def test_parse_paper_fields_names_unknown_fields():
+    with pytest.raises(ValueError, match="hashed_password, secret"):
+        parse_paper_fields("title,secret,hashed_password")
+
+
+def test_paper_rows_project_requested_fields():
+    paper = models.Paper(id="p1", title="Graph nets", abstract="long", published_date=datetime(2024, 1, 2))
+    fields = parse_paper_fields("title")
+    assert paper_rows([paper], fields) == [{"id": "p1", "title": "Graph nets"}]
+    assert [column.key for column in paper_columns(fields)] == fields
+    assert paper_columns(None) is None
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_renders_datetimes_and_unicode(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    elif serialization.orjson is None:
+        pytest.skip("orjson not installed")
+    body = dumps({"title": "图神经网络", "published_date": datetime(2024, 1, 2, 3, 4, 5)})
+    assert json.loads(body) == {"title": "图神经网络", "published_date": "2024-01-02T03:04:05"}
+
+
+def test_unknown_fields_are_a_bad_request(db, client):
+    response = client.get("/api/papers/", params={"fields": "title,nope"})
+    assert response.status_code == 400
+    assert "nope" in response.json()["detail"]
+
+
+def _schema(spec, ref):
+    return spec["components"]["schemas"][ref["$ref"].rsplit("/", 1)[-1]]
+
+
+def test_projected_papers_match_the_documented_response(db, client):
+    db.add(models.Paper(id="p1", title="Graph nets", abstract="long", authors=["A"], pdf_url="u"))
+    db.commit()
+    spec = client.get("/openapi.json").json()
+    documented = spec["paths"]["/api/papers/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    page = _schema(spec, documented)
+    paper = _schema(spec, page["properties"]["papers"]["items"])
+    assert set(paper["properties"]) == set(PAPER_FIELDS)
+
+    body = client.get("/api/papers/", params={"fields": "title"}).json()
+    assert set(page["required"]) <= set(body) <= set(page["properties"])
+    for row in body["papers"]:
+        assert set(paper["required"]) <= set(row) <= set(paper["properties"])
+    assert body["papers"] == [{"id": "p1", "title": "Graph nets"}]
+
+    search = spec["paths"]["/api/papers/search/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert _schema(spec, _schema(spec, search)["properties"]["papers"]["items"]) == paper